@@ -2,6 +2,7 @@
 import sys
 import os
 import traceback
+import multiprocessing
 
 def main():
     try:
@@ -65,4 +66,6 @@ def main():
         input("\nНажмите Enter для выхода...")
 
 if __name__ == "__main__":
+    # Пул процессов (поиск похожих изображений) в собранном exe
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
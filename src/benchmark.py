@@ -0,0 +1,328 @@
+# benchmark.py
+"""Замеры производительности поиска дубликатов
+
+Запуск из корня проекта:
+    python -m src.benchmark workers <папка> [--max-workers N]
+    python -m src.benchmark hashes [--dir папка] [--size-mb 256]
+    python -m src.benchmark records [--files 5000000]
+    python -m src.benchmark external [--dir папка] [--files 200000] [--memory-mb 16]
+    python -m src.benchmark similar [--images 500000] [--distance 8]
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from .duplicates import DuplicateFinder, HASH_BACKENDS
+from .image_hash import MultiIndexHash
+from .record_store import RecordStore
+from .utils import format_size
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def benchmark_workers(directory, max_workers=None, method='hash'):
+    """Масштабирование хэширования от 1 до max_workers потоков
+    
+    Кэш хэшей отключен. Первый прогон прогревает кэш ОС, поэтому на
+    медленных дисках для честного сравнения кэш ОС лучше сбрасывать.
+    """
+    max_workers = max_workers or os.cpu_count() or 4
+    
+    # Прогрев кэша ОС, чтобы все прогоны были в равных условиях
+    DuplicateFinder().find_duplicates(directory, method=method)
+    
+    results = []
+    reference = None
+    workers = 1
+    while workers <= max_workers:
+        finder = DuplicateFinder()
+        started = time.perf_counter()
+        duplicates = finder.find_duplicates(directory, method=method, workers=workers)
+        elapsed = time.perf_counter() - started
+        
+        if reference is None:
+            reference = duplicates
+        elif duplicates != reference:
+            raise RuntimeError(f"Результат с {workers} потоками отличается от однопоточного")
+        
+        hashed_bytes = finder.stats['stages'][0]['remaining_bytes']
+        results.append((workers, elapsed, hashed_bytes))
+        print(f"{workers:>3} потоков: {elapsed:8.2f} с, "
+              f"{format_size(hashed_bytes / elapsed if elapsed else 0)}/с, "
+              f"ускорение x{results[0][1] / elapsed if elapsed else 0:.2f}")
+        workers *= 2
+    
+    return results
+
+
+def benchmark_hashes(directory=None, size_mb=256, buffer_sizes=(8 * 1024, 64 * 1024, 1024 * 1024, 4 * 1024 * 1024)):
+    """Скорость (МБ/с) каждого алгоритма при разных размерах буфера
+    
+    Тестовый файл создается в directory (по умолчанию во временной папке),
+    чтобы мерить чтение с нужного диска. После первого прохода файл обычно
+    оказывается в кэше ОС, так что цифры отражают в основном стоимость
+    хэширования и системных вызовов.
+    """
+    finder = DuplicateFinder()
+    results = []
+    
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as f:
+        test_file = f.name
+        block = os.urandom(1024 * 1024)
+        for _ in range(size_mb):
+            f.write(block)
+    
+    try:
+        size = os.path.getsize(test_file)
+        print(f"Тестовый файл: {test_file} ({format_size(size)})")
+        
+        for name, backend in HASH_BACKENDS.items():
+            for buffer_size in buffer_sizes:
+                started = time.perf_counter()
+                finder._calculate_hash(test_file, backend=backend, buffer_size=buffer_size)
+                elapsed = time.perf_counter() - started
+                
+                speed = size / elapsed / (1024 * 1024) if elapsed else 0
+                results.append((name, buffer_size, speed))
+                print(f"{name:>8}, буфер {format_size(buffer_size):>10}: {speed:8.1f} МБ/с")
+    finally:
+        os.unlink(test_file)
+    
+    return results
+
+
+def _synthetic_files(files, files_per_dir=1000):
+    """Пути и stat синтетического дерева: 1000 файлов в папке, размеры в основном уникальны"""
+    for i in range(files):
+        name = f"IMG_{i:08d}.jpg"
+        path = f"/synthetic/photos/{i // (files_per_dir * 100):04d}/{i // files_per_dir:06d}/{name}"
+        size = 1000 + (i * 2654435761) % (files * 4)
+        yield path, name, os.stat_result((0o100644, i + 1, 1, 1, 0, 0, size, 0, 1.5e9 + i, 1.5e9 + i))
+
+
+def _peak_rss():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает килобайты, macOS - байты
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _build_records(layout, files, queue):
+    """Записи синтетического дерева, сгруппированные по размеру
+    
+    'dict' - прежний словарь на файл и словарь списков по размеру,
+    'store' - RecordStore и группировка DuplicateFinder._size_groups.
+    """
+    baseline = _peak_rss()
+    
+    if layout == 'dict':
+        files_by_size = defaultdict(list)
+        for path, name, st in _synthetic_files(files):
+            files_by_size[st.st_size].append({
+                'path': path,
+                'name': name,
+                'size': st.st_size,
+                'ctime': st.st_ctime,
+                'mtime': st.st_mtime,
+                'dev': st.st_dev,
+                'ino': st.st_ino,
+                'nlink': st.st_nlink
+            })
+    else:
+        store = RecordStore()
+        for path, name, st in _synthetic_files(files):
+            store.add(path, name, st)
+        DuplicateFinder()._size_groups(store)
+    
+    queue.put((baseline, _peak_rss()))
+
+
+def benchmark_records(files=5000000):
+    """Пиковый RSS записей о файлах: словарь на файл против RecordStore
+    
+    Каждый вариант строится в отдельном процессе, чтобы пики не
+    смешивались. Дерево синтетическое, диск не читается.
+    """
+    if resource is None:
+        print("Модуль resource недоступен на этой платформе")
+        return []
+    
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for layout in ('dict', 'store'):
+        queue = context.Queue()
+        started = time.perf_counter()
+        process = context.Process(target=_build_records, args=(layout, files, queue))
+        process.start()
+        baseline, peak = queue.get()
+        process.join()
+        elapsed = time.perf_counter() - started
+        
+        results.append((layout, peak, peak - baseline))
+        print(f"{layout:>6}: пиковый RSS {format_size(peak)}, "
+              f"на записи {format_size(peak - baseline)} "
+              f"({(peak - baseline) / files:.0f} байт на файл), {elapsed:.1f} с")
+    
+    return results
+
+
+def _make_tree(root, files, files_per_dir=1000):
+    """Дерево мелких файлов: каждый десятый повторяет содержимое соседа"""
+    for i in range(files):
+        folder = os.path.join(root, f"{i // files_per_dir:05d}")
+        if i % files_per_dir == 0:
+            os.makedirs(folder, exist_ok=True)
+        content = f"file {i - 1 if i % 10 == 9 else i}\n".encode() * (1 + i % 7)
+        with open(os.path.join(folder, f"f{i:08d}.txt"), 'wb') as f:
+            f.write(content)
+
+
+def _run_search(directory, memory_limit, queue):
+    baseline = _peak_rss()
+    finder = DuplicateFinder(memory_limit=memory_limit)
+    started = time.perf_counter()
+    duplicates = finder.find_duplicates(directory)
+    elapsed = time.perf_counter() - started
+    groups = sorted(sorted(f['path'] for f in files) for files in duplicates.values())
+    digest = hashlib.sha256(repr(groups).encode('utf-8', 'surrogatepass')).hexdigest()
+    queue.put((elapsed, baseline, _peak_rss(), finder.stats['files_scanned'], digest))
+
+
+def benchmark_external(directory=None, files=200000, memory_mb=16):
+    """Метод hash в памяти против внешней сортировки с лимитом memory_mb
+    
+    Без directory создается временное дерево из files мелких файлов.
+    Каждый вариант запускается в отдельном процессе; первый прогон
+    прогревает кэш ОС. Сравниваются время, пиковый RSS и результат.
+    Прогрев тоже идет в дочернем процессе: в Linux пиковый RSS
+    наследуется через exec, и большой пик родителя исказил бы замеры.
+    """
+    if resource is None:
+        print("Модуль resource недоступен на этой платформе")
+        return []
+    
+    temp = None
+    if directory is None:
+        temp = tempfile.TemporaryDirectory(prefix='meticulous_bench_')
+        directory = temp.name
+        _make_tree(directory, files)
+    
+    context = multiprocessing.get_context('spawn')
+    results = []
+    try:
+        runs = (('прогрев', memory_mb * 1024 * 1024), ('память', None), ('внешняя', memory_mb * 1024 * 1024))
+        for name, limit in runs:
+            queue = context.Queue()
+            process = context.Process(target=_run_search, args=(directory, limit, queue))
+            process.start()
+            elapsed, baseline, peak, scanned, digest = queue.get()
+            process.join()
+            if name == 'прогрев':
+                continue
+            
+            results.append((name, elapsed, peak - baseline, digest))
+            print(f"{name:>8}: {elapsed:8.2f} с, {scanned / elapsed if elapsed else 0:10.0f} файлов/с, "
+                  f"прирост RSS {format_size(peak - baseline)}")
+    finally:
+        if temp is not None:
+            temp.cleanup()
+    
+    if len({digest for _, _, _, digest in results}) != 1:
+        raise RuntimeError("Результаты поиска в памяти и через внешнюю сортировку различаются")
+    return results
+
+
+def benchmark_similar(images=500000, distance=8, seed=1):
+    """Поиск соседей dHash в MultiIndexHash, как в методе images_similar
+    
+    Хэши случайные, каждый десятый - копия одного из прежних с 1-3
+    измененными битами, так что заведомо есть images // 10 пар соседей.
+    Печатается среднее время на изображение по мере роста индекса: при
+    квадратичном поиске оно росло бы пропорционально числу изображений.
+    """
+    rng = random.Random(seed)
+    index = MultiIndexHash(distance, images)
+    values = []
+    planted = 0
+    found = 0
+    checkpoint = 5000
+    started = time.perf_counter()
+    last_time = started
+    last_count = 0
+    
+    for i in range(images):
+        if i % 10 == 9:
+            value = values[rng.randrange(len(values))]
+            for _ in range(rng.randint(1, 3)):
+                value ^= 1 << rng.randrange(64)
+            planted += 1
+        else:
+            value = rng.getrandbits(64)
+        values.append(value)
+        
+        found += bool(index.search(value))
+        index.add(value, i)
+        
+        if i + 1 == checkpoint or i + 1 == images:
+            now = time.perf_counter()
+            per_item = (now - last_time) / (i + 1 - last_count)
+            print(f"{i + 1:>9} изображений: {per_item * 1e6:8.1f} мкс на изображение "
+                  f"(всего {now - started:.1f} с)")
+            last_time, last_count = now, i + 1
+            checkpoint *= 4 if checkpoint < images else 1
+    
+    print(f"Частей индекса: {len(index.chunks)}, найдено соседей у {found} изображений "
+          f"(подмешано {planted})")
+    if found < planted:
+        raise RuntimeError("Индекс пропустил подмешанных соседей")
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры производительности Meticulous")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    workers_parser = subparsers.add_parser('workers', help="масштабирование по числу потоков")
+    workers_parser.add_argument('directory')
+    workers_parser.add_argument('--max-workers', type=int, default=None)
+    
+    hashes_parser = subparsers.add_parser('hashes', help="скорость алгоритмов хэширования")
+    hashes_parser.add_argument('--dir', default=None)
+    hashes_parser.add_argument('--size-mb', type=int, default=256)
+    
+    records_parser = subparsers.add_parser('records', help="память на описания файлов")
+    records_parser.add_argument('--files', type=int, default=5000000)
+    
+    external_parser = subparsers.add_parser('external', help="поиск в памяти против внешней сортировки")
+    external_parser.add_argument('--dir', default=None)
+    external_parser.add_argument('--files', type=int, default=200000)
+    external_parser.add_argument('--memory-mb', type=int, default=16)
+    
+    similar_parser = subparsers.add_parser('similar', help="поиск похожих изображений по dHash")
+    similar_parser.add_argument('--images', type=int, default=500000)
+    similar_parser.add_argument('--distance', type=int, default=8)
+    
+    args = parser.parse_args()
+    
+    if args.command == 'workers':
+        benchmark_workers(args.directory, args.max_workers)
+    elif args.command == 'hashes':
+        benchmark_hashes(args.dir, args.size_mb)
+    elif args.command == 'records':
+        benchmark_records(args.files)
+    elif args.command == 'external':
+        benchmark_external(args.dir, args.files, args.memory_mb)
+    elif args.command == 'similar':
+        benchmark_similar(args.images, args.distance)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 import json
 import os
 from pathlib import Path
+from .scan_filter import DEFAULT_EXCLUDE
 
 class ConfigManager:
     def __init__(self):
@@ -37,7 +38,19 @@ class ConfigManager:
             'date_format': 0,
             'language': 'ru',
             'duplicate_method': 0,
-            'duplicate_size_threshold': 10
+            'duplicate_size_threshold': 10,
+            'duplicate_workers': 4,
+            'duplicate_image_distance': 8,
+            'duplicate_memory_limit': 0,
+            'duplicate_reference_folder': '',
+            'duplicate_verify_archives': False,
+            'duplicate_payload_hash': False,
+            'scan_exclude': list(DEFAULT_EXCLUDE),
+            'scan_include': [],
+            'scan_max_size': 0,
+            'scan_skip_hidden': True,
+            'scan_follow_symlinks': False,
+            'scan_one_filesystem': False
         }
         
         if not self.config_file.exists():
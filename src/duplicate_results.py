@@ -0,0 +1,107 @@
+# duplicate_results.py
+import csv
+import heapq
+from datetime import datetime
+
+from .duplicates import keep_priority
+
+
+class DuplicateResults:
+    """Результаты поиска дубликатов: id группы -> записи файлов
+    
+    Основная копия результатов для таблицы, очистки и экспорта. Записи
+    хранятся как их вернул DuplicateFinder (полный хэш, точный размер в
+    байтах, время как число), а таблица показывает только их текстовое
+    представление. Индекс по пути дает группы файла за O(1): эталонный
+    файл (метод reference) может входить в несколько групп.
+    """
+    
+    def __init__(self):
+        self.groups = {}
+        self.savings = {}
+        self._by_path = {}
+    
+    def add_group(self, key, files, savings=0):
+        """Добавление группы; savings - сколько байт освободит ее очистка"""
+        self.groups[key] = files
+        self.savings[key] = savings
+        for file_info in files:
+            self._by_path.setdefault(file_info['path'], []).append(key)
+    
+    def clear(self):
+        self.groups = {}
+        self.savings = {}
+        self._by_path = {}
+    
+    def group_of(self, path):
+        """Id первой группы файла или None"""
+        keys = self._by_path.get(path)
+        return keys[0] if keys else None
+    
+    def groups_of(self, path):
+        """Id всех групп, в которые входит файл"""
+        return list(self._by_path.get(path, ()))
+    
+    def record(self, path, key=None):
+        """Запись файла по полному пути (в группе key, если задана) или None"""
+        if key is None:
+            key = self.group_of(path)
+        if key is None or key not in self.groups:
+            return None
+        for file_info in self.groups[key]:
+            if file_info['path'] == path:
+                return file_info
+        return None
+    
+    def newest(self, key):
+        """Файл, который сохраняется при очистке группы"""
+        return max(self.groups[key], key=keep_priority)
+    
+    def items(self):
+        return self.groups.items()
+    
+    def top_savings(self, count):
+        """Пары (экономия, id группы) для count групп с наибольшей экономией"""
+        return heapq.nlargest(count, ((savings, key) for key, savings in self.savings.items()))
+    
+    def total_savings(self):
+        return sum(self.savings.values())
+    
+    def file_count(self):
+        return sum(len(files) for files in self.groups.values())
+    
+    def total_size(self):
+        return sum(f['size'] for files in self.groups.values() for f in files)
+    
+    def cleanup_plan(self):
+        """Копия групп для DuplicateFinder.remove_duplicates"""
+        return {key: list(files) for key, files in self.groups.items() if len(files) > 1}
+    
+    def export_csv(self, file_path):
+        """Экспорт всех групп в CSV (точные размеры и полные хэши)"""
+        with open(file_path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f, delimiter=';')
+            writer.writerow(["Группа", "Хэш", "Алгоритм", "Путь", "Имя", "Размер (байт)",
+                             "Создан", "Изменен", "Сохраняется", "Жесткие ссылки"])
+            
+            for group_num, (key, files) in enumerate(self.groups.items(), 1):
+                newest = self.newest(key)
+                for file_info in files:
+                    writer.writerow([
+                        group_num,
+                        key,
+                        file_info.get('algorithm', ''),
+                        file_info['path'],
+                        file_info['name'],
+                        file_info['size'],
+                        datetime.fromtimestamp(file_info['ctime']).isoformat(sep=' ', timespec='seconds'),
+                        datetime.fromtimestamp(file_info['mtime']).isoformat(sep=' ', timespec='seconds')
+                        if 'mtime' in file_info else '',
+                        "да" if file_info is newest else "",
+                        "; ".join(file_info.get('links', []))
+                    ])
+        
+        return self.file_count()
+    
+    def __len__(self):
+        return len(self.groups)
@@ -1,98 +1,1706 @@
 import os
+import sys
+import shutil
+import copy
+import ctypes
 import hashlib
+import multiprocessing
+import threading
+import time
+import uuid
+import zipfile
+import zlib
 from pathlib import Path
-from collections import defaultdict
+from collections import defaultdict, deque
+from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime
+from .scan_filter import ScanFilter
+from .external_sort import ExternalSorter
+from .record_store import RecordStore
+from .image_hash import MultiIndexHash, dhash, hamming, is_image
+from .payload import PAYLOAD_EXTENSIONS, payload_ranges
+from .utils import CancelToken, OperationCancelled
 
-class DuplicateFinder:
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl клонирования файла в Linux (Btrfs, XFS и др.)
+FICLONE = 0x40049409
+
+# Способы освобождения места в remove_duplicates
+RECLAIM_MODES = ('delete', 'hardlink', 'reflink')
+
+
+# Архивы, содержимое которых сравнивает метод archives
+ARCHIVE_EXTENSIONS = ('.zip',)
+
+
+def is_removable(file_info):
+    """Может ли автоматическая очистка удалить файл
+    
+    Не удаляются члены архивов, файлы, совпавшие с ними только по CRC32,
+    похожие изображения (метод images_similar) и файлы, совпавшие только
+    без метаданных (режим payload). Это не одинаковые файлы: сохранение
+    самого нового могло бы оставить уменьшенную копию вместо оригинала или
+    потерять теги и EXIF, которые есть только в удаленных копиях.
+    """
+    return not (file_info.get('virtual') or file_info.get('unverified') or file_info.get('similar')
+                or file_info.get('payload_match'))
+
+
+def keep_priority(file_info):
+    """Порядок выбора сохраняемого файла: эталонный или в архиве, затем самый новый"""
+    return (bool(file_info.get('reference') or file_info.get('virtual')), file_info['ctime'])
+
+
+def link_source(files):
+    """Файл, ссылками на который заменяются копии в режимах hardlink и reflink
+    
+    files отсортированы по keep_priority по убыванию. На член архива
+    ссылку не создать, поэтому в группах с архивом источником становится
+    самая новая обычная копия. None - обычных файлов в группе нет.
+    """
+    return next((file_info for file_info in files if not file_info.get('virtual')), None)
+
+
+def _outside_ranges(ranges, size):
+    """Участки файла размера size вне ranges (список (смещение, длина) по возрастанию)"""
+    outside = []
+    position = 0
+    for offset, length in ranges:
+        if offset > position:
+            outside.append((position, offset - position))
+        position = offset + length
+    if position < size:
+        outside.append((position, size - position))
+    return outside
+
+
+class HashBackend:
+    """Алгоритм хэширования и размер буфера чтения для него"""
+    
+    def __init__(self, name, factory, buffer_size=1024 * 1024, cryptographic=True):
+        self.name = name
+        self.factory = factory
+        self.buffer_size = buffer_size
+        self.cryptographic = cryptographic
+    
+    def new(self):
+        return self.factory()
+
+
+class Crc32Hash:
+    """CRC32 с интерфейсом hashlib - дешевый некриптографический отпечаток"""
+    
     def __init__(self):
+        self.value = 0
+    
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+    
+    def hexdigest(self):
+        return f"{self.value:08x}"
+    
+    def copy(self):
+        clone = Crc32Hash()
+        clone.value = self.value
+        return clone
+
+
+HASH_BACKENDS = {}
+
+
+def register_hash_backend(backend):
+    """Регистрация алгоритма хэширования под его именем"""
+    HASH_BACKENDS[backend.name] = backend
+
+
+def get_hash_backend(name):
+    """Алгоритм по имени; ValueError, если такой не зарегистрирован"""
+    try:
+        return HASH_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Неизвестный алгоритм хэширования: {name}")
+
+
+register_hash_backend(HashBackend('blake2b', lambda: hashlib.blake2b(digest_size=32)))
+register_hash_backend(HashBackend('sha256', hashlib.sha256))
+register_hash_backend(HashBackend('md5', hashlib.md5))
+register_hash_backend(HashBackend('crc32', Crc32Hash, buffer_size=256 * 1024, cryptographic=False))
+if xxhash is not None:
+    register_hash_backend(HashBackend('xxh64', xxhash.xxh64, cryptographic=False))
+
+
+class DuplicateFinder:
+    # Размер каждого из трех выборочных фрагментов для быстрого отсева
+    SAMPLE_SIZE = 64 * 1024
+    # Блок побайтового сравнения и лимит одновременно открытых файлов
+    CONTENT_BLOCK_SIZE = 64 * 1024
+    MAX_OPEN_FILES = 64
+    # Кандидаты хэшируются партиями из целых групп одного размера, чтобы
+    # найденные дубликаты выдавались по ходу поиска. Группы идут в порядке
+    # убывания возможной экономии, поэтому крупные дубликаты находятся первыми
+    BATCH_FILES = 256
+    BATCH_BYTES = 1024 ** 3
+    # Минимальный интервал между сообщениями о прогрессе, секунды
+    PROGRESS_INTERVAL = 0.2
+    
+    def __init__(self, cache=None, algorithm='sha256', sample_algorithm='crc32', buffer_size=None,
+                 image_distance=8, verify_archives=False, payload=False, memory_limit=None, temp_dir=None):
         self.duplicates = {}
+        # Порог расстояния Хэмминга между dHash для метода images_similar
+        self.image_distance = image_distance
+        # Подтверждать совпадения метода archives полным хэшем
+        self.verify_archives = verify_archives
+        # Метод hash сравнивает MP3 и JPEG без тегов и метаданных
+        self.payload = payload
+        # Лимит памяти метода hash в байтах; при нем группы строятся
+        # внешней сортировкой через временные файлы в temp_dir
+        self.memory_limit = memory_limit
+        self.temp_dir = temp_dir
+        self.cache = cache
+        self.backend = get_hash_backend(algorithm)
+        self.sample_backend = get_hash_backend(sample_algorithm)
+        self.buffer_size = buffer_size or self.backend.buffer_size
+        self.workers = 1
+        self.reference = None
+        self.state = None
+        self.cancel_token = None
+        self.progress_callback = None
+        self.cancelled = False
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+    
+    def find_duplicates(self, directory, method='hash', workers=1, scan_filter=None,
+                        cancel_token=None, progress=None, reference=None, state=None):
+        """Поиск дубликатов файлов
+        
+        Возвращает словарь {хэш: [файлы]}. Аргументы как у iter_duplicates.
+        """
+        return dict(self.iter_duplicates(directory, method, workers, scan_filter,
+                                         cancel_token, progress, reference, state))
     
-    def find_duplicates(self, directory, method='hash'):
-        """Поиск дубликатов файлов"""
+    def iter_duplicates(self, directory, method='hash', workers=1, scan_filter=None,
+                        cancel_token=None, progress=None, reference=None, state=None):
+        """Потоковый поиск дубликатов: пары (ключ, [файлы]) по мере подтверждения групп
+        
+        workers - число потоков для хэширования кандидатов. hashlib
+        отпускает GIL на больших буферах, поэтому несколько потоков
+        загружают быстрые диски и сетевые папки параллельно.
+        scan_filter - правила обхода (ScanFilter), по умолчанию пропускаются
+        только скрытые файлы и символические ссылки.
+        cancel_token - CancelToken; после отмены поиск завершается без
+        исключения, а self.cancelled становится True.
+        progress - функция, которой не чаще PROGRESS_INTERVAL передается
+        словарь progress_info().
+        reference - ReferenceIndex для метода 'reference'.
+        state - ScanState для метода 'incremental'.
+        """
+        if method == 'reference' and reference is None:
+            raise ValueError("Для метода reference нужен индекс эталонной папки")
+        if method == 'incremental' and state is None:
+            raise ValueError("Для метода incremental нужно состояние прошлого поиска")
+        
         directory = Path(directory)
+        self.reference = reference
+        self.state = state
+        self.workers = max(1, int(workers))
+        self.scan_filter = scan_filter or ScanFilter()
+        self.cancel_token = cancel_token or CancelToken()
+        self.progress_callback = progress
+        self.cancelled = False
+        self._reset_stats()
         
-        if method == 'hash':
-            return self._find_by_hash(directory)
-        elif method == 'name_size':
-            return self._find_by_name_size(directory)
-        elif method == 'content':
-            return self._find_by_content(directory)
-        else:
-            return self._find_by_hash(directory)
+        searches = {
+            'hash': self._find_by_hash,
+            'name_size': self._find_by_name_size,
+            'content': self._find_by_content,
+            'images_similar': self._find_similar_images,
+            'folders': self._find_duplicate_folders,
+            'reference': self._find_in_reference,
+            'archives': self._find_in_archives,
+            'incremental': self._find_incremental
+        }
+        search = searches.get(method, self._find_by_hash)
+        
+        try:
+            for key, files in search(directory):
+                self.stats['groups_found'] += 1
+                yield key, files
+                self._report_progress()
+        except OperationCancelled:
+            pass
+        finally:
+            self.cancelled = self.cancel_token.cancelled
+            if self.cache is not None:
+                self.cache.flush()
+            self._report_progress(force=True)
+    
+    def progress_info(self):
+        """Текущий прогресс поиска"""
+        elapsed = time.monotonic() - self._started
+        bytes_hashed = self.stats['bytes_hashed']
+        return {
+            'phase': self.stats['phase'],
+            'files_scanned': self.stats['files_scanned'],
+            'bytes_scanned': self.stats['bytes_scanned'],
+            'candidates_total': self.stats['candidates_total'],
+            'candidates_done': self.stats['candidates_done'],
+            'bytes_hashed': bytes_hashed,
+            'throughput': bytes_hashed / elapsed if elapsed > 0 else 0,
+            'groups_found': self.stats['groups_found'],
+            'elapsed': elapsed
+        }
+    
+    def _report_progress(self, force=False):
+        if self.progress_callback is None:
+            return
+        now = time.monotonic()
+        if force or now - self._last_progress >= self.PROGRESS_INTERVAL:
+            self._last_progress = now
+            self.progress_callback(self.progress_info())
+    
+    def _check_cancelled(self):
+        if self.cancel_token is not None:
+            self.cancel_token.check()
+    
+    def _add_hashed(self, byte_count):
+        with self._stats_lock:
+            self.stats['bytes_hashed'] += byte_count
+    
+    def _reset_stats(self):
+        """Сброс статистики этапов поиска"""
+        self.stats = {
+            'files_scanned': 0,
+            'bytes_scanned': 0,
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'algorithm': self.backend.name,
+            'hardlinks': {'groups': 0, 'files': 0, 'bytes': 0},
+            'stages': [],
+            'phase': 'scan',
+            'candidates_total': 0,
+            'candidates_done': 0,
+            'bytes_hashed': 0,
+            'groups_found': 0
+        }
+        self.hardlinks = []
+        self.records = RecordStore()
+        self._started = time.monotonic()
+        self._last_progress = 0
+    
+    def _iter_files(self, directory):
+        """Обход дерева через фильтр: один stat() на файл"""
+        for entry, st in self.scan_filter.walk(directory, full_stat=True):
+            self._check_cancelled()
+            self.stats['files_scanned'] += 1
+            self.stats['bytes_scanned'] += st.st_size
+            self._report_progress()
+            yield entry, st
+    
+    def _iter_records(self, directory):
+        """Файлы дерева, по одному на inode
+        
+        Жесткие ссылки на уже встреченный inode не хэшируются повторно: их
+        пути добавляются в 'links' первой записи. Такие пути уже
+        дедуплицированы файловой системой и места не занимают. Сворачиваются
+        все пути с одинаковым (устройство, inode), а не только при nlink > 1:
+        с follow_symlinks символьная ссылка и ее цель дают один inode при
+        nlink = 1 и не должны попасть в группу как две копии.
+        
+        Записи хранятся в self.records (RecordStore), генератор отдает их
+        индексы; представления FileRecord создаются только для кандидатов.
+        """
+        store = self.records
+        by_inode = {}
+        for entry, st in self._iter_files(directory):
+            if st.st_ino:
+                key = (st.st_dev, st.st_ino)
+                first = by_inode.get(key)
+                if first is not None:
+                    store.extras.setdefault(first, {}).setdefault('links', []).append(entry.path)
+                    continue
+                index = store.add(entry.path, entry.name, st)
+                if st.st_nlink > 1:
+                    store.extras[index] = {'links': []}
+                by_inode[key] = index
+            else:
+                index = store.add(entry.path, entry.name, st)
+            
+            yield index
+        
+        self.hardlinks = [store.view(index) for index in by_inode.values()
+                          if store.extras.get(index, {}).get('links')]
+        self.stats['hardlinks'] = {
+            'groups': len(self.hardlinks),
+            'files': sum(len(f['links']) for f in self.hardlinks),
+            'bytes': sum(f['size'] * len(f['links']) for f in self.hardlinks)
+        }
+    
+    def _prune_groups(self, groups, stage):
+        """Отбрасывает группы из одного файла и записывает, сколько отсеял этап"""
+        kept = {}
+        removed_files = 0
+        removed_bytes = 0
+        
+        for key, files in groups.items():
+            if len(files) > 1:
+                kept[key] = files
+            else:
+                removed_files += len(files)
+                removed_bytes += sum(f['size'] for f in files)
+        
+        self._add_stage(stage, removed_files, removed_bytes, kept)
+        return kept
+    
+    def _add_stage(self, stage, removed_files, removed_bytes, kept):
+        """Запись статистики этапа отсева (партии одного этапа суммируются)
+        
+        kept - оставшиеся группы или готовая пара (файлов, байт).
+        """
+        if isinstance(kept, dict):
+            kept = (sum(len(files) for files in kept.values()),
+                    sum(f['size'] for files in kept.values() for f in files))
+        counts = {
+            'removed_files': removed_files,
+            'removed_bytes': removed_bytes,
+            'remaining_files': kept[0],
+            'remaining_bytes': kept[1]
+        }
+        
+        for entry in self.stats['stages']:
+            if entry['stage'] == stage:
+                for key, value in counts.items():
+                    entry[key] += value
+                return
+        self.stats['stages'].append({'stage': stage, **counts})
+    
+    def _group_by_size(self, directory):
+        """Группировка по размеру: файл с уникальным размером не может иметь дубликатов
+        
+        Индексы сортируются по размеру вместо словаря списков: у большинства
+        файлов размер уникален, и список на каждый размер стоил бы больше
+        самой записи.
+        """
+        for _ in self._iter_records(directory):
+            pass
+        
+        files_by_size = self._size_groups(self.records)
+        
+        self.stats['phase'] = 'hash'
+        self.stats['candidates_total'] = sum(len(files) for files in files_by_size.values())
+        self._report_progress(force=True)
+        return files_by_size
+    
+    def _size_groups(self, store):
+        """Группы записей RecordStore одного размера (2+ файла)"""
+        sizes = store.sizes
+        order = sorted(range(len(store)), key=sizes.__getitem__)
+        
+        files_by_size = {}
+        removed_files = 0
+        removed_bytes = 0
+        start = 0
+        while start < len(order):
+            size = sizes[order[start]]
+            end = start + 1
+            while end < len(order) and sizes[order[end]] == size:
+                end += 1
+            if end - start > 1:
+                files_by_size[size] = [store.view(index) for index in order[start:end]]
+            else:
+                removed_files += 1
+                removed_bytes += size
+            start = end
+        del order
+        
+        self._add_stage('size', removed_files, removed_bytes, files_by_size)
+        return files_by_size
+    
+    def _potential_savings(self, files):
+        """Возможная экономия группы кандидатов: (файлов - 1) x размер"""
+        return (len(files) - 1) * min(f['size'] for f in files)
+    
+    def _by_savings(self, buckets):
+        """Группы кандидатов по убыванию возможной экономии"""
+        return sorted(buckets, key=self._potential_savings, reverse=True)
+    
+    def _batches(self, buckets):
+        """Группы одного размера, собранные в партии по BATCH_FILES/BATCH_BYTES"""
+        batch = []
+        batch_files = 0
+        batch_bytes = 0
+        
+        for files in buckets:
+            batch.append(files)
+            batch_files += len(files)
+            batch_bytes += files[0]['size'] * len(files)
+            if batch_files >= self.BATCH_FILES or batch_bytes >= self.BATCH_BYTES:
+                yield batch
+                batch = []
+                batch_files = 0
+                batch_bytes = 0
+        
+        if batch:
+            yield batch
+    
+    def _group_by_payload_size(self, directory):
+        """Группировка для режима payload: MP3 и JPEG по размеру полезных данных
+        
+        Файлы, отличающиеся только тегами, имеют разный размер, поэтому
+        для них ключ - размер данных без метаданных ('payload', размер).
+        Заголовки разбираются у всех таких файлов до отсева, остальные
+        файлы группируются по размеру как обычно.
+        """
+        store = self.records
+        files_by_key = defaultdict(list)
+        
+        for record in self._iter_records(directory):
+            file_info = store.view(record)
+            ranges = None
+            if store.name(record).lower().endswith(PAYLOAD_EXTENSIONS):
+                try:
+                    ranges = payload_ranges(file_info['path'])
+                except OSError:
+                    pass
+            
+            if ranges is None:
+                files_by_key[file_info['size']].append(file_info)
+            else:
+                file_info['payload'] = ranges
+                file_info['payload_size'] = sum(length for offset, length in ranges)
+                files_by_key[('payload', file_info['payload_size'])].append(file_info)
+        
+        files_by_size = self._prune_groups(files_by_key, 'size')
+        
+        self.stats['phase'] = 'hash'
+        self.stats['candidates_total'] = sum(len(files) for files in files_by_size.values())
+        self._report_progress(force=True)
+        return files_by_size
     
     def _find_by_hash(self, directory):
         """Поиск по хэшу файла"""
-        files_by_hash = defaultdict(list)
+        if self.memory_limit:
+            yield from self._find_by_hash_external(directory)
+            return
         
-        for file_path in directory.rglob('*'):
-            if file_path.is_file() and not file_path.name.startswith('.'):
-                try:
-                    file_hash = self._calculate_hash(file_path)
-                    
-                    files_by_hash[file_hash].append({
-                        'path': str(file_path),
-                        'name': file_path.name,
-                        'size': file_path.stat().st_size,
-                        'ctime': file_path.stat().st_ctime,
-                        'mtime': file_path.stat().st_mtime
-                    })
-                except Exception as e:
+        # Этап 1: отсев по размеру
+        if self.payload:
+            files_by_size = self._group_by_payload_size(directory)
+        else:
+            files_by_size = self._group_by_size(directory)
+        
+        yield from self._confirm_by_hash(files_by_size)
+    
+    def _confirm_by_hash(self, files_by_size, known=None, on_hash=None):
+        """Этапы 2 и 3 метода hash: отсев групп по фрагментам и полному хэшу
+        
+        known - уже известные полные хэши {индекс записи: хэш}; группы с
+        такими файлами минуют выборочный этап. on_hash(file_info, hash)
+        вызывается для каждого посчитанного полного хэша.
+        """
+        known = known or {}
+        payload_kind = f"payload-{self.backend.name}"
+        
+        for batch in self._batches(self._by_savings(files_by_size.values())):
+            # Этап 2: дробим группы по выборочным фрагментам (начало, середина, конец)
+            files_by_sample = defaultdict(list)
+            to_sample = []
+            for files in batch:
+                size = files[0]['size']
+                if 'payload' in files[0]:
+                    # Размеры файлов в группе разные, фрагменты несравнимы
+                    files_by_sample[('payload', files[0]['payload_size'])].extend(files)
+                elif known and any(f.index in known for f in files):
+                    # Сравнение с известным полным хэшем требует полного хэша
+                    files_by_sample[(size, 'known')].extend(files)
+                elif size <= self.SAMPLE_SIZE * 3:
+                    # Фрагменты покрыли бы весь файл - сразу считаем полный хэш
+                    files_by_sample[(size, None)].extend(files)
+                else:
+                    to_sample.extend(files)
+            
+            sample_kind = f"sample-{self.sample_backend.name}"
+            for file_info, sample_hash in self._hash_files(to_sample, sample_kind, self._sample_hash_of):
+                files_by_sample[(file_info['size'], sample_hash)].append(file_info)
+            
+            files_by_sample = self._prune_groups(files_by_sample, 'sample')
+            
+            # Этап 3: полный хэш только для файлов, совпавших по фрагментам
+            to_hash = [file_info for files in self._by_savings(files_by_sample.values()) for file_info in files]
+            
+            to_hash_payload = [file_info for file_info in to_hash if 'payload' in file_info]
+            to_hash = [file_info for file_info in to_hash if 'payload' not in file_info]
+            
+            files_by_hash = defaultdict(list)
+            for file_info in to_hash:
+                if file_info.index in known:
+                    file_info['algorithm'] = self.backend.name
+                    files_by_hash[known[file_info.index]].append(file_info)
+            to_hash = [file_info for file_info in to_hash if file_info.index not in known]
+            
+            for file_info, file_hash in self._hash_files(to_hash, self.backend.name, self._hash_of):
+                # Алгоритм хранится с результатом, чтобы отчеты были сопоставимы
+                file_info['algorithm'] = self.backend.name
+                files_by_hash[file_hash].append(file_info)
+                if on_hash is not None:
+                    on_hash(file_info, file_hash)
+            
+            for file_info, file_hash in self._hash_files(to_hash_payload, payload_kind, self._payload_hash_of):
+                file_info['algorithm'] = payload_kind
+                files_by_hash[f"{payload_kind}:{file_hash}"].append(file_info)
+            
+            self.stats['candidates_done'] += sum(len(files) for files in batch)
+            
+            # Оставляем только дубликаты (2+ файла с одинаковым хэшем)
+            files_by_hash = self._prune_groups(files_by_hash, 'hash')
+            for key, files in files_by_hash.items():
+                if key.startswith(f"{payload_kind}:"):
+                    self._mark_payload_matches(files)
+            yield from sorted(files_by_hash.items(), key=lambda item: self._potential_savings(item[1]),
+                              reverse=True)
+    
+    def _find_by_hash_external(self, directory):
+        """Метод hash с ограниченной памятью: группы через внешнюю сортировку
+        
+        Вместо RecordStore и словарей групп каждый этап пишет элементы
+        (ключ, путь, описание) в ExternalSorter и читает их обратно
+        отсортированными, так что кандидаты одного ключа идут подряд и
+        отсеиваются потоком: размер -> фрагменты -> полный хэш. В памяти
+        буферы двух сортировщиков (по половине memory_limit) и партия
+        хэшируемых файлов. Жесткие ссылки на один inode после сортировки
+        по (размер, устройство, inode) оказываются рядом и сворачиваются в
+        'links' первой записи. Режим payload и порядок по экономии здесь
+        не используются, группы выдаются после последнего этапа.
+        """
+        budget = max(1, self.memory_limit // 2)
+        by_size = ExternalSorter(budget, self.temp_dir)
+        by_sample = ExternalSorter(budget, self.temp_dir)
+        by_hash = ExternalSorter(budget, self.temp_dir)
+        
+        try:
+            for entry, st in self._iter_files(directory):
+                by_size.add((st.st_size, st.st_dev, st.st_ino, entry.path, entry.name,
+                             st.st_mtime, st.st_ctime, st.st_nlink), 2 * len(entry.path))
+            
+            self.stats['phase'] = 'hash'
+            self._report_progress(force=True)
+            
+            # Этап 2: выборочные фрагменты у файлов, совпавших по размеру
+            candidates = self._repeated(((f['size'], f) for f in self._unique_inodes(by_size.sorted())),
+                                        'size')
+            sample_kind = f"sample-{self.sample_backend.name}"
+            for batch in self._chunks(candidates):
+                self.stats['candidates_total'] += len(batch)
+                to_sample = []
+                for file_info in batch:
+                    if file_info['size'] <= self.SAMPLE_SIZE * 3:
+                        by_sample.add(((file_info['size'], ''), file_info['path'], file_info),
+                                      self._external_bytes(file_info))
+                    else:
+                        to_sample.append(file_info)
+                for file_info, sample_hash in self._hash_files(to_sample, sample_kind, self._sample_hash_of):
+                    by_sample.add(((file_info['size'], sample_hash), file_info['path'], file_info),
+                                  self._external_bytes(file_info))
+            
+            # Этап 3: полный хэш у файлов, совпавших по фрагментам
+            candidates = self._repeated(((item[0], item[2]) for item in by_sample.sorted()), 'sample')
+            for batch in self._chunks(candidates):
+                for file_info, file_hash in self._hash_files(batch, self.backend.name, self._hash_of):
+                    file_info['algorithm'] = self.backend.name
+                    by_hash.add((file_hash, file_info['path'], file_info), self._external_bytes(file_info))
+                self.stats['candidates_done'] += len(batch)
+            
+            removed_files = 0
+            removed_bytes = 0
+            kept_files = 0
+            kept_bytes = 0
+            for file_hash, items in groupby(by_hash.sorted(), key=lambda item: item[0]):
+                files = [item[2] for item in items]
+                if len(files) < 2:
+                    removed_files += 1
+                    removed_bytes += files[0]['size']
                     continue
+                kept_files += len(files)
+                kept_bytes += sum(f['size'] for f in files)
+                yield file_hash, files
+            self._add_stage('hash', removed_files, removed_bytes, (kept_files, kept_bytes))
+        finally:
+            by_size.close()
+            by_sample.close()
+            by_hash.close()
+    
+    def _unique_inodes(self, items):
+        """Описания файлов из потока, отсортированного по (размер, устройство, inode)"""
+        hardlinks = self.stats['hardlinks']
+        current = None
+        for size, dev, ino, path, name, mtime, ctime, nlink in items:
+            # Один inode при nlink = 1 - символьная ссылка и ее цель (follow_symlinks)
+            if current is not None and ino and (dev, ino) == (current['dev'], current['ino']):
+                links = current.setdefault('links', [])
+                if not links:
+                    hardlinks['groups'] += 1
+                links.append(path)
+                hardlinks['files'] += 1
+                hardlinks['bytes'] += size
+                continue
+            
+            if current is not None:
+                yield current
+            current = {'path': path, 'name': name, 'size': size, 'ctime': ctime, 'mtime': mtime,
+                       'dev': dev, 'ino': ino, 'nlink': nlink}
+            if nlink > 1:
+                current['links'] = []
+        
+        if current is not None:
+            yield current
+    
+    def _repeated(self, items, stage):
+        """Файлы из отсортированного потока пар (ключ, файл) с ключом, который встречается 2+ раза
+        
+        Держит в памяти только первый файл текущего ключа. Отсеянные
+        файлы записываются в статистику этапа stage.
+        """
+        removed_files = 0
+        removed_bytes = 0
+        kept_files = 0
+        kept_bytes = 0
+        first = None
+        first_key = None
+        emitted = False
+        
+        for file_key, file_info in items:
+            if first is not None and file_key == first_key:
+                if not emitted:
+                    emitted = True
+                    kept_files += 1
+                    kept_bytes += first['size']
+                    yield first
+                kept_files += 1
+                kept_bytes += file_info['size']
+                yield file_info
+                continue
+            
+            if first is not None and not emitted:
+                removed_files += 1
+                removed_bytes += first['size']
+            first = file_info
+            first_key = file_key
+            emitted = False
         
-        # Оставляем только дубликаты (2+ файла с одинаковым хэшем)
-        return {k: v for k, v in files_by_hash.items() if len(v) > 1}
+        if first is not None and not emitted:
+            removed_files += 1
+            removed_bytes += first['size']
+        self._add_stage(stage, removed_files, removed_bytes, (kept_files, kept_bytes))
+    
+    def _chunks(self, files):
+        """Партии по BATCH_FILES файлов для пула потоков"""
+        batch = []
+        for file_info in files:
+            batch.append(file_info)
+            if len(batch) >= self.BATCH_FILES:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
+    def _external_bytes(self, file_info):
+        """Оценка памяти на описание файла в буфере ExternalSorter"""
+        return 600 + 2 * len(file_info['path']) + 100 * len(file_info.get('links', ()))
+    
+    def _find_incremental(self, directory):
+        """Новые дубликаты с прошлого завершенного поиска в этой папке
+        
+        Обход только собирает stat() и передает его в ScanState. Хэшируются
+        новые и измененные файлы, размер которых совпал с другим файлом,
+        и старые файлы этих размеров без сохраненного хэша. Выдаются только
+        группы, в которых есть новый файл. Состояние перезаписывается после
+        завершенного поиска, при отмене остается прежним. Первый поиск в
+        папке полный. Режим payload здесь не используется.
+        """
+        state = self.state
+        store = self.records
+        kind = self.backend.name
+        
+        state.begin()
+        try:
+            for record in self._iter_records(directory):
+                state.add(record, store.path(record), store.sizes[record], store.mtimes[record],
+                          store.devs[record], store.inos[record])
+            
+            self.stats['phase'] = 'hash'
+            self._report_progress(force=True)
+            
+            # По байту на запись вместо множества индексов
+            changed = bytearray(len(store))
+            known = {}
+            groups = defaultdict(list)
+            for record, is_new, file_hash in state.candidates(kind):
+                if is_new:
+                    changed[record] = 1
+                if file_hash is not None:
+                    known[record] = file_hash
+                groups[store.sizes[record]].append(store.view(record))
+            
+            files_by_size = {size: files for size, files in groups.items() if len(files) > 1}
+            del groups
+            candidates = sum(len(files) for files in files_by_size.values())
+            self._add_stage('size', len(store) - candidates,
+                            sum(store.sizes) - sum(size * len(files) for size, files in files_by_size.items()),
+                            files_by_size)
+            self.stats['candidates_total'] = candidates
+            self._report_progress(force=True)
+            
+            def on_hash(file_info, file_hash):
+                state.set_hash(file_info.index, file_hash)
+            
+            for key, files in self._confirm_by_hash(files_by_size, known, on_hash):
+                if any(changed[f.index] for f in files):
+                    yield key, files
+            
+            state.commit(kind)
+        finally:
+            state.close()
     
     def _find_by_name_size(self, directory):
         """Поиск по имени и размеру (быстрый)"""
+        store = self.records
         files_by_key = defaultdict(list)
         
-        for file_path in directory.rglob('*'):
-            if file_path.is_file() and not file_path.name.startswith('.'):
-                try:
-                    key = f"{file_path.name}_{file_path.stat().st_size}"
-                    
-                    files_by_key[key].append({
-                        'path': str(file_path),
-                        'name': file_path.name,
-                        'size': file_path.stat().st_size,
-                        'ctime': file_path.stat().st_ctime,
-                        'mtime': file_path.stat().st_mtime
-                    })
-                except:
-                    continue
+        for index in self._iter_records(directory):
+            files_by_key[(store.name(index), store.sizes[index])].append(index)
+        
+        groups = {}
+        for (name, size), indices in files_by_key.items():
+            groups[f"{name}_{size}"] = [store.view(index) for index in indices]
         
-        return {k: v for k, v in files_by_key.items() if len(v) > 1}
+        yield from self._prune_groups(groups, 'name_size').items()
     
     def _find_by_content(self, directory):
         """Поиск по содержимому (точный, но медленный)"""
-        # Реализация сравнения содержимого файлов
-        return self._find_by_hash(directory)  # Используем хэш как временное решение
+        files_by_size = self._group_by_size(directory)
+        
+        for files in self._by_savings(files_by_size.values()):
+            size = files[0]['size']
+            found = {}
+            for content_hash, group in self._compare_content(files):
+                for file_info in group:
+                    file_info['algorithm'] = self.backend.name
+                found[content_hash] = group
+            
+            found_files = sum(len(group) for group in found.values())
+            self._add_stage('content', len(files) - found_files, size * (len(files) - found_files), found)
+            self.stats['candidates_done'] += len(files)
+            
+            yield from found.items()
+    
+    def _find_duplicate_folders(self, directory):
+        """Поиск одинаковых папок по дереву хэшей (Merkle)
+        
+        Хэш папки строится из отсортированных имен детей и их хэшей, так что
+        совпадает только у папок с одинаковой структурой и содержимым.
+        Сначала папки сравниваются по именам и размерам, и содержимое
+        хэшируется только у совпавших. Вложенные совпадения сворачиваются
+        в самую верхнюю одинаковую папку, поэтому группы не пересекаются. Ограничения по размеру, include,
+        exclude и скрытые файлы здесь не действуют: очистка удаляет папку
+        целиком, поэтому сравниваться должно все ее содержимое.
+        """
+        scan_filter = copy.copy(self.scan_filter)
+        scan_filter.min_size = 0
+        scan_filter.max_size = None
+        scan_filter.include = None
+        scan_filter.exclude = None
+        scan_filter.skip_hidden = False
+        self.scan_filter = scan_filter
+        
+        store = self.records
+        for entry, st in self._iter_files(directory):
+            store.add(entry.path, entry.name, st)
+        
+        # Дерево папок по префиксам путей из RecordStore
+        root = os.path.join(str(directory), '')
+        files_in = defaultdict(list)
+        subdirs = defaultdict(list)
+        for index in range(len(store)):
+            files_in[store.dirs[store.dir_ids[index]]].append(index)
+        
+        registered = set()
+        for folder in list(files_in):
+            while folder != root and folder not in registered:
+                registered.add(folder)
+                parent = os.path.join(os.path.dirname(folder[:-1]), '')
+                subdirs[parent].append(folder)
+                folder = parent
+        
+        folders = set(files_in) | registered | {root}
+        # Снизу вверх: дети всегда глубже родителя
+        bottom_up = sorted(folders, key=lambda folder: folder.count(os.sep), reverse=True)
+        
+        def folder_name(folder):
+            return os.path.basename(folder[:-1])
+        
+        def digest(items):
+            hasher = hashlib.blake2b(digest_size=16)
+            for item in sorted(items):
+                hasher.update(repr(item).encode('utf-8', 'surrogatepass'))
+            return hasher.hexdigest()
+        
+        # Этап 1: подпись из имен и размеров
+        shape = {}
+        total_size = {}
+        file_count = {}
+        for folder in bottom_up:
+            items = [('f', store.name(i), store.sizes[i]) for i in files_in.get(folder, ())]
+            items += [('d', folder_name(child), shape[child]) for child in subdirs.get(folder, ())]
+            shape[folder] = digest(items)
+            total_size[folder] = (sum(store.sizes[i] for i in files_in.get(folder, ())) +
+                                  sum(total_size[child] for child in subdirs.get(folder, ())))
+            file_count[folder] = (len(files_in.get(folder, ())) +
+                                  sum(file_count[child] for child in subdirs.get(folder, ())))
+        
+        by_shape = defaultdict(list)
+        for folder in folders:
+            if folder != root and total_size[folder] > 0:
+                by_shape[shape[folder]].append(folder)
+        candidates = {folder for group in by_shape.values() if len(group) > 1 for folder in group}
+        
+        # Этап 2: хэши содержимого только под папками-кандидатами
+        needed = set()
+        for folder in reversed(bottom_up):
+            parent = os.path.join(os.path.dirname(folder[:-1]), '')
+            if folder in candidates or (folder != root and parent in needed):
+                needed.add(folder)
+        
+        to_hash = [store.view(i) for folder in needed for i in files_in.get(folder, ())]
+        self.stats['phase'] = 'hash'
+        self.stats['candidates_total'] = len(to_hash)
+        self._report_progress(force=True)
+        
+        file_hashes = {}
+        for file_info, file_hash in self._hash_files(to_hash, self.backend.name, self._hash_of):
+            file_hashes[file_info.index] = file_hash
+            self.stats['candidates_done'] += 1
+        
+        content = {}
+        for folder in bottom_up:
+            if folder not in needed:
+                continue
+            items = []
+            for i in files_in.get(folder, ()):
+                items.append(('f', store.name(i), file_hashes.get(i)))
+            for child in subdirs.get(folder, ()):
+                items.append(('d', folder_name(child), content[child]))
+            # Нечитаемый файл делает папку несравнимой
+            content[folder] = None if any(item[2] is None for item in items) else digest(items)
+        
+        by_content = defaultdict(list)
+        for folder in candidates:
+            if content[folder] is not None:
+                by_content[content[folder]].append(folder)
+        groups = {key: group for key, group in by_content.items() if len(group) > 1}
+        
+        # Этап 3: папки внутри других одинаковых папок покрыты группой предка.
+        # В группах остаются только верхние папки, чтобы очистка разных
+        # групп не удалила все экземпляры вложенной папки.
+        matched = {folder for group in groups.values() for folder in group}
+        for key, group in list(groups.items()):
+            top = [folder for folder in group
+                   if os.path.join(os.path.dirname(folder[:-1]), '') not in matched]
+            if len(top) > 1:
+                groups[key] = top
+            else:
+                del groups[key]
+        
+        result = {}
+        for key, group in groups.items():
+            records = []
+            for folder in group:
+                path = folder[:-1]
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                records.append({
+                    'path': path,
+                    'name': folder_name(folder),
+                    'size': total_size[folder],
+                    'ctime': st.st_ctime,
+                    'mtime': st.st_mtime,
+                    'files': file_count[folder],
+                    'is_dir': True,
+                    'algorithm': self.backend.name
+                })
+            if len(records) > 1:
+                result[key] = records
+        
+        # В статистике этапа отсеянным считается все, что не попало в папки-дубликаты
+        reported = {os.path.join(f['path'], '') for records in result.values() for f in records}
+        covered_files = 0
+        covered_bytes = 0
+        for folder in reported:
+            parent = os.path.join(os.path.dirname(folder[:-1]), '')
+            while parent != root and parent not in reported:
+                parent = os.path.join(os.path.dirname(parent[:-1]), '')
+            if parent == root:
+                covered_files += file_count[folder]
+                covered_bytes += total_size[folder]
+        self._add_stage('folders', len(store) - covered_files,
+                        sum(store.sizes) - covered_bytes, result)
+        
+        yield from result.items()
+    
+    def _find_in_reference(self, directory):
+        """Файлы папки, которые уже есть в эталонной папке
+        
+        Индекс эталона загружается или строится один раз, дальше файлы
+        проверяемой папки идут потоком: хэшируются только совпавшие по
+        размеру, и только для них хэшируются эталонные файлы того же
+        размера. Каждая группа - эталонный файл (reference=True, при
+        очистке всегда сохраняется) и найденная копия.
+        """
+        index = self.reference
+        self.stats['phase'] = 'index'
+        self._report_progress(force=True)
+        
+        # Индекс общий для любых фильтров поиска, поэтому без ограничений размера
+        index_filter = copy.copy(self.scan_filter)
+        index_filter.min_size = 0
+        index_filter.max_size = None
+        index_filter.include = None
+        index.ensure(index_filter, self.cancel_token)
+        
+        # Если эталон лежит внутри проверяемой папки, его файлы не кандидаты
+        skip_prefix = None
+        # Если проверяемая папка внутри эталона, ее файлы не эталонные: иначе
+        # одинаковые A и B дали бы группы [A, B] и [B, A] и очистка удалила бы обе копии
+        own_prefix = None
+        candidate_root = str(directory.resolve())
+        if index.contains(candidate_root):
+            own_prefix = os.path.join(candidate_root, '')
+        else:
+            try:
+                inside = os.path.commonpath([candidate_root, index.root]) == candidate_root
+            except ValueError:
+                inside = False
+            if inside:
+                skip_prefix = os.path.join(str(directory), os.path.relpath(index.root, candidate_root), '')
+        
+        self.stats['phase'] = 'hash'
+        store = self.records
+        batch = []
+        found_files = 0
+        found_bytes = 0
+        try:
+            for record in self._iter_records(directory):
+                if store.sizes[record] not in index.by_size:
+                    continue
+                file_info = store.view(record)
+                if skip_prefix is not None and file_info['path'].startswith(skip_prefix):
+                    continue
+                
+                batch.append(file_info)
+                self.stats['candidates_total'] += 1
+                if len(batch) >= self.BATCH_FILES:
+                    for key, group in self._match_reference(batch, own_prefix):
+                        found_files += 1
+                        found_bytes += group[1]['size']
+                        yield key, group
+                    batch = []
+            
+            for key, group in self._match_reference(batch, own_prefix):
+                found_files += 1
+                found_bytes += group[1]['size']
+                yield key, group
+        finally:
+            index.save()
+            self._add_stage('reference', len(store) - found_files,
+                            sum(store.sizes) - found_bytes, {})
+    
+    def _match_reference(self, batch, own_prefix=None):
+        """Сверка партии кандидатов с эталонными файлами тех же размеров
+        
+        Эталонные файлы с путем на own_prefix (проверяемая папка внутри
+        эталона) не участвуют в сверке.
+        """
+        index = self.reference
+        kind = self.backend.name
+        entries = {}
+        for size in {f['size'] for f in batch}:
+            entries[size] = [entry for entry in index.entries(size)
+                             if own_prefix is None or not entry['path'].startswith(own_prefix)]
+        
+        unhashed = [entry for group in entries.values() for entry in group if kind not in entry['hashes']]
+        for entry, file_hash in self._hash_files(unhashed, kind, self._hash_of):
+            index.set_hash(entry, kind, file_hash)
+        
+        by_hash = {}
+        for group in entries.values():
+            for entry in group:
+                if kind in entry['hashes']:
+                    by_hash.setdefault(entry['hashes'][kind], []).append(entry)
+        
+        for file_info, file_hash in self._hash_files(batch, kind, self._hash_of):
+            self.stats['candidates_done'] += 1
+            # Тот же inode (жесткая ссылка или сам эталон) - не отдельная копия
+            matches = [entry for entry in by_hash.get(file_hash, ())
+                       if (entry['dev'], entry['ino']) != (file_info['dev'], file_info['ino'])]
+            if not matches:
+                continue
+            
+            file_info['algorithm'] = kind
+            reference = {key: value for key, value in matches[0].items() if key != 'hashes'}
+            reference.update(reference=True, algorithm=kind)
+            yield f"{file_hash}:{file_info['path']}", [reference, file_info]
+    
+    def _find_in_archives(self, directory):
+        """Файлы, которые уже лежат внутри ZIP-архивов
+        
+        Из архива читается только центральный каталог: размер и CRC32
+        каждого файла. Члены архивов становятся виртуальными записями
+        (virtual=True, путь вида "архив.zip!/путь/в/архиве") и сравниваются
+        по (размер, CRC32) с обычными файлами и членами других архивов.
+        У обычных файлов CRC32 считается, только если размер совпал с
+        каким-то членом архива. В группу попадает хотя бы одна виртуальная
+        запись. Виртуальные записи не удаляются, а обычные файлы удаляются
+        только из групп, подтвержденных полным хэшем (verify_archives).
+        """
+        store = self.records
+        loose = defaultdict(list)
+        members = defaultdict(list)
+        
+        for record in self._iter_records(directory):
+            name = store.name(record)
+            if name.lower().endswith(ARCHIVE_EXTENSIONS):
+                for member in self._archive_members(store.path(record)):
+                    members[member['size']].append(member)
+            else:
+                loose[store.sizes[record]].append(record)
+        
+        # CRC32 только для обычных файлов, совпавших по размеру с членами архивов
+        to_crc = [store.view(record) for size in members for record in loose.get(size, ())]
+        self.stats['phase'] = 'hash'
+        self.stats['candidates_total'] = len(to_crc)
+        self._report_progress(force=True)
+        
+        by_crc = defaultdict(list)
+        for size, group in members.items():
+            for member in group:
+                by_crc[(size, member['crc'])].append(member)
+        
+        crc32 = get_hash_backend('crc32')
+        for file_info, crc in self._hash_files(to_crc, crc32.name,
+                                               lambda f: self._calculate_hash(f['path'], backend=crc32)):
+            self.stats['candidates_done'] += 1
+            key = (file_info['size'], int(crc, 16))
+            if key in by_crc:
+                by_crc[key].append(file_info)
+        
+        candidates = {key: group for key, group in by_crc.items() if len(group) > 1}
+        groups = {}
+        for (size, crc), group in candidates.items():
+            if not self.verify_archives:
+                for file_info in group:
+                    if not file_info.get('virtual'):
+                        file_info['unverified'] = True
+                groups[f"{crc:08x}-{size}"] = group
+                continue
+            
+            # Подтверждение полным хэшем: члены архива распаковываются потоком
+            by_hash = defaultdict(list)
+            for file_info in group:
+                self._check_cancelled()
+                try:
+                    if file_info.get('virtual'):
+                        file_hash = self._hash_archive_member(file_info)
+                    else:
+                        file_hash = self._cached_hash(file_info, self.backend.name, self._hash_of)
+                except (OSError, zipfile.BadZipFile, RuntimeError):
+                    continue
+                file_info['algorithm'] = self.backend.name
+                by_hash[file_hash].append(file_info)
+            for file_hash, confirmed in by_hash.items():
+                if len(confirmed) > 1 and any(f.get('virtual') for f in confirmed):
+                    groups[file_hash] = confirmed
+        
+        # Отсеянными считаются обычные файлы, не найденные ни в одном архиве
+        matched = [f for group in groups.values() for f in group if not f.get('virtual')]
+        self._add_stage('archives',
+                        sum(len(records) for records in loose.values()) - len(matched),
+                        sum(size * len(records) for size, records in loose.items()) -
+                        sum(f['size'] for f in matched),
+                        groups)
+        yield from groups.items()
+    
+    def _archive_members(self, archive_path):
+        """Виртуальные записи членов ZIP-архива по центральному каталогу"""
+        try:
+            with zipfile.ZipFile(archive_path) as archive:
+                infos = archive.infolist()
+        except (OSError, zipfile.BadZipFile, ValueError):
+            return []
+        
+        members = []
+        for info in infos:
+            if info.is_dir() or info.file_size == 0:
+                continue
+            try:
+                timestamp = datetime(*info.date_time).timestamp()
+            except (ValueError, OverflowError):
+                timestamp = 0
+            members.append({
+                'path': f"{archive_path}!/{info.filename}",
+                'name': info.filename.rsplit('/', 1)[-1],
+                'size': info.file_size,
+                'ctime': timestamp,
+                'mtime': timestamp,
+                'crc': info.CRC,
+                'archive': archive_path,
+                'member': info.filename,
+                'virtual': True
+            })
+        return members
+    
+    def _hash_archive_member(self, member):
+        """Полный хэш члена архива с потоковой распаковкой"""
+        hasher = self.backend.new()
+        with zipfile.ZipFile(member['archive']) as archive:
+            with archive.open(member['member']) as f:
+                while block := f.read(self.buffer_size):
+                    self._check_cancelled()
+                    hasher.update(block)
+                    self._add_hashed(len(block))
+        return hasher.hexdigest()
+    
+    def _find_similar_images(self, directory):
+        """Поиск похожих изображений по перцептивному хэшу (dHash)
+        
+        Группа - компонента связности: изображения попадают в одну группу,
+        если их цепочкой связывают пары с расстоянием не больше
+        image_distance. Соседи ищутся в MultiIndexHash, а не перебором всех
+        пар. Записи помечаются similar=True: такие группы не очищаются
+        автоматически и не дают освобождаемого места. Минимальный размер
+        здесь не действует: уменьшенные копии обычно намного меньше
+        оригинала, и порог отсеял бы именно их.
+        """
+        scan_filter = copy.copy(self.scan_filter)
+        scan_filter.min_size = 0
+        self.scan_filter = scan_filter
+        
+        store = self.records
+        images = [store.view(index) for index in self._iter_records(directory)
+                  if is_image(store.name(index))]
+        self.stats['phase'] = 'hash'
+        self.stats['candidates_total'] = len(images)
+        self.stats['algorithm'] = 'dhash'
+        self._report_progress(force=True)
+        
+        tree = MultiIndexHash(self.image_distance, len(images))
+        parent = list(range(len(images)))
+        hashes = {}
+        
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        
+        for index, image_hash in self._image_hashes(images):
+            # Соединяем с уже добавленными соседями, затем добавляем сам хэш
+            for distance, other in tree.search(image_hash, self.image_distance):
+                root, other_root = find(index), find(other)
+                if root != other_root:
+                    parent[other_root] = root
+            tree.add(image_hash, index)
+            hashes[index] = image_hash
+            self.stats['candidates_done'] += 1
+            self._report_progress()
+        
+        components = defaultdict(list)
+        for index in hashes:
+            components[find(index)].append(index)
+        
+        groups = {}
+        for root, members in components.items():
+            root_hash = hashes[members[0]]
+            key = f"{root_hash:016x}"
+            group = []
+            for index in members:
+                file_info = images[index]
+                file_info['algorithm'] = 'dhash'
+                file_info['distance'] = hamming(hashes[index], root_hash)
+                file_info['similar'] = True
+                group.append(file_info)
+            groups[key] = group
+        
+        yield from self._prune_groups(groups, 'similar').items()
     
-    def _calculate_hash(self, file_path, chunk_size=8192):
-        """Вычисление MD5 хэша файла"""
-        md5 = hashlib.md5()
+    def _image_hashes(self, images):
+        """Пары (индекс, dHash) для изображений; нечитаемые пропускаются
         
-        with open(file_path, 'rb') as f:
-            while chunk := f.read(chunk_size):
-                md5.update(chunk)
+        Декодирование нагружает процессор и держит GIL, поэтому при
+        workers > 1 промахи кэша считаются в пуле процессов.
+        """
+        missing = []
+        for index, file_info in enumerate(images):
+            self._check_cancelled()
+            cached = None
+            if self.cache is not None:
+                cached = self.cache.get(self._file_key(file_info), 'dhash')
+            if cached is not None:
+                self.stats['cache_hits'] += 1
+                if cached:
+                    yield index, int(cached, 16)
+            else:
+                missing.append(index)
+        
+        paths = [images[index]['path'] for index in missing]
+        if self.workers > 1 and len(paths) > 1:
+            # spawn: fork процесса с потоками Qt небезопасен
+            pool = ProcessPoolExecutor(max_workers=self.workers,
+                                       mp_context=multiprocessing.get_context('spawn'))
+            results = pool.map(dhash, paths, chunksize=32)
+        else:
+            pool = None
+            results = map(dhash, paths)
         
-        return md5.hexdigest()
+        try:
+            for index, image_hash in zip(missing, results):
+                self._check_cancelled()
+                if self.cache is not None:
+                    # Пустая строка запоминает, что файл не декодируется
+                    value = f"{image_hash:016x}" if image_hash is not None else ""
+                    self.cache.put(images[index]['path'], self._file_key(images[index]), 'dhash', value)
+                    self.stats['cache_misses'] += 1
+                if image_hash is not None:
+                    yield index, image_hash
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
     
-    def remove_duplicates(self, duplicates_data):
-        """Удаление дубликатов, сохранение только самых новых"""
+    def _compare_content(self, files):
+        """Побайтовое сравнение файлов одного размера
+        
+        Файлы читаются блоками в ногу и делятся на подгруппы, как только их
+        блоки расходятся; файл, оставшийся в одиночестве, сразу отбрасывается.
+        Попутно для каждой группы считается хэш содержимого - он одинаков у
+        всех ее файлов и служит ключом результата. Группы больше
+        MAX_OPEN_FILES сначала дробятся без удержания открытых файлов.
+        """
+        size = files[0]['size']
+        stack = [(files, 0, self.backend.new())]
+        
+        while stack:
+            group, offset, hasher = stack.pop()
+            
+            if offset >= size:
+                yield hasher.hexdigest(), group
+            elif len(group) <= self.MAX_OPEN_FILES:
+                yield from self._compare_open_group(group, offset, hasher)
+            else:
+                stack.extend(self._split_large_group(group, offset, hasher))
+    
+    def _split_large_group(self, group, offset, hasher):
+        """Один шаг сравнения для группы, которую нельзя держать открытой целиком
+        
+        Каждый файл открывается, читается один блок и закрывается. Чтобы не
+        хранить в памяти блоки всех файлов, подгруппы различаются по
+        BLAKE2-отпечатку блока.
+        """
+        by_block = defaultdict(list)
+        blocks = {}
+        
+        for file_info in group:
+            self._check_cancelled()
+            try:
+                with open(file_info['path'], 'rb') as f:
+                    f.seek(offset)
+                    block = f.read(self.CONTENT_BLOCK_SIZE)
+            except OSError:
+                continue
+            self._add_hashed(len(block))
+            
+            key = hashlib.blake2b(block, digest_size=16).digest()
+            by_block[key].append(file_info)
+            blocks.setdefault(key, block)
+        
+        subgroups = []
+        for key, members in by_block.items():
+            if len(members) > 1:
+                sub_hasher = hasher.copy()
+                sub_hasher.update(blocks[key])
+                subgroups.append((members, offset + self.CONTENT_BLOCK_SIZE, sub_hasher))
+        return subgroups
+    
+    def _compare_open_group(self, group, offset, hasher):
+        """Сравнение группы с одновременно открытыми файлами до конца файлов"""
+        size = group[0]['size']
+        handles = {}
+        
+        try:
+            for i, file_info in enumerate(group):
+                try:
+                    handle = open(file_info['path'], 'rb')
+                    handle.seek(offset)
+                    handles[i] = handle
+                except OSError:
+                    continue
+            
+            subgroups = [(list(handles), hasher)]
+            while subgroups and offset < size:
+                self._check_cancelled()
+                self._report_progress()
+                next_subgroups = []
+                
+                for members, group_hasher in subgroups:
+                    by_block = defaultdict(list)
+                    for i in members:
+                        try:
+                            block = handles[i].read(self.CONTENT_BLOCK_SIZE)
+                        except OSError:
+                            handles.pop(i).close()
+                            continue
+                        self._add_hashed(len(block))
+                        by_block[block].append(i)
+                    
+                    for block, sub_members in by_block.items():
+                        if len(sub_members) < 2:
+                            # Уникальный файл - дальше не читаем
+                            for i in sub_members:
+                                handles.pop(i).close()
+                            continue
+                        
+                        sub_hasher = group_hasher.copy() if len(by_block) > 1 else group_hasher
+                        sub_hasher.update(block)
+                        next_subgroups.append((sub_members, sub_hasher))
+                
+                subgroups = next_subgroups
+                offset += self.CONTENT_BLOCK_SIZE
+            
+            for members, group_hasher in subgroups:
+                yield group_hasher.hexdigest(), [group[i] for i in members]
+        finally:
+            for handle in handles.values():
+                handle.close()
+    
+    def _hash_files(self, files, kind, calculate):
+        """Хэширование списка файлов пулом потоков
+        
+        Возвращает пары (file_info, hash) в исходном порядке файлов, поэтому
+        результат не зависит от числа потоков. Нечитаемые файлы пропускаются.
+        """
+        def task(file_info):
+            try:
+                return self._cached_hash(file_info, kind, calculate)
+            except OSError:
+                return None
+        
+        if self.workers == 1 or len(files) < 2:
+            results = map(task, files)
+        else:
+            results = self._ordered_map(task, files)
+        
+        for file_info, file_hash in zip(files, results):
+            self._report_progress()
+            if file_hash is not None:
+                yield file_info, file_hash
+    
+    def _ordered_map(self, task, items):
+        """map() на пуле потоков с ограниченным окном задач, порядок сохраняется"""
+        window = self.workers * 4
+        
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            try:
+                for item in items:
+                    pending.append(executor.submit(task, item))
+                    if len(pending) >= window:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                # При отмене или ошибке не ждем еще не начатые задачи
+                for future in pending:
+                    future.cancel()
+    
+    def _cached_hash(self, file_info, kind, calculate):
+        """Хэш из постоянного кэша, либо вычисление с сохранением в кэш"""
+        if self.cache is None:
+            return calculate(file_info)
+        
+        file_key = self._file_key(file_info)
+        file_hash = self.cache.get(file_key, kind)
+        if file_hash is None:
+            file_hash = calculate(file_info)
+            self.cache.put(file_info['path'], file_key, kind, file_hash)
+            with self._stats_lock:
+                self.stats['cache_misses'] += 1
+        else:
+            with self._stats_lock:
+                self.stats['cache_hits'] += 1
+        return file_hash
+    
+    def _file_key(self, file_info):
+        """Ключ записи в кэше хэшей"""
+        return (file_info['dev'], file_info['ino'], file_info['size'], file_info['mtime'])
+    
+    def _hash_of(self, file_info):
+        return self._calculate_hash(file_info['path'])
+    
+    def _payload_hash_of(self, file_info):
+        return self._calculate_hash(file_info['path'], ranges=file_info['payload'])
+    
+    def _mark_payload_matches(self, files):
+        """Пометка payload_match, если файлы группы совпали только без метаданных
+        
+        Группа совпадает целиком, если у всех файлов одинаковые размер,
+        расположение данных и байты вне данных (теги, EXIF) - тогда
+        хэшируются только метаданные. Иначе удаление копии потеряло бы ее
+        метаданные, и вся группа помечается для ручной очистки.
+        """
+        first = files[0]
+        identical = all(f['size'] == first['size'] and f['payload'] == first['payload'] for f in files)
+        if identical:
+            metadata = _outside_ranges(first['payload'], first['size'])
+            try:
+                digests = {self._calculate_hash(f['path'], ranges=metadata) for f in files}
+            except OSError:
+                digests = None
+            identical = digests is not None and len(digests) == 1
+        
+        if not identical:
+            for file_info in files:
+                file_info['payload_match'] = True
+    
+    def _sample_hash_of(self, file_info):
+        return self._calculate_sample_hash(file_info['path'], file_info['size'])
+    
+    def _calculate_hash(self, file_path, backend=None, buffer_size=None, ranges=None):
+        """Вычисление хэша файла выбранным алгоритмом
+        
+        ranges - список (смещение, длина): хэшируются только эти участки.
+        """
+        backend = backend or self.backend
+        hasher = backend.new()
+        buffer = bytearray(buffer_size or self.buffer_size)
+        view = memoryview(buffer)
+        
+        hashed = 0
+        
+        # Читаем в один переиспользуемый буфер без лишних копий
+        try:
+            with open(file_path, 'rb', buffering=0) as f:
+                if ranges is None:
+                    while n := f.readinto(buffer):
+                        self._check_cancelled()
+                        hasher.update(view[:n])
+                        hashed += n
+                else:
+                    for offset, length in ranges:
+                        f.seek(offset)
+                        while length > 0:
+                            n = f.readinto(view[:min(length, len(buffer))])
+                            if not n:
+                                break
+                            self._check_cancelled()
+                            hasher.update(view[:n])
+                            hashed += n
+                            length -= n
+        finally:
+            self._add_hashed(hashed)
+        
+        return hasher.hexdigest()
+    
+    def _calculate_sample_hash(self, file_path, size):
+        """Хэш фрагментов файла: начало, середина и конец по SAMPLE_SIZE байт"""
+        hasher = self.sample_backend.new()
+        offsets = (0, (size - self.SAMPLE_SIZE) // 2, size - self.SAMPLE_SIZE)
+        
+        hashed = 0
+        
+        self._check_cancelled()
+        try:
+            with open(file_path, 'rb') as f:
+                for offset in offsets:
+                    f.seek(offset)
+                    data = f.read(self.SAMPLE_SIZE)
+                    hasher.update(data)
+                    hashed += len(data)
+        finally:
+            # Файл мог уменьшиться после stat() - учитываем прочитанное
+            self._add_hashed(hashed)
+        
+        return hasher.hexdigest()
+    
+    def is_reclaimable(self, file_info):
+        """Освободит ли удаление файла место
+        
+        Если на inode есть жесткие ссылки вне результатов поиска, удаление
+        найденных путей ничего не освобождает.
+        """
+        if not is_removable(file_info):
+            return False
+        return file_info.get('nlink', 1) <= 1 + len(file_info.get('links', ()))
+    
+    def wasted_space(self, files):
+        """Сколько байт освободит удаление группы, кроме самого нового файла"""
+        files_sorted = sorted(files, key=keep_priority, reverse=True)
+        return sum(f['size'] for f in files_sorted[1:] if self.is_reclaimable(f))
+    
+    def remove_duplicates(self, duplicates_data, mode='delete'):
+        """Удаление дубликатов, сохранение только самых новых
+        
+        mode='delete' удаляет лишние копии. 'hardlink' и 'reflink' заменяют
+        каждую копию жесткой ссылкой или reflink-клоном сохраняемого файла,
+        так что все старые пути остаются рабочими. Если сохраняется член
+        архива, источником ссылок становится самая новая обычная копия (см.
+        link_source), и она остается как есть. Эталонные файлы (метод
+        reference) сохраняются всегда. Освобожденное место по группам
+        записывается в self.reclaim_report.
+        """
+        if mode not in RECLAIM_MODES:
+            raise ValueError(f"Неизвестный способ очистки: {mode}")
+        
         deleted_count = 0
+        self.reclaim_report = {}
         
         for hash_val, files in duplicates_data.items():
             # Сортируем по дате создания (новые первыми)
-            files.sort(key=lambda x: x['ctime'], reverse=True)
+            files.sort(key=keep_priority, reverse=True)
+            kept = files[0] if mode == 'delete' else link_source(files)
+            report = {'files': 0, 'bytes': 0, 'errors': 0}
             
-            # Сохраняем самый новый, остальные удаляем
+            # Сохраняем самый новый, остальные удаляем или заменяем ссылками
             for file_info in files[1:]:
+                if file_info is kept or not is_removable(file_info):
+                    continue
+                paths = [file_info['path']] + file_info.get('links', [])
                 try:
-                    Path(file_info['path']).unlink()
+                    if file_info.get('is_dir'):
+                        # Одинаковые папки (метод folders) только удаляются целиком
+                        if mode != 'delete':
+                            raise OSError(f"Папку можно только удалить: {file_info['path']}")
+                        if not self._folder_unchanged(file_info):
+                            raise OSError(f"В папке есть несравненное содержимое: {file_info['path']}")
+                        shutil.rmtree(file_info['path'])
+                        deleted_count += 1
+                        report['files'] += 1
+                        report['bytes'] += file_info['size']
+                        continue
+                    
+                    reclaimable = os.stat(file_info['path']).st_nlink <= len(paths)
+                    if mode == 'delete':
+                        if not reclaimable:
+                            # Остальные ссылки на inode не в результатах - места не освободим
+                            continue
+                        for path in paths:
+                            Path(path).unlink()
+                    else:
+                        if not self._files_equal(kept['path'], file_info['path']):
+                            raise OSError(f"Содержимое отличается: {file_info['path']}")
+                        for path in paths:
+                            self._replace_with_link(kept['path'], path, mode)
+                    
                     deleted_count += 1
+                    report['files'] += 1
+                    if reclaimable:
+                        report['bytes'] += file_info['size']
                 except:
+                    report['errors'] += 1
                     continue
+            
+            self.reclaim_report[hash_val] = report
         
         return deleted_count
+    
+    def _folder_unchanged(self, file_info):
+        """Содержит ли папка ровно сравненные файлы (число и общий размер)
+        
+        Проверка перед rmtree: если в папке появились файлы, есть
+        символьные ссылки, специальные файлы или нечитаемые подпапки, их
+        содержимое не сравнивалось и папка не удаляется.
+        """
+        files = 0
+        size = 0
+        stack = [file_info['path']]
+        try:
+            while stack:
+                with os.scandir(stack.pop()) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            files += 1
+                            size += entry.stat(follow_symlinks=False).st_size
+                        else:
+                            return False
+        except OSError:
+            return False
+        return (files, size) == (file_info['files'], file_info['size'])
+    
+    def _files_equal(self, path_a, path_b):
+        """Побайтовая проверка, что два файла совпадают"""
+        if os.path.getsize(path_a) != os.path.getsize(path_b):
+            return False
+        
+        with open(path_a, 'rb') as a, open(path_b, 'rb') as b:
+            while True:
+                block_a = a.read(self.buffer_size)
+                if block_a != b.read(self.buffer_size):
+                    return False
+                if not block_a:
+                    return True
+    
+    def _replace_with_link(self, source, target, mode):
+        """Атомарная замена target ссылкой на source через временное имя
+        
+        При ошибке target остается нетронутым.
+        """
+        target = Path(target)
+        temp = target.with_name(f".{target.name}.{uuid.uuid4().hex[:8]}.meticulous-tmp")
+        
+        try:
+            if mode == 'hardlink':
+                os.link(source, temp)
+            else:
+                reflink(source, temp)
+                shutil.copystat(target, temp)
+            os.replace(temp, target)
+        except BaseException:
+            try:
+                temp.unlink()
+            except OSError:
+                pass
+            raise
+
+
+def reflink(source, target):
+    """Клонирование файла без копирования данных (copy-on-write)
+    
+    Поддерживается на Linux (Btrfs, XFS, bcachefs...) и macOS (APFS). На
+    остальных системах и файловых системах выбрасывается OSError.
+    """
+    if sys.platform == 'darwin':
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.clonefile(os.fsencode(source), os.fsencode(target), 0) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), str(target))
+        return
+    
+    if fcntl is None:
+        raise OSError(f"Reflink не поддерживается на этой системе: {target}")
+    
+    with open(source, 'rb') as src, open(target, 'xb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.unlink(target)
+            raise
@@ -0,0 +1,108 @@
+# external_sort.py
+"""Внешняя сортировка для поиска дубликатов в деревьях больше памяти"""
+import heapq
+import os
+import pickle
+import tempfile
+
+
+class ExternalSorter:
+    """Сортировка потока кортежей с ограниченным объемом памяти
+    
+    Элементы копятся в буфере, пока их оценочный объем не превысит
+    memory_limit байт; тогда буфер сортируется и записывается во временный
+    файл (серию). sorted() сливает серии через heapq.merge, читая каждую
+    порциями по CHUNK_ITEMS элементов. Если серий больше MERGE_FANIN, они
+    сначала сливаются в более длинные, чтобы не держать открытыми сотни
+    файлов. Кроме буфера память занимают только порции открытых серий.
+    """
+    
+    MERGE_FANIN = 64
+    CHUNK_ITEMS = 256
+    # Оценка памяти на элемент без учета строк и словарей внутри него
+    ITEM_OVERHEAD = 200
+    
+    def __init__(self, memory_limit, temp_dir=None):
+        self.memory_limit = memory_limit
+        self.temp_dir = temp_dir
+        self.count = 0
+        self.runs_written = 0
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._runs = []
+    
+    def add(self, item, extra_bytes=0):
+        """Добавление элемента; extra_bytes - оценка памяти на его содержимое"""
+        self._buffer.append(item)
+        self._buffer_bytes += self.ITEM_OVERHEAD + extra_bytes
+        self.count += 1
+        if self._buffer_bytes >= self.memory_limit:
+            self._spill()
+    
+    def _spill(self):
+        self._buffer.sort()
+        self._write_run(self._buffer)
+        self._buffer = []
+        self._buffer_bytes = 0
+    
+    def _write_run(self, items):
+        fd, path = tempfile.mkstemp(prefix='meticulous_sort_', suffix='.tmp', dir=self.temp_dir)
+        self._runs.append(path)
+        self.runs_written += 1
+        with os.fdopen(fd, 'wb') as f:
+            chunk = []
+            for item in items:
+                chunk.append(item)
+                if len(chunk) >= self.CHUNK_ITEMS:
+                    pickle.dump(chunk, f, pickle.HIGHEST_PROTOCOL)
+                    chunk = []
+            if chunk:
+                pickle.dump(chunk, f, pickle.HIGHEST_PROTOCOL)
+        return path
+    
+    def _read_run(self, path):
+        with open(path, 'rb') as f:
+            while True:
+                try:
+                    chunk = pickle.load(f)
+                except EOFError:
+                    return
+                yield from chunk
+    
+    def _remove_runs(self, paths):
+        for path in paths:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            self._runs.remove(path)
+    
+    def sorted(self):
+        """Все элементы по возрастанию; после чтения сортировщик пуст"""
+        try:
+            if not self._runs:
+                # Все поместилось в память - временные файлы не нужны
+                items = self._buffer
+                self._buffer = []
+                self._buffer_bytes = 0
+                items.sort()
+                yield from items
+                return
+            
+            if self._buffer:
+                self._spill()
+            
+            while len(self._runs) > self.MERGE_FANIN:
+                group = self._runs[:self.MERGE_FANIN]
+                self._write_run(heapq.merge(*(self._read_run(path) for path in group)))
+                self._remove_runs(group)
+            
+            yield from heapq.merge(*(self._read_run(path) for path in self._runs))
+        finally:
+            self.close()
+    
+    def close(self):
+        """Удаление временных файлов"""
+        self._remove_runs(list(self._runs))
+        self._buffer = []
+        self._buffer_bytes = 0
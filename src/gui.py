@@ -1,6 +1,7 @@
 import json
 import os
 import shutil
+import time
 from datetime import datetime
 from pathlib import Path
 import hashlib
@@ -9,9 +10,16 @@ from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from .widgets import CategoryWidget, FilePreviewTable, StatisticsWidget
 from .organizer import FileOrganizer
-from .duplicates import DuplicateFinder
+from .duplicates import DuplicateFinder, is_removable, keep_priority, link_source
+from .duplicate_results import DuplicateResults
+from .table_models import DuplicateTableModel
+from .reference_index import ReferenceIndex
+from .scan_state import ScanState
+from .stats_engine import collect_stats
 from .languages import LanguageManager
 from .config_manager import ConfigManager
+from .hash_cache import HashCache
+from .scan_filter import ScanFilter, DEFAULT_EXCLUDE, parse_patterns
 from .utils import *
 
 class ModernButton(QPushButton):
@@ -38,9 +46,18 @@ class FileOrganizerApp(QMainWindow):
         self.config_file = self.config_manager.get_config_path()
         self.language_manager = LanguageManager()
         self.organizer = FileOrganizer()
-        self.duplicate_finder = DuplicateFinder()
+        self.hash_cache = HashCache(self.config_manager.app_dir / "data" / "hash_cache.sqlite")
+        self.duplicate_finder = DuplicateFinder(cache=self.hash_cache)
+        self.dup_results = DuplicateResults()
         self.current_language = "ru"
         self.is_scanning = False
+        # Фоновые предпросмотр и статистика; отброшенные потоки, которые еще дорабатывают
+        self.preview_thread = None
+        self.stats_thread = None
+        self.stale_threads = []
+        self.preview_restarted = False
+        self.organize_thread = None
+        self.dup_thread = None
         
         self.setup_ui()
         self.load_config()
@@ -106,6 +123,17 @@ class FileOrganizerApp(QMainWindow):
         self.preview_btn.setIcon(QIcon.fromTheme("view-list"))
         self.preview_btn.clicked.connect(self.preview_organization)
         
+        # Останавливает идущий предпросмотр или сортировку
+        self.stop_btn = ModernButton("⏹ Остановить")
+        self.stop_btn.setEnabled(False)
+        self.stop_btn.clicked.connect(self.stop_task)
+        
+        # Правка категорий во время предпросмотра перезапускает его после паузы в наборе
+        self.preview_restart_timer = QTimer(self)
+        self.preview_restart_timer.setSingleShot(True)
+        self.preview_restart_timer.setInterval(400)
+        self.preview_restart_timer.timeout.connect(self.restart_preview)
+        
         self.organize_btn = ModernButton("🚀 Запустить сортировку", primary=True)
         self.organize_btn.setIcon(QIcon.fromTheme("go-next"))
         self.organize_btn.clicked.connect(self.organize_files)
@@ -113,6 +141,7 @@ class FileOrganizerApp(QMainWindow):
         quick_panel.addWidget(self.source_btn)
         quick_panel.addWidget(self.scan_btn)
         quick_panel.addWidget(self.preview_btn)
+        quick_panel.addWidget(self.stop_btn)
         quick_panel.addWidget(self.organize_btn)
         quick_panel.addStretch()
         
@@ -267,25 +296,63 @@ class FileOrganizerApp(QMainWindow):
         self.clean_dups_btn.setIcon(QIcon.fromTheme("edit-delete"))
         self.clean_dups_btn.clicked.connect(self.clean_duplicates)
         
+        self.stop_dups_btn = ModernButton("⏹ Остановить", danger=True)
+        self.stop_dups_btn.setEnabled(False)
+        self.stop_dups_btn.clicked.connect(self.stop_duplicates)
+        
+        self.export_dups_btn = ModernButton("📊 Экспорт")
+        self.export_dups_btn.setMaximumWidth(120)
+        self.export_dups_btn.clicked.connect(self.export_duplicates)
+        
         control_panel.addWidget(self.dup_source_label)
         control_panel.addWidget(self.dup_source_path, 1)
         control_panel.addWidget(self.dup_browse_btn)
         control_panel.addWidget(self.find_dups_btn)
+        control_panel.addWidget(self.stop_dups_btn)
         control_panel.addWidget(self.clean_dups_btn)
+        control_panel.addWidget(self.export_dups_btn)
         
         layout.addLayout(control_panel)
         
+        # Эталонная папка для метода "Есть в эталонной папке"
+        reference_panel = QHBoxLayout()
+        reference_panel.setSpacing(10)
+        
+        reference_label = QLabel("Эталонная папка:")
+        reference_label.setStyleSheet("font-weight: 500;")
+        
+        self.dup_reference_path = QLineEdit()
+        self.dup_reference_path.setReadOnly(True)
+        self.dup_reference_path.setMinimumHeight(36)
+        self.dup_reference_path.setPlaceholderText("Архив, с которым сравнивается папка поиска")
+        
+        self.dup_reference_browse_btn = ModernButton("📁 Выбрать")
+        self.dup_reference_browse_btn.setMaximumWidth(120)
+        self.dup_reference_browse_btn.clicked.connect(self.browse_reference_folder)
+        
+        self.dup_rebuild_index_checkbox = QCheckBox("Пересобрать индекс")
+        self.dup_rebuild_index_checkbox.setToolTip("Индекс эталонной папки сохраняется между поисками.\n"
+                                                   "Пересоберите его, если в архив добавлялись файлы")
+        
+        reference_panel.addWidget(reference_label)
+        reference_panel.addWidget(self.dup_reference_path, 1)
+        reference_panel.addWidget(self.dup_reference_browse_btn)
+        reference_panel.addWidget(self.dup_rebuild_index_checkbox)
+        
+        layout.addLayout(reference_panel)
+        
         # Splitter для результатов
         dup_splitter = QSplitter(Qt.Horizontal)
         dup_splitter.setChildrenCollapsible(False)
         
-        # Таблица дубликатов
-        self.dup_table = QTableWidget()
-        self.dup_table.setColumnCount(5)
-        self.dup_table.setHorizontalHeaderLabels(["📄 Имя файла", "📁 Путь", "📏 Размер", "📅 Дата создания", "🔑 Хэш"])
+        # Таблица дубликатов: строки берутся из dup_results при отрисовке
+        self.dup_model = DuplicateTableModel(self.dup_results, self.format_size, self)
+        self.dup_table = QTableView()
+        self.dup_table.setModel(self.dup_model)
         self.dup_table.horizontalHeader().setStretchLastSection(True)
         self.dup_table.horizontalHeader().setDefaultAlignment(Qt.AlignLeft)
-        self.dup_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.dup_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.dup_table.setSelectionBehavior(QTableView.SelectRows)
         self.dup_table.setAlternatingRowColors(True)
         self.dup_table.setSortingEnabled(True)
         self.dup_table.setShowGrid(False)
@@ -372,7 +439,7 @@ class FileOrganizerApp(QMainWindow):
         self.tab_widget.addTab(dup_tab, "🔄 Дубликаты")
         
         # Подключаем выделение в таблице
-        self.dup_table.itemSelectionChanged.connect(self.on_duplicate_selected)
+        self.dup_table.selectionModel().selectionChanged.connect(self.on_duplicate_selected)
     
     def setup_settings_tab(self):
         """Вкладка настроек"""
@@ -448,12 +515,19 @@ class FileOrganizerApp(QMainWindow):
         method_label.setStyleSheet("font-weight: 500;")
         
         self.dup_method_combo = QComboBox()
-        self.dup_method_combo.addItems(["По хэшу (точно)", "По имени и размеру (быстро)", "По содержимому (медленно)"])
+        self.dup_method_combo.addItems(["По хэшу (точно)", "По имени и размеру (быстро)", "По содержимому (медленно)",
+                                        "Похожие изображения", "Одинаковые папки", "Есть в эталонной папке",
+                                        "Содержимое ZIP-архивов", "Только новые файлы"])
         self.dup_method_combo.setMinimumHeight(36)
         self.dup_method_combo.setMaximumWidth(300)
         self.dup_method_combo.setToolTip("""По хэшу - самый точный, но медленный
 По имени и размеру - быстрый, но менее точный
-По содержимому - самый точный, но очень медленный""")
+По содержимому - самый точный, но очень медленный
+Похожие изображения - уменьшенные и пересжатые копии фото
+Одинаковые папки - скопированные папки целиком, одной строкой на папку
+Есть в эталонной папке - файлы, которые уже сохранены в архиве
+Содержимое ZIP-архивов - файлы, которые лежат и отдельно, и внутри ZIP
+Только новые файлы - дубликаты среди файлов, добавленных с прошлого поиска этим методом""")
         
         method_layout.addWidget(method_label)
         method_layout.addWidget(self.dup_method_combo)
@@ -467,7 +541,7 @@ class FileOrganizerApp(QMainWindow):
         size_label.setStyleSheet("font-weight: 500;")
         
         self.dup_size_threshold = QSpinBox()
-        self.dup_size_threshold.setRange(1, 1000)
+        self.dup_size_threshold.setRange(0, 100000)
         self.dup_size_threshold.setValue(10)
         self.dup_size_threshold.setSuffix(" МБ")
         self.dup_size_threshold.setMinimumHeight(36)
@@ -479,8 +553,150 @@ class FileOrganizerApp(QMainWindow):
         size_layout.addWidget(self.dup_size_threshold)
         size_layout.addStretch()
         
+        # Потоки хэширования
+        workers_layout = QHBoxLayout()
+        workers_layout.setSpacing(8)
+        
+        workers_label = QLabel("Потоков хэширования:")
+        workers_label.setStyleSheet("font-weight: 500;")
+        
+        self.dup_workers = QSpinBox()
+        self.dup_workers.setRange(1, 64)
+        self.dup_workers.setValue(4)
+        self.dup_workers.setMinimumHeight(36)
+        self.dup_workers.setMaximumWidth(150)
+        self.dup_workers.setButtonSymbols(QSpinBox.UpDownArrows)
+        self.dup_workers.setToolTip("Сколько файлов хэшировать одновременно.\n"
+                                    "Больше потоков ускоряет SSD и сетевые диски, для HDD лучше 1-2")
+        
+        workers_layout.addWidget(workers_label)
+        workers_layout.addWidget(self.dup_workers)
+        workers_layout.addStretch()
+        
+        # Порог похожести изображений
+        distance_layout = QHBoxLayout()
+        distance_layout.setSpacing(8)
+        
+        distance_label = QLabel("Порог похожести изображений:")
+        distance_label.setStyleSheet("font-weight: 500;")
+        
+        self.dup_image_distance = QSpinBox()
+        self.dup_image_distance.setRange(0, 32)
+        self.dup_image_distance.setValue(8)
+        self.dup_image_distance.setSuffix(" бит")
+        self.dup_image_distance.setMinimumHeight(36)
+        self.dup_image_distance.setMaximumWidth(150)
+        self.dup_image_distance.setButtonSymbols(QSpinBox.UpDownArrows)
+        self.dup_image_distance.setToolTip("Сколько бит из 64 может отличаться у перцептивных хэшей.\n"
+                                           "0 - почти одинаковые картинки, 10 и больше - возможны ложные совпадения")
+        
+        distance_layout.addWidget(distance_label)
+        distance_layout.addWidget(self.dup_image_distance)
+        distance_layout.addStretch()
+        
+        # Лимит памяти метода "По хэшу"
+        memory_layout = QHBoxLayout()
+        memory_layout.setSpacing(8)
+        
+        memory_label = QLabel("Лимит памяти поиска по хэшу:")
+        memory_label.setStyleSheet("font-weight: 500;")
+        
+        self.dup_memory_limit = QSpinBox()
+        self.dup_memory_limit.setRange(0, 65536)
+        self.dup_memory_limit.setValue(0)
+        self.dup_memory_limit.setSuffix(" МБ")
+        self.dup_memory_limit.setSpecialValueText("Без лимита")
+        self.dup_memory_limit.setMinimumHeight(36)
+        self.dup_memory_limit.setMaximumWidth(150)
+        self.dup_memory_limit.setButtonSymbols(QSpinBox.UpDownArrows)
+        self.dup_memory_limit.setToolTip("Для деревьев из десятков миллионов файлов: списки файлов сортируются\n"
+                                         "через временные файлы и не держатся в памяти целиком")
+        
+        memory_layout.addWidget(memory_label)
+        memory_layout.addWidget(self.dup_memory_limit)
+        memory_layout.addStretch()
+        
         dup_layout.addLayout(method_layout)
         dup_layout.addLayout(size_layout)
+        dup_layout.addLayout(workers_layout)
+        dup_layout.addLayout(distance_layout)
+        dup_layout.addLayout(memory_layout)
+        
+        self.dup_verify_archives = QCheckBox("Подтверждать совпадения с ZIP-архивами полным хэшем")
+        self.dup_verify_archives.setToolTip("Без проверки файлы сравниваются по размеру и CRC32 из каталога архива\n"
+                                            "и не удаляются. Проверка распаковывает совпавшие файлы")
+        dup_layout.addWidget(self.dup_verify_archives)
+        
+        self.dup_payload_hash = QCheckBox("Игнорировать теги MP3 и метаданные JPEG")
+        self.dup_payload_hash.setToolTip("Метод «По хэшу» сравнивает только аудиокадры MP3 и данные изображения JPEG:\n"
+                                         "файлы с разными тегами ID3/APE или EXIF считаются дубликатами")
+        dup_layout.addWidget(self.dup_payload_hash)
+        
+        # Фильтры обхода папок
+        filter_group = QGroupBox("Фильтры сканирования")
+        filter_layout = QVBoxLayout(filter_group)
+        filter_layout.setSpacing(12)
+        
+        exclude_layout = QHBoxLayout()
+        exclude_layout.setSpacing(8)
+        
+        exclude_label = QLabel("Исключить:")
+        exclude_label.setStyleSheet("font-weight: 500;")
+        
+        self.scan_exclude_edit = QLineEdit(", ".join(DEFAULT_EXCLUDE))
+        self.scan_exclude_edit.setPlaceholderText("node_modules, .git, *.tmp...")
+        self.scan_exclude_edit.setMinimumHeight(36)
+        self.scan_exclude_edit.setToolTip("Шаблоны имен или путей через запятую.\n"
+                                          "Исключенные папки не сканируются вовсе")
+        
+        exclude_layout.addWidget(exclude_label)
+        exclude_layout.addWidget(self.scan_exclude_edit, 1)
+        
+        include_layout = QHBoxLayout()
+        include_layout.setSpacing(8)
+        
+        include_label = QLabel("Только файлы:")
+        include_label.setStyleSheet("font-weight: 500;")
+        
+        self.scan_include_edit = QLineEdit()
+        self.scan_include_edit.setPlaceholderText("*.jpg, *.mp4... (пусто - все файлы)")
+        self.scan_include_edit.setMinimumHeight(36)
+        
+        include_layout.addWidget(include_label)
+        include_layout.addWidget(self.scan_include_edit, 1)
+        
+        max_size_layout = QHBoxLayout()
+        max_size_layout.setSpacing(8)
+        
+        max_size_label = QLabel("Максимальный размер файла:")
+        max_size_label.setStyleSheet("font-weight: 500;")
+        
+        self.scan_max_size = QSpinBox()
+        self.scan_max_size.setRange(0, 10000000)
+        self.scan_max_size.setValue(0)
+        self.scan_max_size.setSuffix(" МБ")
+        self.scan_max_size.setSpecialValueText("Без ограничений")
+        self.scan_max_size.setMinimumHeight(36)
+        self.scan_max_size.setMaximumWidth(180)
+        
+        max_size_layout.addWidget(max_size_label)
+        max_size_layout.addWidget(self.scan_max_size)
+        max_size_layout.addStretch()
+        
+        self.skip_hidden_checkbox = QCheckBox("Пропускать скрытые и системные файлы")
+        self.skip_hidden_checkbox.setChecked(True)
+        
+        self.follow_symlinks_checkbox = QCheckBox("Переходить по символическим ссылкам")
+        
+        self.one_filesystem_checkbox = QCheckBox("Не выходить за пределы файловой системы")
+        self.one_filesystem_checkbox.setToolTip("Не заходить в подключенные диски и точки монтирования")
+        
+        filter_layout.addLayout(exclude_layout)
+        filter_layout.addLayout(include_layout)
+        filter_layout.addLayout(max_size_layout)
+        filter_layout.addWidget(self.skip_hidden_checkbox)
+        filter_layout.addWidget(self.follow_symlinks_checkbox)
+        filter_layout.addWidget(self.one_filesystem_checkbox)
         
         # Язык
         lang_group = QGroupBox("Язык интерфейса")
@@ -519,6 +735,7 @@ class FileOrganizerApp(QMainWindow):
         # Добавляем все группы
         layout.addWidget(sort_group)
         layout.addWidget(dup_group)
+        layout.addWidget(filter_group)
         layout.addWidget(lang_group)
         layout.addStretch()
         layout.addLayout(button_layout)
@@ -606,6 +823,10 @@ class FileOrganizerApp(QMainWindow):
         cleanup_action.triggered.connect(self.cleanup_empty_folders)
         tools_menu.addAction(cleanup_action)
         
+        purge_cache_action = QAction("🧽 Очистить устаревшие записи кэша хэшей", self)
+        purge_cache_action.triggered.connect(self.purge_hash_cache)
+        tools_menu.addAction(purge_cache_action)
+        
         tools_menu.addSeparator()
         
         open_log_action = QAction("📋 Открыть лог", self)
@@ -644,6 +865,19 @@ class FileOrganizerApp(QMainWindow):
                 self.source_path.setText(folder)
                 self.status_label.setText(f"Выбрана исходная папка: {folder}")
     
+    def browse_reference_folder(self):
+        """Выбор эталонной папки"""
+        folder = QFileDialog.getExistingDirectory(
+            self,
+            "Выберите эталонную папку",
+            self.dup_reference_path.text() or str(Path.home()),
+            QFileDialog.ShowDirsOnly | QFileDialog.DontResolveSymlinks
+        )
+        
+        if folder:
+            self.dup_reference_path.setText(folder)
+            self.status_label.setText(f"Выбрана эталонная папка: {folder}")
+    
     def scan_folder(self):
         """Сканирование папки"""
         if self.is_scanning:
@@ -670,24 +904,24 @@ class FileOrganizerApp(QMainWindow):
                 finished = pyqtSignal(int, int)
                 error = pyqtSignal(str)
                 
-                def __init__(self, source_dir):
+                def __init__(self, source_dir, scan_filter):
                     super().__init__()
                     self.source_dir = source_dir
+                    self.scan_filter = scan_filter
                 
                 def run(self):
                     try:
                         file_count = 0
                         total_size = 0
-                        for file_path in self.source_dir.rglob('*'):
-                            if file_path.is_file():
-                                file_count += 1
-                                total_size += file_path.stat().st_size
+                        for entry, st in self.scan_filter.walk(self.source_dir):
+                            file_count += 1
+                            total_size += st.st_size
                         
                         self.finished.emit(file_count, total_size)
                     except Exception as e:
                         self.error.emit(str(e))
             
-            self.scan_thread = ScanThread(source_dir)
+            self.scan_thread = ScanThread(source_dir, self.get_scan_filter())
             self.scan_thread.finished.connect(self.on_scan_finished)
             self.scan_thread.error.connect(self.on_scan_error)
             self.scan_thread.start()
@@ -718,90 +952,176 @@ class FileOrganizerApp(QMainWindow):
         QMessageBox.warning(self, "Ошибка сканирования", f"Ошибка: {error_msg}")
         self.status_label.setText("Ошибка сканирования")
     
-    def preview_organization(self):
-        """Предпросмотр сортировки"""
+    def get_date_format(self):
+        """Формат даты для папок из настроек"""
+        date_format_map = {
+            0: "%Y-%m-%d",
+            1: "%d-%m-%Y",
+            2: "%Y/%m/%d",
+            3: "%m-%d-%Y",
+            4: "%d %b %Y"
+        }
+        return date_format_map.get(self.date_format_combo.currentIndex(), "%Y-%m-%d")
+    
+    def preview_organization(self, restart=False):
+        """Предпросмотр сортировки в фоновом потоке
+        
+        Строки приходят в таблицу партиями по мере обхода папки. Предыдущий
+        предпросмотр, если он еще идет, отбрасывается.
+        """
         source_dir = Path(self.source_path.text())
         
+        if self.organize_thread is not None:
+            return
+        
         if not source_dir.exists():
-            QMessageBox.warning(self, "Ошибка", "Папка не существует!")
+            if not restart:
+                QMessageBox.warning(self, "Ошибка", "Папка не существует!")
             return
         
         # Получаем категории
         categories = self.get_categories()
         if not categories:
-            QMessageBox.warning(self, "Ошибка", "Не заданы категории!")
+            if not restart:
+                QMessageBox.warning(self, "Ошибка", "Не заданы категории!")
             return
         
-        # Показываем прогресс
-        self.progress_bar.setVisible(True)
-        self.progress_bar.setRange(0, 0)
-        self.status_label.setText("Подготовка предпросмотра...")
-        QApplication.processEvents()
+        self.discard_preview()
+        self.preview_restarted = restart
+        self.preview_table.clear()
         
-        try:
-            # Очищаем таблицу предпросмотра
-            self.preview_table.clear()
-            self.preview_table.setRowCount(0)
-            
-            # Определяем формат даты
-            date_format_map = {
-                0: "%Y-%m-%d",
-                1: "%d-%m-%Y",
-                2: "%Y/%m/%d",
-                3: "%m-%d-%Y",
-                4: "%d %b %Y"
-            }
-            date_format = date_format_map.get(self.date_format_combo.currentIndex(), "%Y-%m-%d")
-            
-            # Заполняем таблицу предпросмотра
-            file_count = 0
-            for file_path in source_dir.iterdir():
-                if file_path.is_file():
-                    ext = file_path.suffix.lower()
-                    
-                    # Находим категорию
-                    category = "Разное"
-                    for cat_name, extensions in categories.items():
-                        if ext in [e.lower() for e in extensions]:
-                            category = cat_name
-                            break
-                    
-                    # Добавляем в таблицу
-                    row = self.preview_table.rowCount()
-                    self.preview_table.insertRow(row)
-                    self.preview_table.setItem(row, 0, QTableWidgetItem(file_path.name))
-                    self.preview_table.setItem(row, 1, QTableWidgetItem(ext if ext else "без расширения"))
-                    self.preview_table.setItem(row, 2, QTableWidgetItem(category))
-                    
-                    # Определяем новую папку
-                    if self.date_checkbox.isChecked():
-                        try:
-                            timestamp = os.path.getctime(file_path)
-                            date_str = datetime.fromtimestamp(timestamp).strftime(date_format)
-                            new_folder = f"{category}/{date_str}"
-                        except:
-                            new_folder = category
-                    else:
-                        new_folder = category
-                    
-                    self.preview_table.setItem(row, 3, QTableWidgetItem(new_folder))
-                    file_count += 1
+        from PyQt5.QtCore import QThread, pyqtSignal
+        
+        class PreviewThread(QThread):
+            # Партия строк, спланировано файлов, записей в папке
+            rows_ready = pyqtSignal(list, int, int)
+            done = pyqtSignal(int, bool)
             
-            self.progress_bar.setVisible(False)
-            self.status_label.setText(f"Предпросмотр готов: {file_count} файлов")
+            BATCH_ROWS = 2000
+            BATCH_INTERVAL = 0.2
             
-            if file_count == 0:
-                QMessageBox.information(self, "Предпросмотр", "В выбранной папке нет файлов для сортировки")
-            else:
-                QMessageBox.information(self, "Предпросмотр", 
-                    f"📊 <b>Готово к сортировке:</b><br><br>"
-                    f"📁 Файлов: <b>{file_count}</b><br>"
-                    f"📂 Категорий: <b>{len(categories)}</b><br>"
-                    f"📅 Группировка по дате: <b>{'Да' if self.date_checkbox.isChecked() else 'Нет'}</b>")
+            def __init__(self, organizer, source_dir, categories, organize_by_date, date_format, scan_filter):
+                super().__init__()
+                self.organizer = organizer
+                self.source_dir = source_dir
+                self.categories = categories
+                self.organize_by_date = organize_by_date
+                self.date_format = date_format
+                self.scan_filter = scan_filter
+                self.cancel_token = CancelToken()
             
-        except Exception as e:
-            self.progress_bar.setVisible(False)
-            QMessageBox.warning(self, "Ошибка", f"Ошибка при предпросмотре: {str(e)}")
+            def run(self):
+                planned = 0
+                cancelled = False
+                batch = []
+                try:
+                    total = self.organizer.count_entries(self.source_dir)
+                    last_emit = time.monotonic()
+                    for path, name, file_type, category, folder in self.organizer.plan_organization(
+                        self.source_dir, self.categories, self.organize_by_date, self.date_format,
+                        self.scan_filter, self.cancel_token
+                    ):
+                        batch.append((name, file_type, category, folder))
+                        planned += 1
+                        now = time.monotonic()
+                        if len(batch) >= self.BATCH_ROWS or now - last_emit >= self.BATCH_INTERVAL:
+                            self.rows_ready.emit(batch, planned, total)
+                            batch = []
+                            last_emit = now
+                    if batch:
+                        self.rows_ready.emit(batch, planned, total)
+                except OperationCancelled:
+                    cancelled = True
+                except Exception as e:
+                    print(f"Ошибка предпросмотра: {e}")
+                self.done.emit(planned, cancelled)
+        
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setRange(0, 0)
+        self.status_label.setText("Подготовка предпросмотра...")
+        self.stop_btn.setEnabled(True)
+        
+        self.preview_thread = PreviewThread(
+            self.organizer,
+            str(source_dir),
+            categories,
+            self.date_checkbox.isChecked(),
+            self.get_date_format(),
+            self.get_scan_filter()
+        )
+        self.preview_thread.rows_ready.connect(self.add_preview_rows)
+        self.preview_thread.done.connect(self.preview_finished)
+        self.preview_thread.start()
+    
+    def add_preview_rows(self, rows, planned, total):
+        """Партия строк предпросмотра и прогресс"""
+        self.preview_table.append_rows(rows)
+        # Скрытые и отфильтрованные записи тоже входят в total, шкала дойдет до конца в preview_finished
+        self.progress_bar.setRange(0, max(total, planned))
+        self.progress_bar.setValue(planned)
+        self.status_label.setText(f"Предпросмотр: {planned} файлов (записей в папке: {total})")
+    
+    def preview_finished(self, file_count, cancelled):
+        """Итоги предпросмотра"""
+        self.preview_thread = None
+        self.progress_bar.setVisible(False)
+        self.stop_btn.setEnabled(False)
+        
+        if cancelled:
+            self.status_label.setText(f"Предпросмотр остановлен: {file_count} файлов")
+            return
+        
+        self.status_label.setText(f"Предпросмотр готов: {file_count} файлов")
+        if self.preview_restarted:
+            return
+        
+        if file_count == 0:
+            QMessageBox.information(self, "Предпросмотр", "В выбранной папке нет файлов для сортировки")
+        else:
+            QMessageBox.information(self, "Предпросмотр", 
+                f"📊 <b>Готово к сортировке:</b><br><br>"
+                f"📁 Файлов: <b>{file_count}</b><br>"
+                f"📂 Категорий: <b>{len(self.get_categories())}</b><br>"
+                f"📅 Группировка по дате: <b>{'Да' if self.date_checkbox.isChecked() else 'Нет'}</b>")
+    
+    def stop_preview(self):
+        """Остановка предпросмотра (уже показанные строки остаются)"""
+        if self.preview_thread is not None:
+            self.preview_thread.cancel_token.cancel()
+            self.stop_btn.setEnabled(False)
+            self.status_label.setText("Остановка предпросмотра...")
+    
+    def stop_task(self):
+        if self.organize_thread is not None:
+            self.stop_organize()
+        else:
+            self.stop_preview()
+    
+    def discard_preview(self):
+        """Отмена текущего предпросмотра без вывода его результатов"""
+        thread = self.preview_thread
+        if thread is None:
+            return
+        
+        self.preview_thread = None
+        thread.rows_ready.disconnect()
+        thread.done.disconnect()
+        self.retire_thread(thread)
+    
+    def retire_thread(self, thread):
+        """Отмена фонового потока, сигналы которого уже отключены"""
+        thread.cancel_token.cancel()
+        # Ссылка держится до конца run(), иначе Qt уничтожит работающий поток
+        self.stale_threads.append(thread)
+        thread.finished.connect(lambda: self.stale_threads.remove(thread))
+    
+    def on_categories_changed(self):
+        """Категории изменились: идущий предпросмотр перезапускается"""
+        if self.preview_thread is not None or self.preview_restart_timer.isActive():
+            self.preview_restart_timer.start()
+    
+    def restart_preview(self):
+        self.preview_organization(restart=True)
     
     def organize_files(self):
         """Запуск сортировки файлов"""
@@ -847,32 +1167,105 @@ class FileOrganizerApp(QMainWindow):
                     return
         
         # Определяем формат даты
-        date_format_map = {
-            0: "%Y-%m-%d",
-            1: "%d-%m-%Y",
-            2: "%Y/%m/%d",
-            3: "%m-%d-%Y",
-            4: "%d %b %Y"
-        }
-        date_format = date_format_map.get(self.date_format_combo.currentIndex(), "%Y-%m-%d")
+        date_format = self.get_date_format()
+        
+        # Предпросмотр устареет после перемещения файлов
+        self.discard_preview()
+        self.preview_restart_timer.stop()
         
         # Показываем прогресс
         self.progress_bar.setVisible(True)
         self.progress_bar.setRange(0, 0)
         self.status_label.setText("Сортировка файлов...")
-        QApplication.processEvents()
+        self.organize_btn.setEnabled(False)
+        self.preview_btn.setEnabled(False)
+        self.stop_btn.setEnabled(True)
         
-        # Запускаем сортировку
-        try:
-            results = self.organizer.organize_files(
-                source_dir=str(source_dir),
-                categories=categories,
-                organize_by_date=self.date_checkbox.isChecked(),
-                date_format=date_format
-            )
+        # Сортируем в отдельном потоке: перенос на другой диск копирует данные
+        from PyQt5.QtCore import QThread, pyqtSignal
+        
+        class OrganizeThread(QThread):
+            progress = pyqtSignal(object)
+            done = pyqtSignal(object)
             
-            self.progress_bar.setVisible(False)
+            def __init__(self, organizer, source_dir, categories, organize_by_date, date_format, scan_filter):
+                super().__init__()
+                self.organizer = organizer
+                self.source_dir = source_dir
+                self.categories = categories
+                self.organize_by_date = organize_by_date
+                self.date_format = date_format
+                self.scan_filter = scan_filter
+                self.cancel_token = CancelToken()
             
+            def run(self):
+                try:
+                    results = self.organizer.organize_files(
+                        source_dir=self.source_dir,
+                        categories=self.categories,
+                        organize_by_date=self.organize_by_date,
+                        date_format=self.date_format,
+                        scan_filter=self.scan_filter,
+                        progress=self.progress.emit,
+                        cancel_token=self.cancel_token
+                    )
+                except Exception as e:
+                    results = {'error': str(e)}
+                self.done.emit(results)
+        
+        self.organize_thread = OrganizeThread(
+            self.organizer,
+            str(source_dir),
+            categories,
+            self.date_checkbox.isChecked(),
+            date_format,
+            self.get_scan_filter()
+        )
+        self.organize_thread.progress.connect(self.update_organize_progress)
+        self.organize_thread.done.connect(self.organize_finished)
+        self.organize_thread.start()
+    
+    def update_organize_progress(self, info):
+        """Живой прогресс сортировки"""
+        if info['files_total']:
+            self.progress_bar.setRange(0, info['files_total'])
+            self.progress_bar.setValue(info['files_done'])
+        
+        eta = format_duration(info['eta']) if info['eta'] is not None else "—"
+        self.status_label.setText(
+            f"Сортировка: {info['files_done']} из {info['files_total']} файлов, "
+            f"{self.format_size(info['bytes_done'])} из {self.format_size(info['bytes_total'])} "
+            f"({info['files_per_second']:.1f} файл/с), осталось {eta}"
+        )
+    
+    def organize_finished(self, results):
+        """Итоги сортировки"""
+        source_dir = self.organize_thread.source_dir
+        self.organize_thread = None
+        self.progress_bar.setVisible(False)
+        self.organize_btn.setEnabled(True)
+        self.preview_btn.setEnabled(True)
+        self.stop_btn.setEnabled(False)
+        
+        if 'error' in results:
+            self.status_label.setText("Ошибка сортировки")
+            QMessageBox.critical(self, "Ошибка сортировки", 
+                f"<b>❌ Ошибка при сортировке:</b><br>{results['error']}")
+            return
+        
+        if results['cancelled']:
+            self.status_label.setText(f"Сортировка остановлена: перемещено {results['moved']} файлов")
+            QMessageBox.information(
+                self,
+                "Сортировка остановлена",
+                f"<b>⏹ Сортировка остановлена</b><br><br>"
+                f"📊 Результаты:<br>"
+                f"• 📁 Перемещено файлов: <b>{results['moved']}</b><br>"
+                f"• ⚠️ Ошибок: <b>{results['errors']}</b><br><br>"
+                f"<i>Остальные файлы остались на месте в папке {source_dir}</i>"
+            )
+        else:
+            self.status_label.setText(f"Сортировка завершена: перемещено {results['moved']} файлов")
             QMessageBox.information(
                 self, 
                 "Сортировка завершена",
@@ -882,15 +1275,17 @@ class FileOrganizerApp(QMainWindow):
                 f"• ⚠️ Ошибок: <b>{results['errors']}</b><br><br>"
                 f"<i>Файлы отсортированы по категориям в папке {source_dir}</i>"
             )
-            
-            # Обновляем статистику
-            self.scan_folder()
-            self.preview_table.clear()
-            
-        except Exception as e:
-            self.progress_bar.setVisible(False)
-            QMessageBox.critical(self, "Ошибка сортировки", 
-                f"<b>❌ Ошибка при сортировке:</b><br>{str(e)}")
+        
+        # Обновляем статистику
+        self.scan_folder()
+        self.preview_table.clear()
+    
+    def stop_organize(self):
+        """Остановка сортировки: текущий файл либо переносится целиком, либо остается на месте"""
+        if self.organize_thread is not None:
+            self.organize_thread.cancel_token.cancel()
+            self.stop_btn.setEnabled(False)
+            self.status_label.setText("Остановка сортировки...")
     
     def get_categories(self):
         """Получение категорий из виджетов"""
@@ -903,17 +1298,61 @@ class FileOrganizerApp(QMainWindow):
                     categories[name] = exts
         return categories
     
+    def get_filter_settings(self):
+        """Настройки фильтров сканирования в формате конфигурации"""
+        return {
+            'scan_exclude': parse_patterns(self.scan_exclude_edit.text()),
+            'scan_include': parse_patterns(self.scan_include_edit.text()),
+            'scan_max_size': self.scan_max_size.value(),
+            'scan_skip_hidden': self.skip_hidden_checkbox.isChecked(),
+            'scan_follow_symlinks': self.follow_symlinks_checkbox.isChecked(),
+            'scan_one_filesystem': self.one_filesystem_checkbox.isChecked()
+        }
+    
+    def apply_filter_settings(self, config):
+        """Применение настроек фильтров из конфигурации"""
+        if 'scan_exclude' in config:
+            self.scan_exclude_edit.setText(", ".join(config['scan_exclude']))
+        if 'scan_include' in config:
+            self.scan_include_edit.setText(", ".join(config['scan_include']))
+        if 'scan_max_size' in config:
+            self.scan_max_size.setValue(config['scan_max_size'])
+        if 'scan_skip_hidden' in config:
+            self.skip_hidden_checkbox.setChecked(config['scan_skip_hidden'])
+        if 'scan_follow_symlinks' in config:
+            self.follow_symlinks_checkbox.setChecked(config['scan_follow_symlinks'])
+        if 'scan_one_filesystem' in config:
+            self.one_filesystem_checkbox.setChecked(config['scan_one_filesystem'])
+    
+    def reset_filter_settings(self):
+        """Фильтры сканирования по умолчанию"""
+        self.scan_exclude_edit.setText(", ".join(DEFAULT_EXCLUDE))
+        self.scan_include_edit.clear()
+        self.scan_max_size.setValue(0)
+        self.skip_hidden_checkbox.setChecked(True)
+        self.follow_symlinks_checkbox.setChecked(False)
+        self.one_filesystem_checkbox.setChecked(False)
+    
+    def get_scan_filter(self, min_size=0):
+        """Фильтр обхода папок по текущим настройкам"""
+        return ScanFilter.from_config(self.get_filter_settings(), min_size=min_size)
+    
     def add_category(self):
         """Добавление новой категории"""
-        category_widget = CategoryWidget()
+        self.add_category_widget(CategoryWidget())
+    
+    def add_category_widget(self, category_widget):
+        """Виджет категории в списке с подключенными сигналами"""
         category_widget.delete_btn.clicked.connect(
-            lambda: self.remove_category(category_widget)
+            lambda checked, w=category_widget: self.remove_category(w)
         )
+        category_widget.changed.connect(self.on_categories_changed)
         self.categories_layout.addWidget(category_widget)
     
     def remove_category(self, widget):
         """Удаление категории"""
         widget.deleteLater()
+        self.on_categories_changed()
     
     def load_preset_categories(self):
         """Загрузка пресета категорий"""
@@ -932,11 +1371,7 @@ class FileOrganizerApp(QMainWindow):
         }
         
         for name, exts in default_categories.items():
-            category_widget = CategoryWidget(name, ", ".join(exts))
-            category_widget.delete_btn.clicked.connect(
-                lambda checked, w=category_widget: self.remove_category(w)
-            )
-            self.categories_layout.addWidget(category_widget)
+            self.add_category_widget(CategoryWidget(name, ", ".join(exts)))
         
         self.status_label.setText("Загружен пресет категорий")
     
@@ -946,6 +1381,7 @@ class FileOrganizerApp(QMainWindow):
             widget = self.categories_layout.itemAt(i).widget()
             if widget:
                 widget.deleteLater()
+        self.on_categories_changed()
     
     def export_preview(self):
         """Экспорт списка предпросмотра"""
@@ -972,11 +1408,7 @@ class FileOrganizerApp(QMainWindow):
                     writer.writerow(headers)
                     
                     # Данные
-                    for row in range(self.preview_table.rowCount()):
-                        row_data = []
-                        for col in range(self.preview_table.columnCount()):
-                            item = self.preview_table.item(row, col)
-                            row_data.append(item.text() if item else "")
+                    for row_data in self.preview_table.rows():
                         writer.writerow(row_data)
                 
                 self.status_label.setText(f"Список экспортирован: {file_path}")
@@ -1002,11 +1434,36 @@ class FileOrganizerApp(QMainWindow):
             QMessageBox.warning(self, "Ошибка", "Папка не существует!")
             return
         
+        reference = None
+        if self.dup_method_combo.currentIndex() == 5:
+            reference_dir = self.dup_reference_path.text()
+            if not reference_dir or not Path(reference_dir).is_dir():
+                QMessageBox.warning(self, "Ошибка", "Выберите эталонную папку!")
+                return
+            reference = ReferenceIndex(reference_dir, self.config_manager.app_dir / "data")
+            if self.dup_rebuild_index_checkbox.isChecked():
+                try:
+                    reference.index_path.unlink()
+                except OSError:
+                    pass
+                self.dup_rebuild_index_checkbox.setChecked(False)
+        
+        state = None
+        if self.dup_method_combo.currentIndex() == 7:
+            state = ScanState(source_dir, self.config_manager.app_dir / "data")
+        
         # Показываем прогресс
         self.is_scanning = True
         self.progress_bar.setVisible(True)
         self.progress_bar.setRange(0, 0)
         self.status_label.setText("Поиск дубликатов...")
+        self.find_dups_btn.setEnabled(False)
+        self.stop_dups_btn.setEnabled(True)
+        
+        # Группы добавляются в таблицу по мере нахождения
+        self.dup_stats.setText("🔍 Поиск...")
+        self.dup_results = DuplicateResults()
+        self.dup_model.set_results(self.dup_results)
         QApplication.processEvents()
         
         # Ищем дубликаты в отдельном потоке
@@ -1014,89 +1471,142 @@ class FileOrganizerApp(QMainWindow):
         
         class DupFinderThread(QThread):
             finished = pyqtSignal(dict)
-            progress = pyqtSignal(int)
+            group_found = pyqtSignal(str, object)
+            progress = pyqtSignal(object)
             
-            def __init__(self, source_dir, method):
+            def __init__(self, source_dir, method, cache, workers, scan_filter, image_distance, reference,
+                         state, verify_archives, payload, memory_limit):
                 super().__init__()
                 self.source_dir = source_dir
                 self.method = method
-                self.finder = DuplicateFinder()
+                self.workers = workers
+                self.scan_filter = scan_filter
+                self.reference = reference
+                self.state = state
+                self.finder = DuplicateFinder(cache=cache, image_distance=image_distance,
+                                              verify_archives=verify_archives, payload=payload,
+                                              memory_limit=memory_limit)
+                self.cancel_token = CancelToken()
             
             def run(self):
+                duplicates = {}
                 try:
                     method_map = {
                         0: 'hash',
                         1: 'name_size',
-                        2: 'content'
+                        2: 'content',
+                        3: 'images_similar',
+                        4: 'folders',
+                        5: 'reference',
+                        6: 'archives',
+                        7: 'incremental'
                     }
                     method = method_map.get(self.method, 'hash')
                     
-                    duplicates = self.finder.find_duplicates(str(self.source_dir), method=method)
-                    self.finished.emit(duplicates)
+                    for key, files in self.finder.iter_duplicates(
+                        str(self.source_dir), method=method, workers=self.workers,
+                        scan_filter=self.scan_filter, cancel_token=self.cancel_token,
+                        progress=self.progress.emit, reference=self.reference, state=self.state
+                    ):
+                        duplicates[key] = files
+                        self.group_found.emit(key, files)
                 except Exception as e:
                     print(f"Ошибка поиска дубликатов: {e}")
-                    self.finished.emit({})
+                self.finished.emit(duplicates)
         
         self.dup_thread = DupFinderThread(
             source_dir, 
-            self.dup_method_combo.currentIndex()
+            self.dup_method_combo.currentIndex(),
+            self.hash_cache,
+            self.dup_workers.value(),
+            self.get_scan_filter(min_size=self.dup_size_threshold.value() * 1024 * 1024),
+            self.dup_image_distance.value(),
+            reference,
+            state,
+            self.dup_verify_archives.isChecked(),
+            self.dup_payload_hash.isChecked(),
+            self.dup_memory_limit.value() * 1024 * 1024 or None
         )
+        self.dup_thread.group_found.connect(self.add_duplicate_group)
+        self.dup_thread.progress.connect(self.update_dup_progress)
         self.dup_thread.finished.connect(self.display_duplicates)
         self.dup_thread.start()
     
+    def stop_duplicates(self):
+        """Остановка поиска дубликатов (найденные группы сохраняются)"""
+        if self.is_scanning and self.dup_thread is not None:
+            self.dup_thread.cancel_token.cancel()
+            self.stop_dups_btn.setEnabled(False)
+            self.status_label.setText("Остановка поиска...")
+    
+    def update_dup_progress(self, info):
+        """Живой прогресс поиска дубликатов"""
+        if info['phase'] == 'index':
+            self.status_label.setText("Индексация эталонной папки...")
+            return
+        
+        if info['phase'] == 'scan':
+            self.status_label.setText(
+                f"Сканирование: {info['files_scanned']} файлов "
+                f"({self.format_size(info['bytes_scanned'])})"
+            )
+            return
+        
+        total = info['candidates_total']
+        if total:
+            self.progress_bar.setRange(0, total)
+            self.progress_bar.setValue(info['candidates_done'])
+        
+        self.status_label.setText(
+            f"Проверено {info['candidates_done']} из {total} кандидатов, "
+            f"прочитано {self.format_size(info['bytes_hashed'])} "
+            f"({self.format_size(info['throughput'])}/с), "
+            f"найдено групп: {info['groups_found']}"
+        )
+        
+        # Группы проверяются по убыванию экономии, крупнейшие видны сразу
+        if len(self.dup_results):
+            self.dup_stats.setText(self.format_top_savings(5))
+    
+    def format_top_savings(self, count):
+        """Крупнейшие найденные группы по освобождаемому месту"""
+        text = (f"🔍 <b>Поиск...</b> Найдено групп: {len(self.dup_results)}, "
+                f"можно освободить: {self.format_size(self.dup_results.total_savings())}<br>"
+                f"🏆 <b>Крупнейшие находки:</b>")
+        for savings, key in self.dup_results.top_savings(count):
+            files = self.dup_results.groups[key]
+            text += f"<br>{self.format_size(savings)} - {files[0]['name']} ({len(files)} копий)"
+        return text
+    
+    def add_duplicate_group(self, hash_val, files):
+        """Добавление найденной группы в таблицу"""
+        self.dup_results.add_group(hash_val, files, self.duplicate_finder.wasted_space(files))
+        self.dup_model.append_group(hash_val)
+    
     def display_duplicates(self, duplicates):
-        """Отображение найденных дубликатов"""
+        """Итоги поиска дубликатов (строки уже добавлены по ходу поиска)"""
         self.is_scanning = False
         self.progress_bar.setVisible(False)
+        self.find_dups_btn.setEnabled(True)
+        self.stop_dups_btn.setEnabled(False)
         
-        self.dup_table.setRowCount(0)
+        cancelled = self.dup_thread.finder.cancelled
         
         if not duplicates:
+            if cancelled:
+                self.dup_stats.setText("⏹ Поиск остановлен, дубликаты не найдены")
+                self.status_label.setText("Поиск остановлен")
+                return
             self.dup_stats.setText("❌ Дубликаты не найдены")
             self.status_label.setText("Поиск завершен: дубликаты не найдены")
             QMessageBox.information(self, "Поиск завершен", "Дубликаты не найдены")
             return
         
-        total_size = 0
-        total_files = 0
-        group_num = 1
+        total_size = self.dup_results.total_size()
+        total_files = self.dup_results.file_count()
         
-        for i, (hash_val, files) in enumerate(duplicates.items()):
-            for file_info in files:
-                row = self.dup_table.rowCount()
-                self.dup_table.insertRow(row)
-                
-                # Используем безопасное отображение пути
-                safe_path = self.safe_display_path_for_table(file_info['path'])
-                
-                self.dup_table.setItem(row, 0, QTableWidgetItem(file_info['name']))
-                self.dup_table.setItem(row, 1, QTableWidgetItem(safe_path))
-                
-                # Исправленный размер
-                try:
-                    size_str = self.format_size(file_info['size'])
-                except:
-                    size_str = "Ошибка"
-                    
-                self.dup_table.setItem(row, 2, QTableWidgetItem(size_str))
-                
-                self.dup_table.setItem(row, 3, QTableWidgetItem(
-                    datetime.fromtimestamp(file_info['ctime']).strftime("%Y-%m-%d %H:%M:%S")
-                ))
-                self.dup_table.setItem(row, 4, QTableWidgetItem(hash_val[:16]))
-                
-                total_size += file_info['size']
-                total_files += 1
-            
-            group_num += 1
-        
-        # Подсчитываем экономию места с исправленным форматированием
-        wasted_space = 0
-        for hash_val, files in duplicates.items():
-            if len(files) > 1:
-                files_sorted = sorted(files, key=lambda x: x['ctime'], reverse=True)
-                for file_info in files_sorted[1:]:
-                    wasted_space += file_info['size']
+        # Экономия места посчитана при добавлении групп (жесткие ссылки места не занимают)
+        wasted_space = self.dup_results.total_savings()
         
         # Исправляем отображение статистики
         try:
@@ -1106,54 +1616,79 @@ class FileOrganizerApp(QMainWindow):
             total_size_str = "Ошибка расчета"
             wasted_space_str = "Ошибка расчета"
         
+        header = "⏹ <b>Поиск остановлен.</b> " if cancelled else "✅ "
         self.dup_stats.setText(
-            f"✅ <b>Найдено:</b> {len(duplicates)} групп, {total_files} файлов<br>"
+            f"{header}<b>Найдено:</b> {len(self.dup_results)} групп, {total_files} файлов<br>"
             f"📏 <b>Общий размер:</b> {total_size_str}<br>"
             f"🗑️ <b>Можно освободить:</b> {wasted_space_str}"
+            f"{self.format_dup_stages(self.dup_thread.finder.stats)}"
         )
         
         self.status_label.setText(
-            f"Найдено {len(duplicates)} групп дубликатов"
+            f"{'Поиск остановлен. ' if cancelled else ''}Найдено {len(duplicates)} групп дубликатов"
         )
     
+    def format_dup_stages(self, stats):
+        """Сводка по этапам отсева кандидатов"""
+        stage_names = {
+            'size': 'по размеру',
+            'sample': 'по фрагментам',
+            'hash': 'по хэшу',
+            'content': 'по содержимому',
+            'similar': 'по похожести',
+            'folders': 'вне одинаковых папок',
+            'reference': 'нет в эталонной папке',
+            'archives': 'нет в ZIP-архивах'
+        }
+        
+        if not stats.get('stages'):
+            return ""
+        
+        text = (f"<br>🔎 <b>Просмотрено:</b> {stats['files_scanned']} файлов "
+                f"({self.format_size(stats['bytes_scanned'])})")
+        if stats.get('algorithm'):
+            text += f"<br>🔑 <b>Алгоритм хэша:</b> {stats['algorithm']}"
+        if stats['hardlinks']['files']:
+            text += (f"<br>🔗 <b>Уже дедуплицировано (жесткие ссылки):</b> "
+                     f"{stats['hardlinks']['files']} путей, {self.format_size(stats['hardlinks']['bytes'])} "
+                     f"- не входит в освобождаемое место")
+        if stats['cache_hits'] or stats['cache_misses']:
+            text += (f"<br>💾 <b>Кэш хэшей:</b> {stats['cache_hits']} из кэша, "
+                     f"{stats['cache_misses']} вычислено")
+        for stage in stats['stages']:
+            text += (f"<br>• Отсев {stage_names.get(stage['stage'], stage['stage'])}: "
+                     f"{stage['removed_files']} файлов ({self.format_size(stage['removed_bytes'])})")
+        return text
+    
     def on_duplicate_selected(self):
         """Обработка выбора дубликата"""
-        selected = self.dup_table.selectedItems()
+        selected = self.dup_table.selectionModel().selectedRows()
         if not selected:
             return
         
+        # Группа берется из строки: эталонный файл может входить в несколько групп
         row = selected[0].row()
-        path = self.dup_table.item(row, 1).text()
-        file_name = self.dup_table.item(row, 0).text()
-        file_size = self.dup_table.item(row, 2).text()
-        file_date = self.dup_table.item(row, 3).text()
-        file_hash = self.dup_table.item(row, 4).text()
+        hash_val = self.dup_model.group_key(row)
+        record = self.dup_model.record(row)
+        path = record['path']
         
         # Показываем информацию о файле
-        file_info = f"📄 <b>Имя файла:</b> {file_name}\n"
+        file_info = f"📄 <b>Имя файла:</b> {record['name']}\n"
         file_info += f"📁 <b>Путь:</b> {path}\n"
-        file_info += f"📏 <b>Размер:</b> {file_size}\n"
-        file_info += f"📅 <b>Создан:</b> {file_date}\n"
-        file_info += f"🔑 <b>Хэш:</b> {file_hash}\n\n"
-        
-        # Получаем информацию о группе
-        hash_val = self.dup_table.item(row, 4).text()
-        group_files = []
-        for r in range(self.dup_table.rowCount()):
-            if self.dup_table.item(r, 4).text() == hash_val:
-                group_files.append({
-                    'path': self.dup_table.item(r, 1).text(),
-                    'date': self.dup_table.item(r, 3).text()
-                })
+        file_info += f"📏 <b>Размер:</b> {self.format_size(record['size'])} ({record['size']} байт)\n"
+        file_info += f"📅 <b>Создан:</b> {datetime.fromtimestamp(record['ctime']).strftime('%Y-%m-%d %H:%M:%S')}\n"
+        file_info += f"🔑 <b>Хэш:</b> {hash_val}\n\n"
         
+        # Информация о группе берется из результатов поиска
+        group_files = self.dup_results.groups[hash_val]
         if len(group_files) > 1:
             file_info += f"👥 <b>В группе:</b> {len(group_files)} файлов\n"
             # Находим самый новый файл
-            newest_file = max(group_files, key=lambda x: datetime.strptime(x['date'], "%Y-%m-%d %H:%M:%S"))
+            newest_file = self.dup_results.newest(hash_val)
             if newest_file['path'] == path:
                 file_info += "✅ <b>Это самый новый файл в группе</b>\n"
             else:
-                file_info += f"⚠️ <b>Самый новый файл:</b> {Path(newest_file['path']).name}\n"
+                file_info += f"⚠️ <b>Самый новый файл:</b> {newest_file['name']}\n"
         
         self.dup_info.setText(file_info)
         
@@ -1179,86 +1714,133 @@ class FileOrganizerApp(QMainWindow):
     
     def clean_duplicates(self):
         """Очистка дубликатов"""
-        if self.dup_table.rowCount() == 0:
+        if self.is_scanning or len(self.dup_results) == 0:
             QMessageBox.information(self, "Информация", "Нет дубликатов для очистки")
             return
         
-        # Собираем данные о дубликатах
-        duplicates_data = {}
-        for row in range(self.dup_table.rowCount()):
-            hash_val = self.dup_table.item(row, 4).text()
-            if hash_val not in duplicates_data:
-                duplicates_data[hash_val] = []
-            
-            path = self.dup_table.item(row, 1).text()
-            size_str = self.dup_table.item(row, 2).text()
-            date_str = self.dup_table.item(row, 3).text()
-            
-            file_info = {
-                'path': path,
-                'name': Path(path).name,
-                'size': self.parse_size(size_str),
-                'ctime': datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S").timestamp()
-            }
-            duplicates_data[hash_val].append(file_info)
+        # Данные берутся из результатов поиска, а не из текста таблицы
+        duplicates_data = self.dup_results.cleanup_plan()
         
         # Подсчитываем сколько можно удалить
-        total_to_delete = 0
-        total_space = 0
-        for hash_val, files in duplicates_data.items():
-            if len(files) > 1:
-                files_sorted = sorted(files, key=lambda x: x['ctime'], reverse=True)
-                total_to_delete += len(files_sorted) - 1
-                for file_info in files_sorted[1:]:
-                    total_space += file_info['size']
+        # Члены архивов, совпавшие с ними только по CRC32 файлы, похожие изображения
+        # и файлы, совпавшие только без метаданных, не удаляются
+        total_to_delete = sum(
+            1 for files in duplicates_data.values()
+            for f in sorted(files, key=keep_priority, reverse=True)[1:]
+            if is_removable(f)
+        )
+        total_space = sum(self.duplicate_finder.wasted_space(files) for files in duplicates_data.values())
+        
+        # Ссылку на член архива не создать: в таких группах ссылками на самую
+        # новую обычную копию заменяются остальные, а сама она остается
+        total_to_link = 0
+        for files in duplicates_data.values():
+            ordered = sorted(files, key=keep_priority, reverse=True)
+            source = link_source(ordered)
+            total_to_link += sum(1 for f in ordered[1:] if f is not source and is_removable(f))
         
         if total_to_delete == 0:
-            QMessageBox.information(self, "Информация", "Нет файлов для удаления")
+            if any(f.get('similar') for files in duplicates_data.values() for f in files):
+                QMessageBox.information(self, "Информация",
+                    "Похожие изображения не удаляются автоматически: это разные файлы, "
+                    "и самый новый может оказаться уменьшенной копией.\n"
+                    "Удалите ненужные файлы вручную.")
+            elif any(f.get('payload_match') for files in duplicates_data.values() for f in files):
+                QMessageBox.information(self, "Информация",
+                    "Файлы, совпадающие только без метаданных (тегов, EXIF), "
+                    "не удаляются автоматически: вместе с копией пропали бы ее метаданные.\n"
+                    "Удалите ненужные файлы вручную.")
+            else:
+                QMessageBox.information(self, "Информация", "Нет файлов для удаления")
             return
         
-        reply = QMessageBox.question(
-            self, 'Подтверждение удаления',
-            f'<b>Удалить дубликаты?</b><br><br>'
-            f'📊 Будет удалено: <b>{total_to_delete} файлов</b><br>'
+        box = QMessageBox(self)
+        box.setIcon(QMessageBox.Question)
+        box.setWindowTitle('Подтверждение очистки')
+        box.setText(
+            f'<b>Очистить дубликаты?</b><br><br>'
+            f'📊 Будет обработано: <b>{total_to_delete} файлов</b><br>'
             f'🗑️ Освободится: <b>{self.format_size(total_space)}</b><br><br>'
-            f'<i>В каждой группе будет сохранен только самый новый файл.</i>',
-            QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel,
-            QMessageBox.No
+            f'<i>В каждой группе будет сохранен только самый новый файл.<br>'
+            f'Замена ссылками освобождает место, но сохраняет все пути рабочими.</i>'
         )
-        
-        if reply == QMessageBox.Yes:
+        delete_btn = box.addButton("🗑️ Удалить", QMessageBox.DestructiveRole)
+        hardlink_btn = box.addButton("🔗 Заменить жесткими ссылками", QMessageBox.AcceptRole)
+        reflink_btn = box.addButton("📑 Заменить reflink-копиями", QMessageBox.AcceptRole)
+        reflink_btn.setToolTip("Копирование при записи (Btrfs, XFS, APFS). Файлы остаются независимыми")
+        if total_to_link == 0:
+            # Например, только копии файлов из архивов по одной на группу
+            for button in (hardlink_btn, reflink_btn):
+                button.setEnabled(False)
+                button.setToolTip("Нечего заменять ссылками: копии файлов из архивов можно только удалить")
+        elif total_to_link < total_to_delete:
+            box.setInformativeText(
+                f"Ссылками будет заменено {total_to_link} файлов: в группах с архивами "
+                f"сохраняется самая новая обычная копия.")
+        box.addButton("Отмена", QMessageBox.RejectRole)
+        box.exec_()
+        
+        modes = {delete_btn: 'delete', hardlink_btn: 'hardlink', reflink_btn: 'reflink'}
+        mode = modes.get(box.clickedButton())
+        
+        if mode:
             try:
-                deleted = self.duplicate_finder.remove_duplicates(duplicates_data)
+                processed = self.duplicate_finder.remove_duplicates(duplicates_data, mode=mode)
+                report = self.duplicate_finder.reclaim_report
+                reclaimed = sum(r['bytes'] for r in report.values())
+                errors = sum(r['errors'] for r in report.values())
                 
-                self.status_label.setText(f"Удалено {deleted} дубликатов")
-                QMessageBox.information(self, "Очистка завершена",
-                    f"<b>✅ Очистка завершена успешно!</b><br><br>"
-                    f"🗑️ Удалено файлов: <b>{deleted}</b><br>"
-                    f"📏 Освобождено места: <b>{self.format_size(total_space)}</b>")
+                action = "Удалено" if mode == 'delete' else "Заменено ссылками"
+                self.status_label.setText(f"{action} {processed} дубликатов")
+                
+                result_box = QMessageBox(self)
+                result_box.setIcon(QMessageBox.Information)
+                result_box.setWindowTitle("Очистка завершена")
+                result_box.setText(
+                    f"<b>✅ Очистка завершена!</b><br><br>"
+                    f"🗑️ {action} файлов: <b>{processed}</b><br>"
+                    f"📏 Освобождено места: <b>{self.format_size(reclaimed)}</b><br>"
+                    f"⚠️ Ошибок: <b>{errors}</b>")
+                result_box.setDetailedText("\n".join(
+                    f"{hash_val[:16]}: {r['files']} файлов, {self.format_size(r['bytes'])}"
+                    + (f", ошибок: {r['errors']}" if r['errors'] else "")
+                    for hash_val, r in report.items()
+                ))
+                result_box.exec_()
                 
                 # Обновляем таблицу
                 self.find_duplicates()
                 
             except Exception as e:
-                QMessageBox.critical(self, "Ошибка удаления",
-                    f"<b>❌ Ошибка при удалении файлов:</b><br>{str(e)}")
+                QMessageBox.critical(self, "Ошибка очистки",
+                    f"<b>❌ Ошибка при очистке дубликатов:</b><br>{str(e)}")
     
-    def parse_size(self, size_str):
-        """Парсинг размера из строки"""
-        units = {'Б': 1, 'КБ': 1024, 'МБ': 1024**2, 'ГБ': 1024**3, 'ТБ': 1024**4}
-        try:
-            # Убираем лишние пробелы
-            size_str = size_str.strip()
-            # Разделяем число и единицу измерения
-            for unit in units:
-                if size_str.endswith(unit):
-                    num_str = size_str[:-len(unit)].strip()
-                    num = float(num_str.replace(',', '.'))
-                    return int(num * units[unit])
-            # Если не нашли единицу измерения, пробуем парсить как число
-            return int(float(size_str))
-        except:
-            return 0
+    def export_duplicates(self):
+        """Экспорт найденных дубликатов в CSV"""
+        if len(self.dup_results) == 0:
+            QMessageBox.warning(self, "Ошибка", "Нет данных для экспорта")
+            return
+        
+        file_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Экспорт дубликатов",
+            f"duplicates_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            "CSV Files (*.csv)"
+        )
+        
+        if file_path:
+            try:
+                count = self.dup_results.export_csv(file_path)
+                
+                self.status_label.setText(f"Дубликаты экспортированы: {file_path}")
+                QMessageBox.information(self, "Экспорт завершен", 
+                    f"<b>✅ Дубликаты успешно экспортированы</b><br><br>"
+                    f"📁 Файл: <b>{file_path}</b><br>"
+                    f"📊 Групп: <b>{len(self.dup_results)}</b>, файлов: <b>{count}</b>")
+                
+            except Exception as e:
+                QMessageBox.warning(self, "Ошибка экспорта", 
+                    f"<b>❌ Ошибка при экспорте:</b><br>{str(e)}")
     
     # === КОНФИГУРАЦИЯ И НАСТРОЙКИ ===
     
@@ -1274,11 +1856,7 @@ class FileOrganizerApp(QMainWindow):
         # Загружаем категории
         if 'categories' in config:
             for name, exts in config['categories'].items():
-                category_widget = CategoryWidget(name, ", ".join(exts))
-                category_widget.delete_btn.clicked.connect(
-                    lambda checked, w=category_widget: self.remove_category(w)
-                )
-                self.categories_layout.addWidget(category_widget)
+                self.add_category_widget(CategoryWidget(name, ", ".join(exts)))
         
         # Другие настройки
         if 'organize_by_date' in config:
@@ -1293,6 +1871,25 @@ class FileOrganizerApp(QMainWindow):
         if 'duplicate_size_threshold' in config:
             self.dup_size_threshold.setValue(config['duplicate_size_threshold'])
         
+        if 'duplicate_workers' in config:
+            self.dup_workers.setValue(config['duplicate_workers'])
+        
+        if 'duplicate_image_distance' in config:
+            self.dup_image_distance.setValue(config['duplicate_image_distance'])
+        
+        if 'duplicate_memory_limit' in config:
+            self.dup_memory_limit.setValue(config['duplicate_memory_limit'])
+        
+        if 'duplicate_reference_folder' in config:
+            self.dup_reference_path.setText(config['duplicate_reference_folder'])
+        
+        if 'duplicate_verify_archives' in config:
+            self.dup_verify_archives.setChecked(config['duplicate_verify_archives'])
+        if 'duplicate_payload_hash' in config:
+            self.dup_payload_hash.setChecked(config['duplicate_payload_hash'])
+        
+        self.apply_filter_settings(config)
+        
         # Загружаем язык
         if 'language' in config:
             lang_index = {"ru": 0, "en": 1, "zh": 2}.get(config['language'], 0)
@@ -1310,7 +1907,14 @@ class FileOrganizerApp(QMainWindow):
             'date_format': self.date_format_combo.currentIndex(),
             'language': self.current_language,
             'duplicate_method': self.dup_method_combo.currentIndex(),
-            'duplicate_size_threshold': self.dup_size_threshold.value()
+            'duplicate_size_threshold': self.dup_size_threshold.value(),
+            'duplicate_workers': self.dup_workers.value(),
+            'duplicate_image_distance': self.dup_image_distance.value(),
+            'duplicate_memory_limit': self.dup_memory_limit.value(),
+            'duplicate_reference_folder': self.dup_reference_path.text(),
+            'duplicate_verify_archives': self.dup_verify_archives.isChecked(),
+            'duplicate_payload_hash': self.dup_payload_hash.isChecked(),
+            **self.get_filter_settings()
         }
         
         if self.config_manager.save_config(config):
@@ -1381,6 +1985,13 @@ class FileOrganizerApp(QMainWindow):
             self.backup_checkbox.setChecked(False)
             self.dup_method_combo.setCurrentIndex(0)
             self.dup_size_threshold.setValue(10)
+            self.dup_workers.setValue(4)
+            self.dup_image_distance.setValue(8)
+            self.dup_memory_limit.setValue(0)
+            self.dup_reference_path.clear()
+            self.dup_verify_archives.setChecked(False)
+            self.dup_payload_hash.setChecked(False)
+            self.reset_filter_settings()
             self.lang_combo.setCurrentIndex(0)
             
             # Очищаем категории
@@ -1436,6 +2047,13 @@ class FileOrganizerApp(QMainWindow):
             'language': self.current_language,
             'duplicate_method': self.dup_method_combo.currentIndex(),
             'duplicate_size_threshold': self.dup_size_threshold.value(),
+            'duplicate_workers': self.dup_workers.value(),
+            'duplicate_image_distance': self.dup_image_distance.value(),
+            'duplicate_memory_limit': self.dup_memory_limit.value(),
+            'duplicate_reference_folder': self.dup_reference_path.text(),
+            'duplicate_verify_archives': self.dup_verify_archives.isChecked(),
+            'duplicate_payload_hash': self.dup_payload_hash.isChecked(),
+            **self.get_filter_settings(),
             'export_date': datetime.now().isoformat(),
             'version': '1.0'
         }
@@ -1481,11 +2099,7 @@ class FileOrganizerApp(QMainWindow):
                 if 'categories' in config:
                     self.clear_categories()
                     for name, exts in config['categories'].items():
-                        category_widget = CategoryWidget(name, ", ".join(exts))
-                        category_widget.delete_btn.clicked.connect(
-                            lambda checked, w=category_widget: self.remove_category(w)
-                        )
-                        self.categories_layout.addWidget(category_widget)
+                        self.add_category_widget(CategoryWidget(name, ", ".join(exts)))
                 
                 if 'organize_by_date' in config:
                     self.date_checkbox.setChecked(config['organize_by_date'])
@@ -1499,6 +2113,25 @@ class FileOrganizerApp(QMainWindow):
                 if 'duplicate_size_threshold' in config:
                     self.dup_size_threshold.setValue(config['duplicate_size_threshold'])
                 
+                if 'duplicate_workers' in config:
+                    self.dup_workers.setValue(config['duplicate_workers'])
+                
+                if 'duplicate_image_distance' in config:
+                    self.dup_image_distance.setValue(config['duplicate_image_distance'])
+                
+                if 'duplicate_memory_limit' in config:
+                    self.dup_memory_limit.setValue(config['duplicate_memory_limit'])
+                
+                if 'duplicate_reference_folder' in config:
+                    self.dup_reference_path.setText(config['duplicate_reference_folder'])
+                
+                if 'duplicate_verify_archives' in config:
+                    self.dup_verify_archives.setChecked(config['duplicate_verify_archives'])
+                if 'duplicate_payload_hash' in config:
+                    self.dup_payload_hash.setChecked(config['duplicate_payload_hash'])
+                
+                self.apply_filter_settings(config)
+                
                 self.status_label.setText(f"Настройки импортированы: {file_path}")
                 QMessageBox.information(self, "Импорт",
                     f"<b>✅ Настройки импортированы</b><br><br>"
@@ -1604,6 +2237,28 @@ class FileOrganizerApp(QMainWindow):
                 QMessageBox.warning(self, "Ошибка",
                     f"<b>❌ Ошибка при очистке:</b><br>{str(e)}")
     
+    def purge_hash_cache(self):
+        """Удаление устаревших записей из кэша хэшей"""
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setRange(0, 0)
+        self.status_label.setText("Проверка кэша хэшей...")
+        QApplication.processEvents()
+        
+        try:
+            removed = self.hash_cache.purge_stale()
+            
+            self.progress_bar.setVisible(False)
+            self.status_label.setText(f"Удалено {removed} устаревших записей кэша")
+            QMessageBox.information(self, "Кэш хэшей",
+                f"<b>✅ Кэш хэшей очищен</b><br><br>"
+                f"🗑️ Удалено устаревших записей: <b>{removed}</b><br>"
+                f"💾 Осталось записей: <b>{len(self.hash_cache)}</b>")
+            
+        except Exception as e:
+            self.progress_bar.setVisible(False)
+            QMessageBox.warning(self, "Ошибка",
+                f"<b>❌ Ошибка при очистке кэша:</b><br>{str(e)}")
+    
     def open_log(self):
         """Открыть лог"""
         log_dir = Path(self.config_manager.app_dir) / "logs"
@@ -1753,10 +2408,19 @@ class FileOrganizerApp(QMainWindow):
         )
     
     def update_statistics(self):
-        """Обновление статистики"""
+        """Обновление статистики в фоновом потоке
+        
+        Пока идет обход, вкладка перерисовывается по промежуточным итогам.
+        Повторный запуск отменяет предыдущий сбор.
+        """
         source_dir = Path(self.source_path.text())
         
+        was_running = self.stats_thread is not None
+        self.discard_statistics()
+        
         if not source_dir.exists():
+            if was_running:
+                self.progress_bar.setVisible(False)
             self.stats_widget.stats_text.setText("<h2 style='color: #ff6b6b;'>❌ Папка не существует!</h2>")
             return
         
@@ -1764,124 +2428,147 @@ class FileOrganizerApp(QMainWindow):
         self.progress_bar.setVisible(True)
         self.progress_bar.setRange(0, 0)
         self.status_label.setText("Сбор статистики...")
-        QApplication.processEvents()
         
-        try:
-            # Собираем статистику
-            stats_text = "<h1 style='color: #64b5f6;'>📊 Статистика файлов</h1>"
-            stats_text += f"<p><b>📁 Папка:</b> <code>{source_dir}</code></p>"
-            
-            file_count = 0
-            total_size = 0
-            files_by_ext = {}
-            files_by_category = {}
-            categories = self.get_categories()
-            
-            for file_path in source_dir.rglob('*'):
-                if file_path.is_file():
-                    file_count += 1
-                    size = file_path.stat().st_size
-                    total_size += size
-                    
-                    ext = file_path.suffix.lower()
-                    if ext:
-                        files_by_ext[ext] = files_by_ext.get(ext, 0) + 1
-                    else:
-                        files_by_ext["без расширения"] = files_by_ext.get("без расширения", 0) + 1
-                    
-                    # Определяем категорию
-                    category = "Разное"
-                    for cat_name, extensions in categories.items():
-                        if ext in [e.lower() for e in extensions]:
-                            category = cat_name
-                            break
-                    files_by_category[category] = files_by_category.get(category, 0) + 1
-            
-            # Общая статистика
-            stats_text += f"<h2>📈 Общая статистика</h2>"
-            stats_text += f"<p><b>📄 Всего файлов:</b> {file_count:,}</p>"
-            stats_text += f"<p><b>📏 Общий размер:</b> {self.format_size(total_size)}</p>"
-            
-            if file_count > 0:
-                avg_size = total_size / file_count
-                stats_text += f"<p><b>📊 Средний размер файла:</b> {self.format_size(avg_size)}</p>"
-            
-            # Статистика по расширениям
-            stats_text += "<h2>📝 Статистика по расширениям</h2>"
-            stats_text += "<table border='1' cellpadding='8' cellspacing='0' style='border-collapse: collapse; width: 100%;'>"
-            stats_text += "<tr style='background-color: #2d2d2d; color: #ffffff; font-weight: bold;'>"
-            stats_text += "<th>Расширение</th><th>Количество</th><th>Процент</th><th>Общий размер</th></tr>"
-            
-            ext_counter = 0
-            for ext, count in sorted(files_by_ext.items(), key=lambda x: x[1], reverse=True):
-                percent = (count / file_count * 100) if file_count > 0 else 0
-                # Приблизительный размер для расширения
-                ext_size = (total_size / file_count * count) if file_count > 0 else 0
-                
-                color = "#4caf50" if percent > 10 else "#ff9800" if percent > 5 else "#f44336"
-                
-                stats_text += f"<tr style='background-color: {'#252525' if ext_counter % 2 == 0 else '#2a2a2a'};'>"
-                stats_text += f"<td><b>{ext}</b></td>"
-                stats_text += f"<td>{count:,}</td>"
-                stats_text += f"<td><span style='color: {color};'>{percent:.1f}%</span></td>"
-                stats_text += f"<td>{self.format_size(ext_size)}</td>"
-                stats_text += "</tr>"
-                ext_counter += 1
-            
-            stats_text += "</table>"
-            
-            # Статистика по категориям
-            stats_text += "<h2>📁 Статистика по категориям</h2>"
-            stats_text += "<table border='1' cellpadding='8' cellspacing='0' style='border-collapse: collapse; width: 100%;'>"
-            stats_text += "<tr style='background-color: #2d2d2d; color: #ffffff; font-weight: bold;'>"
-            stats_text += "<th>Категория</th><th>Количество</th><th>Процент</th></tr>"
-            
-            cat_counter = 0
-            for category, count in sorted(files_by_category.items(), key=lambda x: x[1], reverse=True):
-                percent = (count / file_count * 100) if file_count > 0 else 0
-                
-                stats_text += f"<tr style='background-color: {'#252525' if cat_counter % 2 == 0 else '#2a2a2a'};'>"
-                stats_text += f"<td><b>{category}</b></td>"
-                stats_text += f"<td>{count:,}</td>"
-                stats_text += f"<td><span style='color: #64b5f6;'>{percent:.1f}%</span></td>"
-                stats_text += "</tr>"
-                cat_counter += 1
+        from PyQt5.QtCore import QThread, pyqtSignal
+        
+        class StatsThread(QThread):
+            partial = pyqtSignal(object)
+            done = pyqtSignal(object, str)
             
-            stats_text += "</table>"
+            def __init__(self, source_dir, scan_filter, category_map):
+                super().__init__()
+                self.source_dir = source_dir
+                self.scan_filter = scan_filter
+                self.category_map = category_map
+                self.cancel_token = CancelToken()
             
-            # Информация о самой большой и маленькой папке
-            if file_count > 0:
+            def run(self):
                 try:
-                    dir_sizes = {}
-                    for item in source_dir.rglob('*'):
-                        if item.is_dir():
-                            dir_size = sum(f.stat().st_size for f in item.rglob('*') if f.is_file())
-                            if dir_size > 0:
-                                dir_sizes[item] = dir_size
-                    
-                    if dir_sizes:
-                        largest_dir = max(dir_sizes.items(), key=lambda x: x[1])
-                        smallest_dir = min(dir_sizes.items(), key=lambda x: x[1])
-                        
-                        stats_text += "<h2>📂 Анализ папок</h2>"
-                        stats_text += f"<p><b>📈 Самая большая папка:</b> {largest_dir[0].relative_to(source_dir)} "
-                        stats_text += f"({self.format_size(largest_dir[1])})</p>"
-                        stats_text += f"<p><b>📉 Самая маленькая папка:</b> {smallest_dir[0].relative_to(source_dir)} "
-                        stats_text += f"({self.format_size(smallest_dir[1])})</p>"
-                except:
+                    # Один обход: счетчики и размеры папок собираются вместе
+                    stats = collect_stats(self.source_dir, self.scan_filter, self.category_map,
+                                          self.cancel_token, self.partial.emit)
+                    self.done.emit(stats, "")
+                except OperationCancelled:
                     pass
-            
-            self.stats_widget.stats_text.setHtml(stats_text)
-            
-            self.progress_bar.setVisible(False)
-            self.status_label.setText(f"Статистика обновлена: {file_count} файлов")
-            
-        except Exception as e:
-            self.progress_bar.setVisible(False)
+                except Exception as e:
+                    self.done.emit(None, str(e))
+        
+        self.stats_thread = StatsThread(
+            source_dir,
+            self.get_scan_filter(),
+            self.organizer.category_map(self.get_categories())
+        )
+        self.stats_thread.partial.connect(self.show_partial_statistics)
+        self.stats_thread.done.connect(self.statistics_finished)
+        self.stats_thread.start()
+    
+    def show_partial_statistics(self, stats):
+        """Промежуточные итоги сбора статистики"""
+        self.stats_widget.stats_text.setHtml(
+            "<p style='color: #ff9800;'>⏳ Идет сбор статистики, данные неполные...</p>"
+            + self.render_statistics(self.stats_thread.source_dir, stats)
+        )
+        self.status_label.setText(f"Сбор статистики: {stats.file_count} файлов...")
+    
+    def statistics_finished(self, stats, error):
+        """Итоговая статистика или ошибка сбора"""
+        source_dir = self.stats_thread.source_dir
+        self.stats_thread = None
+        self.progress_bar.setVisible(False)
+        
+        if stats is None:
+            self.status_label.setText("Ошибка сбора статистики")
             self.stats_widget.stats_text.setText(
                 f"<h2 style='color: #ff6b6b;'>❌ Ошибка при сборе статистики</h2>"
-                f"<p><b>Ошибка:</b> {str(e)}</p>"
+                f"<p><b>Ошибка:</b> {error}</p>"
             )
+            return
+        
+        self.stats_widget.stats_text.setHtml(self.render_statistics(source_dir, stats))
+        self.status_label.setText(f"Статистика обновлена: {stats.file_count} файлов")
+    
+    def discard_statistics(self):
+        """Отмена текущего сбора статистики без вывода его результатов"""
+        thread = self.stats_thread
+        if thread is None:
+            return
+        
+        self.stats_thread = None
+        thread.partial.disconnect()
+        thread.done.disconnect()
+        self.retire_thread(thread)
+    
+    def render_statistics(self, source_dir, stats):
+        """HTML вкладки статистики по FolderStats"""
+        file_count = stats.file_count
+        total_size = stats.total_size
+        
+        stats_text = "<h1 style='color: #64b5f6;'>📊 Статистика файлов</h1>"
+        stats_text += f"<p><b>📁 Папка:</b> <code>{source_dir}</code></p>"
+        
+        # Общая статистика
+        stats_text += f"<h2>📈 Общая статистика</h2>"
+        stats_text += f"<p><b>📄 Всего файлов:</b> {file_count:,}</p>"
+        stats_text += f"<p><b>📏 Общий размер:</b> {self.format_size(total_size)}</p>"
+        
+        if file_count > 0:
+            avg_size = total_size / file_count
+            stats_text += f"<p><b>📊 Средний размер файла:</b> {self.format_size(avg_size)}</p>"
+        
+        # Статистика по расширениям
+        stats_text += "<h2>📝 Статистика по расширениям</h2>"
+        stats_text += "<table border='1' cellpadding='8' cellspacing='0' style='border-collapse: collapse; width: 100%;'>"
+        stats_text += "<tr style='background-color: #2d2d2d; color: #ffffff; font-weight: bold;'>"
+        stats_text += "<th>Расширение</th><th>Количество</th><th>Процент</th><th>Общий размер</th></tr>"
+        
+        ext_counter = 0
+        for ext, (count, ext_size) in sorted(stats.by_extension.items(), key=lambda x: x[1][0], reverse=True):
+            percent = (count / file_count * 100) if file_count > 0 else 0
+            
+            color = "#4caf50" if percent > 10 else "#ff9800" if percent > 5 else "#f44336"
+            
+            stats_text += f"<tr style='background-color: {'#252525' if ext_counter % 2 == 0 else '#2a2a2a'};'>"
+            stats_text += f"<td><b>{ext}</b></td>"
+            stats_text += f"<td>{count:,}</td>"
+            stats_text += f"<td><span style='color: {color};'>{percent:.1f}%</span></td>"
+            stats_text += f"<td>{self.format_size(ext_size)}</td>"
+            stats_text += "</tr>"
+            ext_counter += 1
+        
+        stats_text += "</table>"
+        
+        # Статистика по категориям
+        stats_text += "<h2>📁 Статистика по категориям</h2>"
+        stats_text += "<table border='1' cellpadding='8' cellspacing='0' style='border-collapse: collapse; width: 100%;'>"
+        stats_text += "<tr style='background-color: #2d2d2d; color: #ffffff; font-weight: bold;'>"
+        stats_text += "<th>Категория</th><th>Количество</th><th>Процент</th></tr>"
+        
+        cat_counter = 0
+        for category, count in sorted(stats.by_category.items(), key=lambda x: x[1], reverse=True):
+            percent = (count / file_count * 100) if file_count > 0 else 0
+            
+            stats_text += f"<tr style='background-color: {'#252525' if cat_counter % 2 == 0 else '#2a2a2a'};'>"
+            stats_text += f"<td><b>{category}</b></td>"
+            stats_text += f"<td>{count:,}</td>"
+            stats_text += f"<td><span style='color: #64b5f6;'>{percent:.1f}%</span></td>"
+            stats_text += "</tr>"
+            cat_counter += 1
+        
+        stats_text += "</table>"
+        
+        # Анализ папок по таблице размеров (корень не учитывается)
+        folders = {rel_dir: size for rel_dir, (files, size) in stats.folder_table().items() if rel_dir and size > 0}
+        if folders:
+            largest_dir = max(folders.items(), key=lambda x: x[1])
+            smallest_dir = min(folders.items(), key=lambda x: x[1])
+            
+            stats_text += "<h2>📂 Анализ папок</h2>"
+            stats_text += f"<p><b>📈 Самая большая папка:</b> {largest_dir[0]} "
+            stats_text += f"({self.format_size(largest_dir[1])})</p>"
+            stats_text += f"<p><b>📉 Самая маленькая папка:</b> {smallest_dir[0]} "
+            stats_text += f"({self.format_size(smallest_dir[1])})</p>"
+        
+        return stats_text
     
     def export_statistics(self):
         """Экспорт статистики"""
@@ -1932,6 +2619,13 @@ class FileOrganizerApp(QMainWindow):
             self.backup_checkbox.setChecked(False)
             self.dup_method_combo.setCurrentIndex(0)
             self.dup_size_threshold.setValue(10)
+            self.dup_workers.setValue(4)
+            self.dup_image_distance.setValue(8)
+            self.dup_memory_limit.setValue(0)
+            self.dup_reference_path.clear()
+            self.dup_verify_archives.setChecked(False)
+            self.dup_payload_hash.setChecked(False)
+            self.reset_filter_settings()
             self.lang_combo.setCurrentIndex(0)
             self.save_config()
             self.status_label.setText("Настройки сброшены")
@@ -1968,16 +2662,6 @@ class FileOrganizerApp(QMainWindow):
         else:  # Большие размеры как целые числа
             return f"{int(size_bytes)} {units[unit_index]}"
     
-    def safe_display_path_for_table(self, path):
-        """Безопасное отображение пути для таблицы"""
-        try:
-            # Ограничиваем длину пути для лучшего отображения
-            if len(path) > 100:
-                return "..." + path[-97:]
-            return path
-        except:
-            return "Неверный путь"
-    
     def closeEvent(self, event):
         """Обработка закрытия окна"""
         if self.is_scanning:
@@ -1992,6 +2676,33 @@ class FileOrganizerApp(QMainWindow):
                 event.ignore()
                 return
         
+        if self.organize_thread is not None:
+            reply = QMessageBox.question(
+                self, 'Выход',
+                'Идет сортировка файлов. Остановить ее и выйти?',
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.No
+            )
+            
+            if reply != QMessageBox.Yes:
+                event.ignore()
+                return
+        
+        # Поиск дубликатов пишет в кэш хэшей: он должен завершиться до закрытия кэша.
+        # Итоги остановленного поиска уже не показываются
+        if self.is_scanning and self.dup_thread is not None:
+            self.dup_thread.group_found.disconnect()
+            self.dup_thread.progress.disconnect()
+            self.dup_thread.finished.disconnect()
+        
+        # Фоновые задачи останавливаются до закрытия окна
+        for thread in [self.preview_thread, self.organize_thread, self.stats_thread,
+                       self.dup_thread] + self.stale_threads:
+            if thread is not None:
+                thread.cancel_token.cancel()
+                thread.wait()
+        
         # Сохраняем настройки перед выходом
         self.save_config()
+        self.hash_cache.close()
         event.accept()
\ No newline at end of file
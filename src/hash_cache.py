@@ -0,0 +1,167 @@
+# hash_cache.py
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class HashCache:
+    """Постоянный кэш хэшей файлов (SQLite)
+    
+    Запись действительна, пока у файла не изменились устройство, inode,
+    размер и время изменения. Размер кэша ограничен max_entries: при
+    переполнении вытесняются записи, которые дольше всего не использовались.
+    Новые хэши и отметки об использовании пишутся в базу партиями по
+    BATCH_ROWS, поэтому память не растет с числом файлов и при повторном
+    сканировании, где почти все запросы - попадания.
+    """
+    
+    BATCH_ROWS = 1000
+    
+    def __init__(self, db_path, max_entries=1000000):
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._touched = []
+        
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS hashes (
+                dev INTEGER NOT NULL,
+                ino INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                path TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (dev, ino, kind)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON hashes (last_used)")
+        self._conn.commit()
+    
+    def get(self, file_key, kind):
+        """Хэш из кэша или None, если файл изменился или не кэширован
+        
+        file_key - кортеж (dev, ino, size, mtime) из stat() файла.
+        """
+        dev, ino, size, mtime = file_key
+        if not ino:
+            # Файловая система не дает стабильных inode - кэшировать нельзя
+            return None
+        
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT hash FROM hashes WHERE dev = ? AND ino = ? AND kind = ? "
+                "AND size = ? AND mtime = ?",
+                (dev, ino, kind, size, mtime)
+            ).fetchone()
+            
+            if row is None:
+                return None
+            
+            self._touched.append((time.time(), dev, ino, kind))
+            if len(self._touched) >= self.BATCH_ROWS:
+                self._commit()
+            return row[0]
+    
+    def put(self, path, file_key, kind, hash_value):
+        """Сохранение хэша файла"""
+        dev, ino, size, mtime = file_key
+        if not ino:
+            return
+        
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO hashes "
+                "(dev, ino, kind, size, mtime, path, hash, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (dev, ino, kind, size, mtime, str(path), hash_value, time.time())
+            )
+            self._pending += 1
+            if self._pending >= self.BATCH_ROWS:
+                self._commit()
+    
+    def flush(self):
+        """Запись изменений на диск и вытеснение лишних записей"""
+        with self._lock:
+            self._commit()
+            self._evict()
+    
+    def _commit(self):
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE hashes SET last_used = ? WHERE dev = ? AND ino = ? AND kind = ?",
+                self._touched
+            )
+            self._touched = []
+        self._conn.commit()
+        self._pending = 0
+    
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM hashes WHERE rowid IN "
+                "(SELECT rowid FROM hashes ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            self._conn.commit()
+    
+    def purge_stale(self, vacuum=False):
+        """Удаление записей для измененных файлов
+        
+        Запись устарела, если по сохраненному пути лежит тот же inode, но
+        с другим размером или временем изменения. Если пути нет или там
+        другой inode, файл мог быть переименован или перемещен, и его запись
+        по-прежнему действительна - такие записи вытесняются только по
+        max_entries. vacuum=True сжимает файл базы; на большой базе это
+        долго, поэтому по умолчанию не делается.
+        """
+        with self._lock:
+            self._commit()
+            rows = self._conn.execute(
+                "SELECT dev, ino, kind, size, mtime, path FROM hashes"
+            ).fetchall()
+            
+            stale = []
+            for dev, ino, kind, size, mtime, path in rows:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if (st.st_dev, st.st_ino) == (dev, ino) and (st.st_size, st.st_mtime) != (size, mtime):
+                    stale.append((dev, ino, kind))
+            
+            self._conn.executemany(
+                "DELETE FROM hashes WHERE dev = ? AND ino = ? AND kind = ?",
+                stale
+            )
+            self._conn.commit()
+            if vacuum:
+                self._conn.execute("VACUUM")
+        
+        return len(stale)
+    
+    def clear(self):
+        """Полная очистка кэша"""
+        with self._lock:
+            self._touched = []
+            self._conn.execute("DELETE FROM hashes")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+    
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+    
+    def close(self):
+        """Закрытие базы с сохранением изменений"""
+        self.flush()
+        with self._lock:
+            self._conn.close()
@@ -1,10 +1,17 @@
 import os
 import shutil
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional
+from .scan_filter import ScanFilter
+from .utils import CancelToken, OperationCancelled
 
 class FileOrganizer:
+    PROGRESS_INTERVAL = 0.2
+    # Порция копирования при переносе на другой диск
+    COPY_CHUNK = 1024 * 1024
+    
     def __init__(self):
         self.default_categories = {
             'Изображения': ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.svg'],
@@ -13,34 +20,116 @@ class FileOrganizer:
             'Музыка': ['.mp3', '.wav', '.flac'],
             'Видео': ['.mp4', '.avi', '.mkv'],
         }
+        self._progress_callback = None
+        self._progress = {}
+        self._started = 0.0
+        self._last_progress = 0.0
+    
+    def category_map(self, categories: Dict) -> Dict[str, str]:
+        """Расширение -> категория; при повторе расширения побеждает первая категория"""
+        mapping = {}
+        for cat_name, extensions in categories.items():
+            for ext in extensions:
+                mapping.setdefault(ext.lower(), cat_name)
+        return mapping
+    
+    def target_folder(self, category: str, timestamp: float, organize_by_date: bool, date_format: str) -> str:
+        """Папка назначения относительно исходной: категория или категория/дата"""
+        if organize_by_date:
+            try:
+                return f"{category}/{datetime.fromtimestamp(timestamp).strftime(date_format)}"
+            except:
+                pass
+        return category
+    
+    def count_entries(self, source_dir: str) -> int:
+        """Число записей в папке: один листинг без stat() для шкалы прогресса"""
+        try:
+            return len(os.listdir(source_dir))
+        except OSError:
+            return 0
+    
+    def plan_organization(self, source_dir: str, categories: Dict, organize_by_date: bool = True,
+                          date_format: str = "%Y-%m-%d", scan_filter: Optional[ScanFilter] = None,
+                          cancel_token: Optional[CancelToken] = None):
+        """План сортировки без перемещения файлов
+        
+        Генератор кортежей (путь, имя, тип, категория, новая папка) для
+        каждого файла, который переместит organize_files. Время создания
+        берется из stat() обхода, отдельных вызовов на файл нет. После
+        cancel_token.cancel() бросает OperationCancelled.
+        """
+        scan_filter = scan_filter or ScanFilter()
+        mapping = self.category_map(categories)
+        
+        for entry, st in scan_filter.walk(source_dir, recursive=False):
+            if cancel_token is not None:
+                cancel_token.check()
+            ext = os.path.splitext(entry.name)[1].lower()
+            category = mapping.get(ext, "Разное")
+            folder = self.target_folder(category, st.st_ctime, organize_by_date, date_format)
+            yield entry.path, entry.name, ext if ext else "без расширения", category, folder
     
-    def organize_files(self, source_dir: str, categories: Dict, organize_by_date: bool = True, date_format: str = "%Y-%m-%d"):
-        """Основная функция сортировки"""
+    def organize_files(self, source_dir: str, categories: Dict, organize_by_date: bool = True, date_format: str = "%Y-%m-%d",
+                       scan_filter: Optional[ScanFilter] = None, progress: Optional[Callable[[Dict], None]] = None,
+                       cancel_token: Optional[CancelToken] = None):
+        """Основная функция сортировки
+        
+        progress - функция, которая не чаще раза в PROGRESS_INTERVAL секунд
+        получает словарь progress_info(). Отмена через cancel_token
+        проверяется между файлами и во время копирования на другой диск:
+        прерванная копия удаляется, исходный файл остается на месте, а уже
+        перемещенные файлы - в новых папках. В результате тогда
+        cancelled=True.
+        """
         source_path = Path(source_dir)
-        results = {'moved': 0, 'errors': 0}
+        results = {'moved': 0, 'errors': 0, 'cancelled': False}
+        scan_filter = scan_filter or ScanFilter()
+        mapping = self.category_map(categories)
+        
+        # Список файлов нужен заранее: по нему считаются общий объем и ETA
+        files = list(scan_filter.walk(source_path, recursive=False))
+        self._start_progress(progress, len(files), sum(st.st_size for entry, st in files))
+        
+        # Копия, созданная для текущего файла: удалять при сбое можно только ее,
+        # а не файл, который успел появиться по тому же пути
+        created = []
         
-        for file_path in source_path.iterdir():
-            if file_path.is_file():
+        def copy_with_progress(src, dst):
+            # shutil.move копирует только при переносе на другой диск
+            with open(src, 'rb') as fsrc, open(dst, 'xb') as fdst:
+                created.append(dst)
+                while True:
+                    if cancel_token is not None:
+                        cancel_token.check()
+                    chunk = fsrc.read(self.COPY_CHUNK)
+                    if not chunk:
+                        break
+                    fdst.write(chunk)
+                    self._progress['bytes_done'] += len(chunk)
+                    self._progress['bytes_copied'] += len(chunk)
+                    self._report_progress()
+            shutil.copystat(src, dst)
+            return dst
+        
+        try:
+            for entry, st in files:
+                if cancel_token is not None:
+                    cancel_token.check()
+                
+                file_path = Path(entry.path)
+                self._progress['current'] = file_path.name
+                bytes_before = self._progress['bytes_done']
+                target_file = None
+                created.clear()
                 try:
                     ext = file_path.suffix.lower()
                     
                     # Находим категорию
-                    category = "Разное"
-                    for cat_name, extensions in categories.items():
-                        if ext in [e.lower() for e in extensions]:
-                            category = cat_name
-                            break
+                    category = mapping.get(ext, "Разное")
                     
-                    # Создаем путь назначения
-                    if organize_by_date:
-                        try:
-                            timestamp = os.path.getctime(file_path)
-                            date_str = datetime.fromtimestamp(timestamp).strftime(date_format)
-                            target_dir = source_path / category / date_str
-                        except:
-                            target_dir = source_path / category
-                    else:
-                        target_dir = source_path / category
+                    # Создаем путь назначения (тот же, что показывает предпросмотр)
+                    target_dir = source_path / self.target_folder(category, st.st_ctime, organize_by_date, date_format)
                     
                     # Создаем папки
                     target_dir.mkdir(parents=True, exist_ok=True)
@@ -53,11 +142,84 @@ class FileOrganizer:
                         target_file = target_dir / new_name
                         counter += 1
                     
-                    shutil.move(str(file_path), str(target_file))
+                    shutil.move(str(file_path), str(target_file), copy_function=copy_with_progress)
                     results['moved'] += 1
-                    
+                
+                except OperationCancelled:
+                    self._discard_partial_copy(file_path, target_file if created else None)
+                    raise
+                
                 except Exception as e:
+                    self._discard_partial_copy(file_path, target_file if created else None)
                     results['errors'] += 1
                     print(f"Ошибка с {file_path.name}: {e}")
+                
+                # Файл учтен полностью, даже если не переместился; переименование
+                # на том же диске в bytes_copied не входит
+                self._progress['bytes_done'] = bytes_before + st.st_size
+                self._progress['files_done'] += 1
+                self._progress['moved'] = results['moved']
+                self._progress['errors'] = results['errors']
+                self._report_progress()
+        
+        except OperationCancelled:
+            results['cancelled'] = True
         
+        self._report_progress(force=True)
         return results
+    
+    def _discard_partial_copy(self, file_path: Path, target_file: Optional[Path]):
+        """Удаление неполной копии, если исходный файл остался на месте"""
+        if target_file is not None and file_path.exists() and target_file.exists():
+            try:
+                target_file.unlink()
+            except OSError:
+                pass
+    
+    def _start_progress(self, progress, files_total: int, bytes_total: int):
+        self._progress_callback = progress
+        self._started = time.monotonic()
+        self._last_progress = 0.0
+        self._progress = {
+            'files_done': 0,
+            'files_total': files_total,
+            'bytes_done': 0,
+            'bytes_copied': 0,
+            'bytes_total': bytes_total,
+            'moved': 0,
+            'errors': 0,
+            'current': ''
+        }
+    
+    def progress_info(self) -> Dict:
+        """Текущий прогресс сортировки
+        
+        bytes_done - объем обработанных файлов, bytes_copied - только
+        скопированных на другой диск. Время сортировки определяют
+        копирования: переименование на том же диске мгновенно, поэтому
+        скорость (throughput) считается по скопированным байтам, а ETA -
+        по ней и доле копирований среди уже обработанных байт. Пока копий
+        не было, ETA считается по числу файлов.
+        """
+        info = dict(self._progress)
+        elapsed = time.monotonic() - self._started
+        info['elapsed'] = elapsed
+        info['files_per_second'] = info['files_done'] / elapsed if elapsed > 0 else 0
+        info['throughput'] = info['bytes_copied'] / elapsed if elapsed > 0 else 0
+        
+        eta = None
+        if info['bytes_copied'] and info['throughput']:
+            copy_share = info['bytes_copied'] / info['bytes_done']
+            eta = (info['bytes_total'] - info['bytes_done']) * copy_share / info['throughput']
+        elif info['files_done']:
+            eta = (info['files_total'] - info['files_done']) / info['files_per_second']
+        info['eta'] = eta
+        return info
+    
+    def _report_progress(self, force: bool = False):
+        if self._progress_callback is None:
+            return
+        now = time.monotonic()
+        if force or now - self._last_progress >= self.PROGRESS_INTERVAL:
+            self._last_progress = now
+            self._progress_callback(self.progress_info())
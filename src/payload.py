@@ -0,0 +1,130 @@
+# payload.py
+"""Поиск полезных данных MP3 и JPEG без метаданных
+
+Разбирается только контейнер: теги ID3/APE у MP3, сегменты APPn и COM у
+JPEG. Декодирования нет - читаются заголовки в несколько сотен байт.
+"""
+import os
+
+PAYLOAD_EXTENSIONS = ('.mp3', '.jpg', '.jpeg')
+
+
+def payload_ranges(path):
+    """Список (смещение, длина) полезных данных файла или None
+    
+    None - формат не поддерживается или файл не удалось разобрать; такой
+    файл хэшируется целиком.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if ext == '.mp3':
+            ranges = _mp3_ranges(f, size)
+        elif ext in ('.jpg', '.jpeg'):
+            ranges = _jpeg_ranges(f, size)
+        else:
+            return None
+    return _merge(ranges) if ranges else None
+
+
+def _merge(ranges):
+    """Склейка соседних диапазонов, чтобы читать меньшим числом вызовов"""
+    merged = [list(ranges[0])]
+    for offset, length in ranges[1:]:
+        last = merged[-1]
+        if last[0] + last[1] == offset:
+            last[1] += length
+        else:
+            merged.append([offset, length])
+    return [tuple(r) for r in merged]
+
+
+def _syncsafe(data):
+    """Целое из 7-битных байтов (размер тега ID3v2) или None"""
+    value = 0
+    for byte in data:
+        if byte & 0x80:
+            return None
+        value = (value << 7) | byte
+    return value
+
+
+def _mp3_ranges(f, size):
+    """Аудиокадры между тегами ID3v2 в начале и APEv2/ID3v1 в конце"""
+    start = 0
+    # Тегов ID3v2 подряд может быть несколько
+    while True:
+        f.seek(start)
+        header = f.read(10)
+        if len(header) < 10 or header[:3] != b'ID3':
+            break
+        tag_size = _syncsafe(header[6:10])
+        if tag_size is None:
+            return None
+        # Флаг 0x10 - в конце тега есть 10-байтовый footer
+        start += 10 + tag_size + (10 if header[5] & 0x10 else 0)
+    
+    end = size
+    if end - start >= 128:
+        f.seek(end - 128)
+        if f.read(3) == b'TAG':
+            end -= 128
+            # Расширенный тег "TAG+" стоит перед ID3v1
+            if end - start >= 227:
+                f.seek(end - 227)
+                if f.read(4) == b'TAG+':
+                    end -= 227
+    
+    if end - start >= 32:
+        f.seek(end - 32)
+        footer = f.read(32)
+        if footer[:8] == b'APETAGEX':
+            tag_size = int.from_bytes(footer[12:16], 'little')
+            flags = int.from_bytes(footer[20:24], 'little')
+            # Размер в footer не включает заголовок тега
+            total = tag_size + (32 if flags & 0x80000000 else 0)
+            if total <= end - start:
+                end -= total
+    
+    if end <= start:
+        return None
+    return [(start, end - start)]
+
+
+def _jpeg_ranges(f, size):
+    """Все сегменты, кроме APPn и COM, и сжатые данные от SOS до конца файла"""
+    f.seek(0)
+    if f.read(2) != b'\xff\xd8':
+        return None
+    
+    ranges = [(0, 2)]
+    offset = 2
+    while offset + 4 <= size:
+        f.seek(offset)
+        marker = f.read(4)
+        if marker[0] != 0xFF:
+            return None
+        
+        code = marker[1]
+        if code == 0xFF:
+            # Байт-заполнитель перед маркером
+            offset += 1
+            continue
+        if code == 0x01 or 0xD0 <= code <= 0xD8:
+            # Маркеры без длины
+            ranges.append((offset, 2))
+            offset += 2
+            continue
+        
+        length = int.from_bytes(marker[2:4], 'big')
+        if length < 2:
+            return None
+        if code == 0xDA:
+            # SOS: дальше энтропийно-сжатые данные изображения
+            ranges.append((offset, size - offset))
+            return ranges
+        if not (0xE0 <= code <= 0xEF or code == 0xFE):
+            ranges.append((offset, 2 + length))
+        offset += 2 + length
+    
+    return None
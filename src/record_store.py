@@ -0,0 +1,137 @@
+# record_store.py
+"""Компактное хранилище описаний файлов для поиска дубликатов"""
+from array import array
+
+
+class RecordStore:
+    """Записи о файлах в параллельных массивах вместо словаря на файл
+    
+    Числовые поля лежат в array (8 байт на значение), путь хранится как
+    индекс папки плюс имя: папки общие для всех своих файлов, а имена
+    лежат подряд в одном буфере UTF-8 и декодируются только при обращении.
+    Редкие поля (жесткие ссылки, алгоритм и т.п.) хранятся
+    отдельно только для тех записей, у которых они есть.
+    """
+    
+    COLUMNS = ('size', 'ctime', 'mtime', 'dev', 'ino', 'nlink')
+    
+    def __init__(self):
+        self.sizes = array('q')
+        self.ctimes = array('d')
+        self.mtimes = array('d')
+        self.devs = array('Q')
+        self.inos = array('Q')
+        self.nlinks = array('L')
+        self.dir_ids = array('L')
+        self._names = bytearray()
+        self._name_ends = array('Q')
+        self.dirs = []
+        self._dir_index = {}
+        self._columns = {
+            'size': self.sizes,
+            'ctime': self.ctimes,
+            'mtime': self.mtimes,
+            'dev': self.devs,
+            'ino': self.inos,
+            'nlink': self.nlinks
+        }
+        # Необязательные поля: {индекс записи: {ключ: значение}}
+        self.extras = {}
+    
+    def add(self, path, name, st):
+        """Добавление файла по пути, имени и результату stat(); возвращает индекс"""
+        # Префикс папки вместе с разделителем, чтобы путь собирался без join
+        prefix = path[:len(path) - len(name)]
+        dir_id = self._dir_index.get(prefix)
+        if dir_id is None:
+            dir_id = len(self.dirs)
+            self._dir_index[prefix] = dir_id
+            self.dirs.append(prefix)
+        
+        self.sizes.append(st.st_size)
+        self.ctimes.append(st.st_ctime)
+        self.mtimes.append(st.st_mtime)
+        self.devs.append(st.st_dev)
+        self.inos.append(st.st_ino)
+        self.nlinks.append(st.st_nlink)
+        self.dir_ids.append(dir_id)
+        # surrogatepass сохраняет и имена, не декодируемые в UTF-8
+        self._names += name.encode('utf-8', 'surrogatepass')
+        self._name_ends.append(len(self._names))
+        return len(self._name_ends) - 1
+    
+    def view(self, index):
+        return FileRecord(self, index)
+    
+    def name(self, index):
+        start = self._name_ends[index - 1] if index else 0
+        return self._names[start:self._name_ends[index]].decode('utf-8', 'surrogatepass')
+    
+    def path(self, index):
+        return self.dirs[self.dir_ids[index]] + self.name(index)
+    
+    def __len__(self):
+        return len(self._name_ends)
+
+
+class FileRecord:
+    """Легкое представление записи RecordStore с интерфейсом словаря
+    
+    Поддерживает file_info['size'], file_info.get('links') и присваивание
+    новых ключей, поэтому GUI и остальной код работают с ним так же, как
+    с прежними словарями.
+    """
+    
+    __slots__ = ('store', 'index')
+    
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+    
+    def __getitem__(self, key):
+        store = self.store
+        if key == 'path':
+            return store.path(self.index)
+        if key == 'name':
+            return store.name(self.index)
+        column = store._columns.get(key)
+        if column is not None:
+            return column[self.index]
+        try:
+            return store.extras[self.index][key]
+        except KeyError:
+            raise KeyError(key) from None
+    
+    def __setitem__(self, key, value):
+        column = self.store._columns.get(key)
+        if column is not None:
+            column[self.index] = value
+        elif key in ('path', 'name'):
+            raise KeyError(f"{key} нельзя изменить")
+        else:
+            self.store.extras.setdefault(self.index, {})[key] = value
+    
+    def __contains__(self, key):
+        return key in self.keys()
+    
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+    
+    def keys(self):
+        return ('path', 'name') + RecordStore.COLUMNS + tuple(self.store.extras.get(self.index, ()))
+    
+    def to_dict(self):
+        return {key: self[key] for key in self.keys()}
+    
+    def __eq__(self, other):
+        if isinstance(other, FileRecord):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+    
+    def __repr__(self):
+        return f"FileRecord({self.to_dict()!r})"
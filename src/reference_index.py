@@ -0,0 +1,138 @@
+# reference_index.py
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from .scan_filter import ScanFilter
+from .utils import path_digest
+
+
+class ReferenceIndex:
+    """Индекс эталонной папки (архива): размер -> файлы, хэши по мере надобности
+    
+    Индекс строится одним обходом без чтения файлов и сохраняется в JSON.
+    Хэш эталонного файла считается, только когда с ним совпал по размеру
+    файл из проверяемой папки, и тоже сохраняется в индексе. Перед
+    использованием хэша файл проверяется stat(): измененный хэшируется
+    заново, удаленный пропускается.
+    """
+    
+    def __init__(self, root, index_dir):
+        self.root = str(Path(root).resolve())
+        self.index_dir = Path(index_dir)
+        self.by_size = {}
+        self.built = None
+        self._dirty = False
+    
+    @property
+    def index_path(self):
+        return self.index_dir / f"reference_{path_digest(self.root)}.json"
+    
+    def load(self):
+        """Загрузка сохраненного индекса; False, если его нет или он поврежден"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        
+        if data.get('root') != self.root:
+            return False
+        
+        self.by_size = {int(size): entries for size, entries in data['files'].items()}
+        self.built = data.get('built')
+        self._dirty = False
+        return True
+    
+    def save(self):
+        """Сохранение индекса, если он изменился"""
+        if not self._dirty:
+            return
+        
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        data = {
+            'root': self.root,
+            'built': self.built,
+            'files': {str(size): entries for size, entries in self.by_size.items()}
+        }
+        temp = self.index_path.with_suffix('.tmp')
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(temp, self.index_path)
+        self._dirty = False
+    
+    def build(self, scan_filter=None, cancel_token=None):
+        """Обход эталонной папки: только stat(), без чтения содержимого"""
+        scan_filter = scan_filter or ScanFilter()
+        by_size = {}
+        
+        for entry, st in scan_filter.walk(self.root, full_stat=True):
+            if cancel_token is not None:
+                cancel_token.check()
+            by_size.setdefault(st.st_size, []).append({
+                'path': entry.path,
+                'name': entry.name,
+                'size': st.st_size,
+                'ctime': st.st_ctime,
+                'mtime': st.st_mtime,
+                'dev': st.st_dev,
+                'ino': st.st_ino,
+                'nlink': st.st_nlink,
+                'hashes': {}
+            })
+        
+        self.by_size = by_size
+        self.built = datetime.now().isoformat(timespec='seconds')
+        self._dirty = True
+    
+    def ensure(self, scan_filter=None, cancel_token=None, rebuild=False):
+        """Загрузка индекса с диска или построение, если его нет"""
+        if not rebuild and (self.by_size or self.load()):
+            return
+        self.build(scan_filter, cancel_token)
+        self.save()
+    
+    def contains(self, path):
+        """Лежит ли путь внутри эталонной папки"""
+        try:
+            return os.path.commonpath([self.root, str(Path(path).resolve())]) == self.root
+        except ValueError:
+            return False
+    
+    def entries(self, size):
+        """Действующие эталонные файлы заданного размера
+        
+        Записи сверяются со stat(): у измененных сбрасываются хэши,
+        исчезнувшие удаляются из индекса.
+        """
+        entries = self.by_size.get(size)
+        if not entries:
+            return []
+        
+        alive = []
+        for entry in entries:
+            try:
+                st = os.stat(entry['path'])
+            except OSError:
+                self._dirty = True
+                continue
+            if (st.st_size, st.st_mtime, st.st_ino) != (entry['size'], entry['mtime'], entry['ino']):
+                if st.st_size != size:
+                    self._dirty = True
+                    continue
+                entry.update(mtime=st.st_mtime, ctime=st.st_ctime, ino=st.st_ino,
+                             dev=st.st_dev, nlink=st.st_nlink, hashes={})
+                self._dirty = True
+            alive.append(entry)
+        
+        if len(alive) != len(entries):
+            self.by_size[size] = alive
+        return alive
+    
+    def set_hash(self, entry, algorithm, file_hash):
+        entry['hashes'][algorithm] = file_hash
+        self._dirty = True
+    
+    def file_count(self):
+        return sum(len(entries) for entries in self.by_size.values())
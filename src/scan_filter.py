@@ -0,0 +1,136 @@
+# scan_filter.py
+import fnmatch
+import os
+import re
+import stat
+
+# Атрибуты Windows (в st_file_attributes), которые считаем скрытыми
+HIDDEN_ATTRIBUTES = getattr(stat, 'FILE_ATTRIBUTE_HIDDEN', 2) | getattr(stat, 'FILE_ATTRIBUTE_SYSTEM', 4)
+
+DEFAULT_EXCLUDE = ['node_modules', '.git', '__pycache__', '.cache']
+
+
+def compile_patterns(patterns):
+    """Список glob-шаблонов в одно регулярное выражение (или None)"""
+    patterns = [p.strip() for p in patterns or [] if p.strip()]
+    if not patterns:
+        return None
+    return re.compile('|'.join(fnmatch.translate(os.path.normcase(p)) for p in patterns))
+
+
+def parse_patterns(text):
+    """Шаблоны из строки вида "node_modules, *.tmp" """
+    return [p.strip() for p in text.split(',') if p.strip()]
+
+
+class ScanFilter:
+    """Правила обхода дерева, общие для сканирования, статистики, дубликатов и сортировки
+    
+    Фильтр применяется во время обхода: исключенные папки не открываются
+    вовсе. Шаблоны include/exclude сравниваются и с именем, и с путем
+    относительно корня (через "/"). include ограничивает только файлы.
+    """
+    
+    def __init__(self, min_size=0, max_size=None, include=None, exclude=None,
+                 skip_hidden=True, follow_symlinks=False, one_filesystem=False):
+        self.min_size = min_size or 0
+        self.max_size = max_size or None
+        self.include = compile_patterns(include)
+        self.exclude = compile_patterns(exclude)
+        self.skip_hidden = skip_hidden
+        self.follow_symlinks = follow_symlinks
+        self.one_filesystem = one_filesystem
+    
+    @classmethod
+    def from_config(cls, config, min_size=0):
+        """Фильтр из настроек приложения"""
+        max_size_mb = config.get('scan_max_size', 0)
+        return cls(
+            min_size=min_size,
+            max_size=max_size_mb * 1024 * 1024 if max_size_mb else None,
+            include=config.get('scan_include', []),
+            exclude=config.get('scan_exclude', DEFAULT_EXCLUDE),
+            skip_hidden=config.get('scan_skip_hidden', True),
+            follow_symlinks=config.get('scan_follow_symlinks', False),
+            one_filesystem=config.get('scan_one_filesystem', False)
+        )
+    
+    def _is_hidden(self, entry, st):
+        if entry.name.startswith('.'):
+            return True
+        return bool(getattr(st, 'st_file_attributes', 0) & HIDDEN_ATTRIBUTES)
+    
+    def _matches(self, regex, name, rel_path):
+        return bool(regex.match(os.path.normcase(name)) or regex.match(os.path.normcase(rel_path)))
+    
+    def accepts_size(self, size):
+        if size < self.min_size:
+            return False
+        return self.max_size is None or size <= self.max_size
+    
+    def walk(self, root, recursive=True, full_stat=False):
+        """Обход дерева: пары (os.DirEntry, stat_result) для подходящих файлов
+        
+        Для каждого файла выполняется ровно один stat(). Папки, не прошедшие
+        фильтр, пропускаются вместе со всем содержимым. На Windows stat из
+        os.scandir не содержит st_ino/st_dev/st_nlink; full_stat=True
+        запрашивает их отдельным вызовом для каждого файла.
+        """
+        root = os.fspath(root)
+        try:
+            root_st = os.stat(root)
+        except OSError:
+            return
+        
+        visited = {(root_st.st_dev, root_st.st_ino)}
+        stack = [(root, '')]
+        
+        while stack:
+            directory, rel_dir = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            
+            subdirs = []
+            for entry in entries:
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    if entry.is_symlink() and not self.follow_symlinks:
+                        continue
+                    st = entry.stat(follow_symlinks=self.follow_symlinks)
+                except OSError:
+                    continue
+                
+                if self.skip_hidden and self._is_hidden(entry, st):
+                    continue
+                if self.exclude is not None and self._matches(self.exclude, entry.name, rel_path):
+                    continue
+                
+                if stat.S_ISDIR(st.st_mode):
+                    if not recursive:
+                        continue
+                    if self.one_filesystem and st.st_dev != root_st.st_dev:
+                        continue
+                    if self.follow_symlinks:
+                        # Защита от циклов через символические ссылки
+                        key = (st.st_dev, st.st_ino)
+                        if key in visited:
+                            continue
+                        visited.add(key)
+                    subdirs.append((entry.path, rel_path))
+                elif stat.S_ISREG(st.st_mode):
+                    if not self.accepts_size(st.st_size):
+                        continue
+                    if self.include is not None and not self._matches(self.include, entry.name, rel_path):
+                        continue
+                    if full_stat and not st.st_ino:
+                        try:
+                            st = os.stat(entry.path, follow_symlinks=self.follow_symlinks)
+                        except OSError:
+                            continue
+                    yield entry, st
+            
+            # Обратный порядок, чтобы папки обходились в порядке листинга
+            stack.extend(reversed(subdirs))
@@ -0,0 +1,141 @@
+# scan_state.py
+import sqlite3
+from pathlib import Path
+
+from .utils import path_digest
+
+# Условие SQL: файл f из состояния не менялся относительно текущего c
+UNCHANGED = "f.size = c.size AND f.mtime = c.mtime AND f.dev = c.dev AND f.ino = c.ino"
+
+
+class ScanState:
+    """Состояние последнего завершенного поиска дубликатов в папке (SQLite)
+    
+    Хранит для каждого файла stat() и полный хэш, если он считался. Новый
+    обход записывается во временную таблицу и сравнивается с сохраненным
+    состоянием запросами к базе, поэтому в памяти не держится ни список
+    старых файлов, ни словарь путей. Файл считается новым, если его пути
+    нет в состоянии или у него изменились размер, время изменения,
+    устройство или inode.
+    """
+    
+    BATCH_ROWS = 10000
+    
+    def __init__(self, root, state_dir):
+        self.root = str(Path(root).resolve())
+        self.state_dir = Path(state_dir)
+        self._conn = None
+        self._rows = []
+    
+    @property
+    def state_path(self):
+        return self.state_dir / f"scan_state_{path_digest(self.root)}.sqlite"
+    
+    def exists(self):
+        return self.state_path.exists()
+    
+    def reset(self):
+        """Удаление сохраненного состояния: следующий поиск будет полным"""
+        self.close()
+        try:
+            self.state_path.unlink()
+        except OSError:
+            pass
+    
+    def begin(self):
+        """Начало нового обхода"""
+        self.close()
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.state_path))
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                dev INTEGER NOT NULL,
+                ino INTEGER NOT NULL,
+                kind TEXT,
+                hash TEXT
+            )
+        """)
+        self._conn.execute("""
+            CREATE TEMP TABLE current (
+                id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                dev INTEGER NOT NULL,
+                ino INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE TEMP TABLE computed (id INTEGER PRIMARY KEY, hash TEXT NOT NULL)")
+        self._rows = []
+    
+    def add(self, record_id, path, size, mtime, dev, ino):
+        """Файл текущего обхода; record_id - индекс записи RecordStore"""
+        self._rows.append((record_id, path, size, mtime, dev, ino))
+        if len(self._rows) >= self.BATCH_ROWS:
+            self._flush_rows()
+    
+    def _flush_rows(self):
+        self._conn.executemany("INSERT INTO current VALUES (?, ?, ?, ?, ?, ?)", self._rows)
+        self._rows = []
+    
+    def candidates(self, kind):
+        """Файлы, размер которых совпал с новым или измененным файлом
+        
+        Возвращает тройки (record_id, новый ли файл, сохраненный хэш или
+        None). Хэш берется, только если файл не менялся и посчитан тем же
+        алгоритмом kind.
+        """
+        self._flush_rows()
+        self._conn.execute("CREATE INDEX temp.idx_current_path ON current (path)")
+        self._conn.execute("CREATE INDEX temp.idx_current_size ON current (size)")
+        self._conn.execute(f"""
+            CREATE TEMP TABLE new_sizes AS
+            SELECT DISTINCT c.size AS size FROM current c LEFT JOIN files f ON f.path = c.path
+            WHERE f.path IS NULL OR NOT ({UNCHANGED})
+        """)
+        return self._conn.execute(f"""
+            SELECT c.id, f.path IS NULL OR NOT ({UNCHANGED}),
+                   CASE WHEN f.kind = ? AND {UNCHANGED} THEN f.hash END
+            FROM current c LEFT JOIN files f ON f.path = c.path
+            WHERE c.size IN (SELECT size FROM new_sizes)
+        """, (kind,))
+    
+    def set_hash(self, record_id, file_hash):
+        """Хэш, посчитанный в текущем обходе"""
+        self._conn.execute("INSERT OR REPLACE INTO computed VALUES (?, ?)", (record_id, file_hash))
+    
+    def commit(self, kind):
+        """Замена сохраненного состояния текущим обходом
+        
+        Вызывается только после завершенного поиска. Удаленные файлы
+        исчезают из состояния, хэши неизмененных файлов сохраняются.
+        """
+        self._flush_rows()
+        with self._conn:
+            self._conn.execute(f"""
+                CREATE TEMP TABLE next AS
+                SELECT c.path AS path, c.size AS size, c.mtime AS mtime, c.dev AS dev, c.ino AS ino,
+                       CASE WHEN n.hash IS NOT NULL THEN ? WHEN {UNCHANGED} THEN f.kind END AS kind,
+                       CASE WHEN n.hash IS NOT NULL THEN n.hash WHEN {UNCHANGED} THEN f.hash END AS hash
+                FROM current c
+                LEFT JOIN files f ON f.path = c.path
+                LEFT JOIN computed n ON n.id = c.id
+            """, (kind,))
+            self._conn.execute("DELETE FROM files")
+            self._conn.execute("INSERT OR REPLACE INTO files SELECT * FROM temp.next")
+            self._conn.execute("DROP TABLE temp.next")
+    
+    def file_count(self):
+        if self._conn is None:
+            return 0
+        return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+    
+    def close(self):
+        """Закрытие базы; незавершенный обход отбрасывается"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        self._rows = []
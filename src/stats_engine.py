@@ -0,0 +1,117 @@
+# stats_engine.py
+"""Статистика папки за один обход дерева
+
+Каждый файл учитывается один раз: счетчики по расширениям и категориям
+и размер его собственной папки обновляются за O(1). Размеры папок с
+учетом вложенных считаются потом снизу вверх: сумма каждой папки
+прибавляется к родителю, от самых глубоких уровней к корню. Повторных
+обходов поддеревьев и лишних stat() нет.
+"""
+import os
+import time
+
+NO_EXTENSION = "без расширения"
+
+
+class FolderStats:
+    """Накопитель статистики файлов под корневой папкой
+    
+    Папки задаются путем относительно корня через "/", корень - пустая
+    строка. category_map - словарь расширение -> категория (см.
+    FileOrganizer.category_map).
+    """
+    
+    def __init__(self, root, category_map=None):
+        self.root = os.fspath(root)
+        self.category_map = category_map or {}
+        self.file_count = 0
+        self.total_size = 0
+        # Расширение -> [файлов, байт]
+        self.by_extension = {}
+        # Категория -> файлов
+        self.by_category = {}
+        # Полный путь папки -> [файлов, байт] только непосредственно в ней
+        self._direct = {}
+    
+    def add(self, path, size):
+        """Учет одного файла по полному пути"""
+        self.file_count += 1
+        self.total_size += size
+        
+        directory, name = os.path.split(path)
+        ext = os.path.splitext(name)[1].lower()
+        ext_stats = self.by_extension.get(ext or NO_EXTENSION)
+        if ext_stats is None:
+            ext_stats = self.by_extension[ext or NO_EXTENSION] = [0, 0]
+        ext_stats[0] += 1
+        ext_stats[1] += size
+        
+        category = self.category_map.get(ext, "Разное")
+        self.by_category[category] = self.by_category.get(category, 0) + 1
+        
+        folder = self._direct.get(directory)
+        if folder is None:
+            folder = self._direct[directory] = [0, 0]
+        folder[0] += 1
+        folder[1] += size
+    
+    def folder_table(self):
+        """Папка -> (файлов, байт) с учетом всех вложенных папок
+        
+        В таблице есть каждая папка, в поддереве которой нашелся хотя бы
+        один файл, включая корень ''. Время - O(число папок).
+        """
+        totals = {self._relative(directory): list(values) for directory, values in self._direct.items()}
+        
+        levels = {}
+        for rel_dir in totals:
+            if rel_dir:
+                levels.setdefault(rel_dir.count('/'), []).append(rel_dir)
+        
+        # Уровень depth содержит папки с depth разделителями; родители попадают на уровень выше
+        for depth in range(max(levels, default=-1), -1, -1):
+            for rel_dir in levels.get(depth, ()):
+                parent = rel_dir.rpartition('/')[0]
+                parent_totals = totals.get(parent)
+                if parent_totals is None:
+                    parent_totals = totals[parent] = [0, 0]
+                    if parent:
+                        levels.setdefault(depth - 1, []).append(parent)
+                parent_totals[0] += totals[rel_dir][0]
+                parent_totals[1] += totals[rel_dir][1]
+        
+        return {rel_dir: tuple(values) for rel_dir, values in totals.items()}
+    
+    def snapshot(self):
+        """Независимая копия для чтения из другого потока, пока обход продолжается"""
+        copy = FolderStats(self.root, self.category_map)
+        copy.file_count = self.file_count
+        copy.total_size = self.total_size
+        copy.by_extension = {ext: list(values) for ext, values in self.by_extension.items()}
+        copy.by_category = dict(self.by_category)
+        copy._direct = {directory: list(values) for directory, values in self._direct.items()}
+        return copy
+    
+    def _relative(self, directory):
+        rel_dir = os.path.relpath(directory, self.root)
+        return '' if rel_dir == '.' else rel_dir.replace(os.sep, '/')
+
+
+def collect_stats(root, scan_filter, category_map=None, cancel_token=None, on_partial=None, interval=0.3):
+    """FolderStats для всех файлов, которые пропускает scan_filter
+    
+    on_partial получает snapshot() накопленной статистики не чаще раза в
+    interval секунд. После cancel_token.cancel() бросает OperationCancelled.
+    """
+    stats = FolderStats(root, category_map)
+    last_partial = time.monotonic()
+    for entry, st in scan_filter.walk(root):
+        if cancel_token is not None:
+            cancel_token.check()
+        stats.add(entry.path, st.st_size)
+        if on_partial is not None:
+            now = time.monotonic()
+            if now - last_partial >= interval:
+                last_partial = now
+                on_partial(stats.snapshot())
+    return stats
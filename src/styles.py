@@ -290,7 +290,7 @@ def get_stylesheet():
     }
     
     /* ===== ТАБЛИЦЫ ===== */
-    QTableWidget {
+    QTableView {
         background-color: #252525;
         alternate-background-color: #2a2a2a;
         gridline-color: #3a3a3a;
@@ -300,17 +300,17 @@ def get_stylesheet():
         outline: none;
     }
     
-    QTableWidget::item {
+    QTableView::item {
         padding: 8px;
         border-bottom: 1px solid #3a3a3a;
     }
     
-    QTableWidget::item:selected {
+    QTableView::item:selected {
         background-color: #1976d2;
         color: white;
     }
     
-    QTableWidget::item:hover {
+    QTableView::item:hover {
         background-color: #3a3a3a;
     }
     
@@ -0,0 +1,284 @@
+# table_models.py
+"""Модели таблиц предпросмотра и дубликатов для QTableView
+
+Строки не превращаются в QTableWidgetItem: модель хранит данные в
+компактных массивах, а текст ячейки собирается в data() только для
+видимых строк при отрисовке. Поэтому таблица на миллион строк
+открывается сразу и не занимает память на каждую ячейку.
+"""
+from array import array
+from datetime import datetime
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+
+class SortedTableModel(QAbstractTableModel):
+    """Основа моделей с сортировкой по заранее посчитанным ключам
+    
+    Ключи колонки считаются один раз и кэшируются до изменения данных,
+    повторный щелчок по заголовку только меняет направление. Сортировка
+    не трогает данные: строки вида отображаются через массив _order.
+    
+    Наследник обязан определить:
+    - _row_count() - число строк в данных;
+    - _make_sort_keys(column) - список ключей сортировки колонки, по
+      одному на строку данных в исходном порядке.
+    abc здесь не подходит: метакласс Qt несовместим с ABCMeta.
+    """
+    
+    HEADERS = []
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._order = None
+        self._sort_keys = {}
+    
+    def _source_row(self, row):
+        return row if self._order is None else self._order[row]
+    
+    def _rows_appended(self, start, end):
+        """Новые строки идут в конец вида, ключи сортировки пересчитаются"""
+        if self._order is not None:
+            self._order.extend(range(start, end))
+        self._sort_keys = {}
+    
+    def _reset_order(self):
+        self._order = None
+        self._sort_keys = {}
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._row_count()
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+    
+    def sort(self, column, order=Qt.AscendingOrder):
+        count = self._row_count()
+        if not count:
+            return
+        
+        keys = self._sort_keys.get(column)
+        if keys is None:
+            keys = self._make_sort_keys(column)
+            self._sort_keys[column] = keys
+        
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        sources = [self._source_row(index.row()) for index in persistent]
+        
+        self._order = array('L', sorted(range(count), key=keys.__getitem__,
+                                        reverse=order == Qt.DescendingOrder))
+        
+        # Выделение и текущая строка следуют за своими данными
+        if persistent:
+            position = array('L', [0]) * count
+            for row, source in enumerate(self._order):
+                position[source] = row
+            self.changePersistentIndexList(
+                persistent, [self.index(position[source], index.column())
+                             for index, source in zip(persistent, sources)]
+            )
+        self.layoutChanged.emit()
+    
+    def _label_ranks(self, labels):
+        """Номер каждой метки в алфавитном порядке"""
+        ranks = [0] * len(labels)
+        for rank, label_id in enumerate(sorted(range(len(labels)), key=lambda i: labels[i].casefold())):
+            ranks[label_id] = rank
+        return ranks
+
+
+class PreviewTableModel(SortedTableModel):
+    """Предпросмотр сортировки: файл, тип, категория и новая папка
+    
+    Тип, категория и папка повторяются у тысяч файлов, поэтому каждая
+    строка хранится один раз, а строки таблицы держат ее номер.
+    """
+    
+    HEADERS = ["📄 Файл", "📝 Тип", "📁 Категория", "📍 Новая папка"]
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._reset_data()
+    
+    def _reset_data(self):
+        self.names = []
+        self._labels = ([], [], [])
+        self._label_ids = ({}, {}, {})
+        self._columns = (array('L'), array('L'), array('L'))
+        self._reset_order()
+    
+    def _label_id(self, column, text):
+        label_ids = self._label_ids[column]
+        label_id = label_ids.get(text)
+        if label_id is None:
+            label_id = len(self._labels[column])
+            label_ids[text] = label_id
+            self._labels[column].append(text)
+        return label_id
+    
+    def append_rows(self, rows):
+        """Добавление списка строк (имя, тип, категория, новая папка) одной вставкой"""
+        if not rows:
+            return
+        
+        start = len(self.names)
+        self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+        for name, file_type, category, folder in rows:
+            self.names.append(name)
+            for column, text in enumerate((file_type, category, folder)):
+                self._columns[column].append(self._label_id(column, text))
+        self._rows_appended(start, len(self.names))
+        self.endInsertRows()
+    
+    def clear(self):
+        self.beginResetModel()
+        self._reset_data()
+        self.endResetModel()
+    
+    def _row_count(self):
+        return len(self.names)
+    
+    def text(self, row, column):
+        row = self._source_row(row)
+        if column == 0:
+            return self.names[row]
+        return self._labels[column - 1][self._columns[column - 1][row]]
+    
+    def rows(self):
+        """Строки в порядке отображения (для экспорта)"""
+        for row in range(len(self.names)):
+            yield [self.text(row, column) for column in range(len(self.HEADERS))]
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return self.text(index.row(), index.column())
+        return None
+    
+    def _make_sort_keys(self, column):
+        if column == 0:
+            return [name.casefold() for name in self.names]
+        ranks = self._label_ranks(self._labels[column - 1])
+        return array('L', (ranks[label_id] for label_id in self._columns[column - 1]))
+
+
+class DuplicateTableModel(SortedTableModel):
+    """Найденные дубликаты: строка на файл, данные берутся из DuplicateResults
+    
+    Модель хранит только номер группы и номер файла в ней для каждой
+    строки. Полный путь файла отдается по роли Qt.UserRole.
+    """
+    
+    HEADERS = ["📄 Имя файла", "📁 Путь", "📏 Размер", "📅 Дата создания", "🔑 Хэш"]
+    
+    def __init__(self, results, format_size, parent=None):
+        super().__init__(parent)
+        self.format_size = format_size
+        self.set_results(results)
+    
+    def set_results(self, results):
+        self.beginResetModel()
+        self.results = results
+        self._group_keys = []
+        self._groups = array('L')
+        self._members = array('L')
+        self._reset_order()
+        self.endResetModel()
+    
+    def append_group(self, key):
+        """Строки группы, уже добавленной в DuplicateResults"""
+        files = self.results.groups[key]
+        if not files:
+            return
+        
+        start = len(self._groups)
+        group = len(self._group_keys)
+        self.beginInsertRows(QModelIndex(), start, start + len(files) - 1)
+        self._group_keys.append(key)
+        self._groups.extend([group] * len(files))
+        self._members.extend(range(len(files)))
+        self._rows_appended(start, len(self._groups))
+        self.endInsertRows()
+    
+    def _row_count(self):
+        return len(self._groups)
+    
+    def _record_at(self, source):
+        key = self._group_keys[self._groups[source]]
+        return key, self.results.groups[key][self._members[source]]
+    
+    def record(self, row):
+        """Запись файла строки вида"""
+        return self._record_at(self._source_row(row))[1]
+    
+    def path(self, row):
+        return self.record(row)['path']
+    
+    def group_key(self, row):
+        """Id группы строки вида (один файл может быть в нескольких группах)"""
+        return self._record_at(self._source_row(row))[0]
+    
+    def display_name(self, file_info):
+        name = file_info['name']
+        if file_info.get('is_dir'):
+            name = f"📁 {name} ({file_info['files']} файлов)"
+        if file_info.get('reference'):
+            name = f"📚 {name} (эталон)"
+        if file_info.get('virtual'):
+            name = f"🗜️ {name} (в архиве)"
+        if file_info.get('links'):
+            name += f" (+{len(file_info['links'])} 🔗)"
+        return name
+    
+    def display_path(self, path):
+        # Длинные пути обрезаются с начала, полный путь - во всплывающей подсказке
+        if len(path) > 100:
+            return "..." + path[-97:]
+        return path
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        
+        key, file_info = self._record_at(self._source_row(index.row()))
+        column = index.column()
+        
+        if role == Qt.UserRole:
+            return file_info['path']
+        if role == Qt.ToolTipRole and column == 1:
+            return file_info['path']
+        if role != Qt.DisplayRole:
+            return None
+        
+        if column == 0:
+            return self.display_name(file_info)
+        if column == 1:
+            return self.display_path(file_info['path'])
+        if column == 2:
+            try:
+                return self.format_size(file_info['size'])
+            except:
+                return "Ошибка"
+        if column == 3:
+            return datetime.fromtimestamp(file_info['ctime']).strftime("%Y-%m-%d %H:%M:%S")
+        return key[:16]
+    
+    def _make_sort_keys(self, column):
+        count = len(self._groups)
+        if column == 4:
+            ranks = self._label_ranks(self._group_keys)
+            return array('L', (ranks[group] for group in self._groups))
+        
+        records = (self._record_at(source)[1] for source in range(count))
+        if column == 0:
+            return [f['name'].casefold() for f in records]
+        if column == 1:
+            return [f['path'] for f in records]
+        if column == 2:
+            return array('q', (f['size'] for f in records))
+        return array('d', (f['ctime'] for f in records))
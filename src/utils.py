@@ -1,3 +1,5 @@
+import hashlib
+import threading
 from pathlib import Path
 
 def format_size(size_bytes):
@@ -7,3 +9,47 @@ def format_size(size_bytes):
             return f"{size_bytes:.2f} {unit}"
         size_bytes /= 1024.0
     return f"{size_bytes:.2f} ПБ"
+
+
+def format_duration(seconds):
+    """Форматирование оставшегося времени: 45 с, 3 мин 05 с, 1 ч 02 мин"""
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds} с"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes} мин {seconds:02d} с"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} ч {minutes:02d} мин"
+
+
+def path_digest(path):
+    """Короткий хэш пути для имени служебного файла в data/
+    
+    Имя зависит только от пути папки, поэтому индекс или состояние
+    находится снова при следующем запуске для той же папки.
+    """
+    return hashlib.blake2b(str(path).encode('utf-8', 'surrogatepass'), digest_size=8).hexdigest()
+
+
+class OperationCancelled(Exception):
+    """Длительная операция остановлена через CancelToken"""
+
+
+class CancelToken:
+    """Флаг отмены длительной операции, общий для потоков"""
+    
+    def __init__(self):
+        self._event = threading.Event()
+    
+    def cancel(self):
+        self._event.set()
+    
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+    
+    def check(self):
+        """Выбрасывает OperationCancelled, если операция отменена"""
+        if self._event.is_set():
+            raise OperationCancelled()
@@ -3,7 +3,12 @@ from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 
+from .table_models import PreviewTableModel
+
 class CategoryWidget(QWidget):
+    # Изменилось название или расширения категории
+    changed = pyqtSignal()
+    
     def __init__(self, category_name="", extensions="", parent=None):
         super().__init__(parent)
         self.setup_ui(category_name, extensions)
@@ -95,6 +100,9 @@ class CategoryWidget(QWidget):
         layout.addWidget(self.delete_btn)
         
         self.setLayout(layout)
+        
+        self.name_edit.textChanged.connect(self.changed.emit)
+        self.ext_edit.textChanged.connect(self.changed.emit)
     
     def get_data(self):
         name = self.name_edit.text().strip()
@@ -102,19 +110,24 @@ class CategoryWidget(QWidget):
         return name, extensions
 
 
-class FilePreviewTable(QTableWidget):
+class FilePreviewTable(QTableView):
+    """Таблица предпросмотра поверх PreviewTableModel"""
+    
     def __init__(self, parent=None):
         super().__init__(parent)
+        self.preview_model = PreviewTableModel(self)
+        self.setModel(self.preview_model)
         self.setup_ui()
     
     def setup_ui(self):
-        self.setColumnCount(4)
-        self.setHorizontalHeaderLabels(["📄 Файл", "📝 Тип", "📁 Категория", "📍 Новая папка"])
         self.horizontalHeader().setStretchLastSection(True)
         self.horizontalHeader().setDefaultAlignment(Qt.AlignLeft)
+        # Фиксированная высота строк: вид не измеряет миллион строк
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         self.setAlternatingRowColors(True)
-        self.setSelectionBehavior(QTableWidget.SelectRows)
-        self.setSelectionMode(QTableWidget.SingleSelection)
+        self.setSelectionBehavior(QTableView.SelectRows)
+        self.setSelectionMode(QTableView.SingleSelection)
+        self.setSortingEnabled(True)
         self.setShowGrid(False)
         
         # Настраиваем заголовки
@@ -136,7 +149,7 @@ class FilePreviewTable(QTableWidget):
         
         # Настраиваем таблицу
         self.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 background-color: #252525;
                 alternate-background-color: #2a2a2a;
                 gridline-color: #3a3a3a;
@@ -145,22 +158,31 @@ class FilePreviewTable(QTableWidget):
                 font-size: 12px;
                 outline: none;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 10px 8px;
                 border-bottom: 1px solid #3a3a3a;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #1976d2;
                 color: white;
                 border: none;
             }
-            QTableWidget::item:hover {
+            QTableView::item:hover {
                 background-color: #3a3a3a;
             }
         """)
     
+    def append_rows(self, rows):
+        self.preview_model.append_rows(rows)
+    
+    def rows(self):
+        return self.preview_model.rows()
+    
+    def rowCount(self):
+        return self.preview_model.rowCount()
+    
     def clear(self):
-        self.setRowCount(0)
+        self.preview_model.clear()
 
 
 class StatisticsWidget(QWidget):
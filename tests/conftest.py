@@ -0,0 +1,58 @@
+# conftest.py
+"""Общие фикстуры тестов: временное дерево файлов и запуск поиска дубликатов
+
+Запуск из корня проекта: python -m pytest
+"""
+import os
+import sys
+
+import pytest
+
+# src - не пакет, а папка модулей с относительными импортами
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.duplicates import DuplicateFinder
+
+
+class Tree:
+    """Временная папка с файлами; пути задаются относительно корня через "/" """
+    
+    def __init__(self, root):
+        self.root = str(root)
+        os.makedirs(self.root, exist_ok=True)
+    
+    def path(self, rel_path):
+        return os.path.join(self.root, *rel_path.split('/'))
+    
+    def write(self, rel_path, data, mtime=None):
+        """Создание файла; mtime задает время изменения (и порядок сохранения при очистке)"""
+        path = self.path(rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+    
+    def exists(self, rel_path):
+        return os.path.lexists(self.path(rel_path))
+
+
+@pytest.fixture
+def tree(tmp_path):
+    return Tree(tmp_path / 'tree')
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    """Папка служебных файлов (индексы, состояния, кэш) вне дерева поиска"""
+    return str(tmp_path / 'data')
+
+
+@pytest.fixture
+def find():
+    """find(папка, method, **аргументы поиска, finder=опции DuplicateFinder) -> (finder, группы)"""
+    def run(directory, method='hash', finder=None, **search):
+        duplicate_finder = DuplicateFinder(**(finder or {}))
+        return duplicate_finder, duplicate_finder.find_duplicates(str(directory), method=method, **search)
+    return run
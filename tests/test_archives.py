@@ -0,0 +1,65 @@
+# test_archives.py
+"""Метод archives: члены архивов сохраняются, ссылки создаются только на обычные файлы"""
+import os
+import zipfile
+
+DATA = b'archived content' * 200
+
+
+def make_archive(tree, rel_path, members):
+    path = tree.path(rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return path
+
+
+def test_loose_copy_of_archive_member(tree, find):
+    archive = make_archive(tree, 'backup.zip', {'docs/report.bin': DATA})
+    tree.write('docs/report.bin', DATA)
+    tree.write('other.bin', b'x' * len(DATA))
+    
+    finder, duplicates = find(tree.root, method='archives', finder={'verify_archives': True})
+    
+    assert len(duplicates) == 1
+    files = next(iter(duplicates.values()))
+    assert sorted(f['path'] for f in files) == [archive + '!/docs/report.bin', tree.path('docs/report.bin')]
+    assert finder.wasted_space(files) == len(DATA)
+    
+    finder.remove_duplicates(duplicates, 'delete')
+    assert not tree.exists('docs/report.bin')
+    assert os.path.exists(archive) and tree.exists('other.bin')
+
+
+def test_unverified_copy_is_not_deleted(tree, find):
+    make_archive(tree, 'backup.zip', {'report.bin': DATA})
+    tree.write('report.bin', DATA)
+    
+    finder, duplicates = find(tree.root, method='archives')
+    
+    files = next(iter(duplicates.values()))
+    assert [f.get('unverified') for f in files if not f.get('virtual')] == [True]
+    assert finder.wasted_space(files) == 0
+    finder.remove_duplicates(duplicates, 'delete')
+    assert tree.exists('report.bin')
+
+
+def test_link_modes_link_loose_copies_to_each_other(tree, find):
+    make_archive(tree, 'backup.zip', {'report.bin': DATA})
+    newest = tree.write('a/report.bin', DATA, mtime=2000)
+    older = tree.write('b/report.bin', DATA, mtime=1000)
+    single = make_archive(tree, 'single.zip', {'note.bin': DATA[::-1]})
+    tree.write('c/note.bin', DATA[::-1])
+    
+    finder, duplicates = find(tree.root, method='archives', finder={'verify_archives': True})
+    assert len(duplicates) == 2
+    
+    processed = finder.remove_duplicates(duplicates, 'hardlink')
+    
+    assert not any(report['errors'] for report in finder.reclaim_report.values())
+    assert processed == 1
+    assert os.path.samefile(newest, older)
+    assert tree.exists('c/note.bin') and os.path.exists(single)
+    with open(older, 'rb') as f:
+        assert f.read() == DATA
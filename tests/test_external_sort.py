@@ -0,0 +1,62 @@
+# test_external_sort.py
+"""Внешняя сортировка: те же результаты, что и в памяти"""
+import os
+import random
+
+import pytest
+
+from src.external_sort import ExternalSorter
+
+
+def test_sorter_matches_sorted(tmp_path, monkeypatch):
+    # Серий больше MERGE_FANIN - сливаются в несколько проходов
+    monkeypatch.setattr(ExternalSorter, 'MERGE_FANIN', 3)
+    rng = random.Random(3)
+    items = [(rng.randrange(50), f"path{i}", {'size': i}) for i in range(500)]
+    
+    sorter = ExternalSorter(ExternalSorter.ITEM_OVERHEAD * 20, str(tmp_path))
+    for item in items:
+        sorter.add(item)
+    
+    assert sorter.runs_written >= 25
+    assert list(sorter.sorted()) == sorted(items)
+    assert os.listdir(tmp_path) == []
+
+
+def groups(duplicates):
+    """Группы как списки путей; жесткие ссылки из 'links' тоже входят в группу"""
+    return sorted(sorted(path for f in files for path in [f['path']] + f.get('links', []))
+                  for files in duplicates.values())
+
+
+@pytest.fixture
+def mixed_tree(tree):
+    big = 3 * 64 * 1024 + 1000
+    rng = random.Random(5)
+    base = bytes(rng.getrandbits(8) for _ in range(big))
+    # Отличие между выборочными фрагментами: разделит только полный хэш
+    changed = base[:100000] + b'!' + base[100001:]
+    
+    tree.write('small/a.txt', b'small' * 100)
+    tree.write('small/b.txt', b'small' * 100)
+    tree.write('small/c.txt', b'other' * 100)
+    tree.write('big/a.bin', base)
+    tree.write('big/b.bin', base)
+    tree.write('big/changed.bin', changed)
+    tree.write('big/changed_copy.bin', changed)
+    os.link(tree.path('big/a.bin'), tree.path('big/a_link.bin'))
+    tree.write('unique.bin', base[::-1])
+    return tree
+
+
+def test_external_search_matches_in_memory(mixed_tree, find, data_dir):
+    os.makedirs(data_dir)
+    finder, in_memory = find(mixed_tree.root)
+    finder, external = find(mixed_tree.root, finder={'memory_limit': 1, 'temp_dir': data_dir})
+    
+    assert len(in_memory) == 3
+    assert mixed_tree.path('big/a_link.bin') in groups(in_memory)[0]
+    assert groups(external) == groups(in_memory)
+    assert sorted(finder.wasted_space(files) for files in external.values()) == \
+        sorted(finder.wasted_space(files) for files in in_memory.values())
+    assert os.listdir(data_dir) == []
@@ -0,0 +1,48 @@
+# test_folders.py
+"""Метод folders: удаляется только папка, сравненная целиком"""
+import os
+
+import pytest
+
+from src.scan_filter import DEFAULT_EXCLUDE, ScanFilter
+
+
+@pytest.fixture
+def copies(tree):
+    for copy_name in ('x', 'y'):
+        tree.write(f'{copy_name}/doc.txt', b'document')
+        tree.write(f'{copy_name}/sub/img.bin', b'image' * 10)
+
+
+def find_folders(tree, find):
+    return find(tree.root, method='folders', scan_filter=ScanFilter(exclude=DEFAULT_EXCLUDE))
+
+
+def test_hidden_and_excluded_content_is_compared(tree, find, copies):
+    unique = tree.write('x/.git/unique_history', b'only here')
+    tree.write('y/node_modules/pkg.js', b'only there')
+    
+    finder, duplicates = find_folders(tree, find)
+    
+    # Совпадают только подпапки sub, сами x и y различаются
+    assert {f['name'] for files in duplicates.values() for f in files} == {'sub'}
+    finder.remove_duplicates(duplicates)
+    assert os.path.exists(unique)
+
+
+def test_folder_changed_after_search_is_not_removed(tree, find, copies):
+    finder, duplicates = find_folders(tree, find)
+    assert len(duplicates) == 1
+    
+    tree.write('x/new.txt', b'x')
+    tree.write('y/new.txt', b'y')
+    
+    assert finder.remove_duplicates(duplicates) == 0
+    assert tree.exists('x/new.txt') and tree.exists('y/new.txt')
+
+
+def test_identical_folders_are_removed(tree, find, copies):
+    finder, duplicates = find_folders(tree, find)
+    
+    assert finder.remove_duplicates(duplicates) == 1
+    assert len(os.listdir(tree.root)) == 1
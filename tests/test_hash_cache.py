@@ -0,0 +1,74 @@
+# test_hash_cache.py
+"""Кэш хэшей: отметки об использовании пишутся партиями, очистка не трогает переименованные файлы"""
+import os
+
+import pytest
+
+from src.hash_cache import HashCache
+
+
+@pytest.fixture
+def cache(data_dir):
+    cache = HashCache(os.path.join(data_dir, 'cache.sqlite'))
+    yield cache
+    cache.close()
+
+
+def test_hits_do_not_accumulate_until_flush(cache):
+    keys = [(1, ino, 100, 1.0) for ino in range(1, 51)]
+    for ino, key in enumerate(keys):
+        cache.put(f"/f{ino}", key, 'sha256', f"h{ino}")
+    cache.flush()
+    
+    for i in range(3 * HashCache.BATCH_ROWS):
+        assert cache.get(keys[i % len(keys)], 'sha256') is not None
+        assert len(cache._touched) < HashCache.BATCH_ROWS
+
+
+def test_hit_updates_last_used(cache):
+    key = (1, 7, 100, 1.0)
+    cache.put("/f", key, 'sha256', "h")
+    cache.flush()
+    before = cache._conn.execute("SELECT last_used FROM hashes").fetchone()[0]
+    
+    assert cache.get(key, 'sha256') == "h"
+    cache.flush()
+    after = cache._conn.execute("SELECT last_used FROM hashes").fetchone()[0]
+    assert after >= before
+    assert cache._touched == []
+
+
+def file_key(path):
+    st = os.stat(path)
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime)
+
+
+def test_purge_keeps_renamed_files(cache, tree):
+    path = tree.write('a.bin', b'data')
+    key = file_key(path)
+    cache.put(path, key, 'sha256', "h")
+    os.rename(path, tree.path('b.bin'))
+    
+    assert cache.purge_stale() == 0
+    assert cache.get(file_key(tree.path('b.bin')), 'sha256') == "h"
+
+
+def test_purge_keeps_entry_when_path_holds_other_file(cache, tree):
+    path = tree.write('a.bin', b'data')
+    key = file_key(path)
+    cache.put(path, key, 'sha256', "h")
+    os.rename(path, tree.path('b.bin'))
+    tree.write('a.bin', b'other data')
+    
+    assert cache.purge_stale() == 0
+    assert cache.get(key, 'sha256') == "h"
+
+
+def test_purge_removes_changed_files(cache, tree):
+    path = tree.write('a.bin', b'data', mtime=1000)
+    cache.put(path, file_key(path), 'sha256', "h")
+    with open(path, 'ab') as f:
+        f.write(b' changed')
+    
+    assert cache.purge_stale() == 1
+    assert len(cache) == 0
@@ -0,0 +1,85 @@
+# test_incremental.py
+"""Метод incremental: только новые дубликаты, хэши старых файлов из состояния"""
+import os
+
+import pytest
+
+from src.scan_state import ScanState
+from src.utils import CancelToken
+
+DATA = b'photo' * 1000
+
+
+@pytest.fixture
+def state(tree, data_dir):
+    return ScanState(tree.root, data_dir)
+
+
+def search(tree, find, state, **search):
+    return find(tree.root, method='incremental', state=state, **search)
+
+
+def group_names(duplicates):
+    return sorted(sorted(os.path.basename(f['path']) for f in files) for files in duplicates.values())
+
+
+def test_first_search_is_full(tree, find, state):
+    tree.write('a.jpg', DATA)
+    tree.write('b.jpg', DATA)
+    
+    finder, duplicates = search(tree, find, state)
+    
+    assert group_names(duplicates) == [['a.jpg', 'b.jpg']]
+    assert state.exists()
+
+
+def test_unchanged_folder_has_no_new_duplicates(tree, find, state):
+    tree.write('a.jpg', DATA)
+    tree.write('b.jpg', DATA)
+    search(tree, find, state)
+    
+    finder, duplicates = search(tree, find, state)
+    
+    assert duplicates == {}
+    assert finder.stats['bytes_hashed'] == 0
+
+
+def test_new_copy_reuses_saved_hashes(tree, find, state):
+    tree.write('a.jpg', DATA)
+    tree.write('b.jpg', DATA)
+    tree.write('other.jpg', b'x' * len(DATA))
+    search(tree, find, state)
+    tree.write('c.jpg', DATA)
+    
+    finder, duplicates = search(tree, find, state)
+    
+    assert group_names(duplicates) == [['a.jpg', 'b.jpg', 'c.jpg']]
+    # a.jpg, b.jpg и other.jpg того же размера хэшировались в первом поиске
+    assert finder.stats['bytes_hashed'] == len(DATA)
+
+
+def test_modified_file_counts_as_new(tree, find, state):
+    tree.write('a.jpg', DATA)
+    tree.write('b.jpg', b'y' * len(DATA), mtime=1000)
+    search(tree, find, state)
+    tree.write('b.jpg', DATA, mtime=2000)
+    
+    finder, duplicates = search(tree, find, state)
+    
+    assert group_names(duplicates) == [['a.jpg', 'b.jpg']]
+    assert finder.stats['bytes_hashed'] == len(DATA)
+
+
+def test_cancelled_search_keeps_previous_state(tree, find, state):
+    tree.write('a.jpg', DATA)
+    tree.write('b.jpg', DATA)
+    search(tree, find, state)
+    tree.write('c.jpg', DATA)
+    
+    token = CancelToken()
+    token.cancel()
+    finder, duplicates = search(tree, find, state, cancel_token=token)
+    assert finder.cancelled
+    
+    finder, duplicates = search(tree, find, state)
+    assert group_names(duplicates) == [['a.jpg', 'b.jpg', 'c.jpg']]
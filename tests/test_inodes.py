@@ -0,0 +1,39 @@
+# test_inodes.py
+"""Пути на один inode никогда не попадают в группу как разные копии"""
+import os
+import shutil
+
+import pytest
+
+from src.scan_filter import ScanFilter
+
+MODES = [{}, {'memory_limit': 1024 * 1024}]
+
+
+@pytest.fixture
+def linked(tree):
+    real = tree.write('a/real.bin', b'data' * 1000)
+    os.makedirs(tree.path('b'))
+    os.symlink(real, tree.path('b/link.bin'))
+    return real
+
+
+@pytest.mark.parametrize('options', MODES)
+def test_symlink_and_target_are_not_duplicates(tree, find, linked, options):
+    finder, duplicates = find(tree.root, finder=options, scan_filter=ScanFilter(follow_symlinks=True))
+    
+    assert duplicates == {}
+    finder.remove_duplicates(duplicates)
+    assert os.path.exists(linked)
+
+
+@pytest.mark.parametrize('options', MODES)
+def test_symlink_collapses_into_one_record(tree, find, linked, options):
+    shutil.copyfile(linked, tree.path('copy.bin'))
+    
+    finder, duplicates = find(tree.root, finder=options, scan_filter=ScanFilter(follow_symlinks=True))
+    
+    [files] = duplicates.values()
+    assert len(files) == 2
+    assert finder.wasted_space(files) == 4000
+    assert len({(f['dev'], f['ino']) for f in files}) == 2
@@ -0,0 +1,68 @@
+# test_links.py
+"""Замена копий ссылками: все пути остаются рабочими, при ошибке файл не тронут"""
+import errno
+import os
+
+import src.duplicates
+from src.duplicates import keep_priority
+
+DATA = b'document' * 2000
+
+
+def copies(tree):
+    newest = tree.write('new/doc.bin', DATA, mtime=3000)
+    older = [tree.write('old/doc.bin', DATA, mtime=1000), tree.write('older/doc.bin', DATA, mtime=500)]
+    return newest, older
+
+
+def leftovers(tree):
+    return [name for folder, dirs, files in os.walk(tree.root) for name in files if name.endswith('-tmp')]
+
+
+def test_hardlink_replaces_copies(tree, find):
+    newest, older = copies(tree)
+    finder, duplicates = find(tree.root)
+    kept = max(next(iter(duplicates.values())), key=keep_priority)['path']
+    
+    assert finder.remove_duplicates(duplicates, 'hardlink') == 2
+    
+    for path in [newest] + older:
+        assert os.path.samefile(path, kept)
+        with open(path, 'rb') as f:
+            assert f.read() == DATA
+    assert os.stat(kept).st_nlink == 3
+    assert [report['bytes'] for report in finder.reclaim_report.values()] == [2 * len(DATA)]
+    assert leftovers(tree) == []
+
+
+def test_changed_copy_is_not_replaced(tree, find):
+    newest, older = copies(tree)
+    finder, duplicates = find(tree.root)
+    files = next(iter(duplicates.values()))
+    kept = max(files, key=keep_priority)['path']
+    changed = next(f['path'] for f in files if f['path'] != kept)
+    with open(changed, 'r+b') as f:
+        f.write(b'D')
+    
+    assert finder.remove_duplicates(duplicates, 'hardlink') == 1
+    
+    assert not os.path.samefile(changed, kept)
+    with open(changed, 'rb') as f:
+        assert f.read(1) == b'D'
+    assert [report['errors'] for report in finder.reclaim_report.values()] == [1]
+
+
+def test_failed_reflink_leaves_target_intact(tree, find, monkeypatch):
+    newest, older = copies(tree)
+    inodes = {path: os.stat(path).st_ino for path in [newest] + older}
+    
+    def reflink(source, target):
+        raise OSError(errno.EOPNOTSUPP, os.strerror(errno.EOPNOTSUPP), str(target))
+    monkeypatch.setattr(src.duplicates, 'reflink', reflink)
+    
+    finder, duplicates = find(tree.root)
+    assert finder.remove_duplicates(duplicates, 'reflink') == 0
+    
+    assert {path: os.stat(path).st_ino for path in inodes} == inodes
+    assert [report['errors'] for report in finder.reclaim_report.values()] == [2]
+    assert leftovers(tree) == []
@@ -0,0 +1,97 @@
+# test_organizer.py
+"""Сортировка: прогресс по скопированным байтам и отмена во время копирования"""
+import errno
+import os
+
+import pytest
+
+from src.organizer import FileOrganizer
+from src.utils import CancelToken
+
+CATEGORIES = {'Документы': ['.txt'], 'Музыка': ['.mp3']}
+
+
+@pytest.fixture
+def organizer():
+    organizer = FileOrganizer()
+    organizer.PROGRESS_INTERVAL = 0
+    return organizer
+
+
+@pytest.fixture
+def cross_device(monkeypatch):
+    """Переименование падает с EXDEV, как при переносе на другой диск"""
+    def rename(src, dst):
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+    monkeypatch.setattr(os, 'rename', rename)
+
+
+def organize(organizer, tree, **kwargs):
+    reports = []
+    results = organizer.organize_files(tree.root, CATEGORIES, organize_by_date=False,
+                                       progress=reports.append, **kwargs)
+    return results, reports
+
+
+def test_rename_is_not_counted_as_copied(organizer, tree):
+    tree.write('a.txt', b'a' * 5000)
+    tree.write('b.mp3', b'b' * 7000)
+    
+    results, reports = organize(organizer, tree)
+    
+    assert results == {'moved': 2, 'errors': 0, 'cancelled': False}
+    assert tree.exists('Документы/a.txt') and tree.exists('Музыка/b.mp3')
+    final = reports[-1]
+    assert final['bytes_done'] == final['bytes_total'] == 12000
+    assert final['bytes_copied'] == 0 and final['throughput'] == 0
+    assert final['eta'] == 0
+
+
+def test_copy_to_other_device_is_counted(organizer, tree, cross_device):
+    tree.write('a.txt', b'a' * 5000)
+    tree.write('b.mp3', b'b' * 7000)
+    
+    results, reports = organize(organizer, tree)
+    
+    assert results['moved'] == 2
+    assert not tree.exists('a.txt') and not tree.exists('b.mp3')
+    with open(tree.path('Музыка/b.mp3'), 'rb') as f:
+        assert f.read() == b'b' * 7000
+    assert reports[-1]['bytes_copied'] == 12000
+    assert reports[-1]['throughput'] > 0
+
+
+def test_cancel_during_copy_removes_partial_target(organizer, tree, cross_device):
+    organizer.COPY_CHUNK = 1000
+    tree.write('a.txt', b'a' * 10000)
+    token = CancelToken()
+    
+    def progress(info):
+        if info['bytes_copied'] >= 3000:
+            token.cancel()
+    
+    results = organizer.organize_files(tree.root, CATEGORIES, organize_by_date=False,
+                                       progress=progress, cancel_token=token)
+    
+    assert results == {'moved': 0, 'errors': 0, 'cancelled': True}
+    assert tree.exists('a.txt')
+    assert os.listdir(tree.path('Документы')) == []
+
+
+def test_failed_copy_keeps_file_created_by_others(organizer, tree, monkeypatch):
+    tree.write('a.txt', b'mine')
+    
+    def rename(src, dst):
+        # Файл с тем же именем появился после проверки exists()
+        with open(dst, 'wb') as f:
+            f.write(b'theirs')
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+    monkeypatch.setattr(os, 'rename', rename)
+    
+    results, reports = organize(organizer, tree)
+    
+    assert results['errors'] == 1
+    with open(tree.path('a.txt'), 'rb') as f:
+        assert f.read() == b'mine'
+    with open(tree.path('Документы/a.txt'), 'rb') as f:
+        assert f.read() == b'theirs'
@@ -0,0 +1,83 @@
+# test_payload.py
+"""Режим payload: совпадение без метаданных показывается, но не удаляется"""
+import os
+
+from src.payload import payload_ranges
+
+AUDIO = bytes(range(256)) * 40
+
+
+def id3v2(text):
+    """Тег ID3v2.3 с одним кадром TIT2"""
+    frame = b'TIT2' + len(text).to_bytes(4, 'big') + b'\x00\x00' + text
+    size = len(frame)
+    syncsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b'ID3' + bytes([3, 0, 0]) + syncsafe + frame
+
+
+def id3v1(title):
+    return b'TAG' + title.ljust(125, b'\x00')
+
+
+def jpeg(app1):
+    """Минимальный JPEG: SOI, APP1 с метаданными, DQT, SOS с данными"""
+    segment = b'\xff\xe1' + (len(app1) + 2).to_bytes(2, 'big') + app1
+    dqt = b'\xff\xdb' + (67).to_bytes(2, 'big') + bytes(65)
+    sos = b'\xff\xda' + (8).to_bytes(2, 'big') + bytes(6)
+    return b'\xff\xd8' + segment + dqt + sos + bytes(range(200)) + b'\xff\xd9'
+
+
+def payload_bytes(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    return b''.join(data[offset:offset + length] for offset, length in payload_ranges(path))
+
+
+def test_mp3_ranges_skip_id3_tags(tree):
+    a = tree.write('a.mp3', id3v2(b'First title') + AUDIO + id3v1(b'First'))
+    b = tree.write('b.mp3', id3v2(b'Another, longer title') + AUDIO)
+    
+    assert payload_bytes(a) == payload_bytes(b) == AUDIO
+
+
+def test_jpeg_ranges_skip_app_segments(tree):
+    a = tree.write('a.jpg', jpeg(b'Exif\x00\x00camera one'))
+    b = tree.write('b.jpg', jpeg(b'Exif\x00\x00another camera, other date'))
+    
+    assert os.path.getsize(a) != os.path.getsize(b)
+    assert payload_bytes(a) == payload_bytes(b)
+
+
+def test_unknown_format_has_no_ranges(tree):
+    assert payload_ranges(tree.write('a.bin', AUDIO)) is None
+
+
+def test_mp3_with_different_tags_reported_but_not_deleted(tree, find):
+    tree.write('a.mp3', id3v2(b'First title') + AUDIO, mtime=1000)
+    tree.write('b.mp3', id3v2(b'Another, longer title') + AUDIO, mtime=2000)
+    
+    finder, duplicates = find(tree.root, finder={'payload': True})
+    
+    assert len(duplicates) == 1
+    files = next(iter(duplicates.values()))
+    assert sorted(os.path.basename(f['path']) for f in files) == ['a.mp3', 'b.mp3']
+    assert all(f.get('payload_match') for f in files)
+    assert finder.wasted_space(files) == 0
+    
+    for mode in ('delete', 'hardlink'):
+        finder.remove_duplicates(duplicates, mode)
+        assert tree.exists('a.mp3') and tree.exists('b.mp3')
+        assert not any(report['errors'] for report in finder.reclaim_report.values())
+    with open(tree.path('a.mp3'), 'rb') as f:
+        assert f.read().startswith(id3v2(b'First title'))
+
+
+def test_identical_mp3_files_are_still_removable(tree, find):
+    data = id3v2(b'Same title') + AUDIO
+    tree.write('a.mp3', data, mtime=1000)
+    tree.write('b.mp3', data, mtime=2000)
+    
+    finder, duplicates = find(tree.root, finder={'payload': True})
+    finder.remove_duplicates(duplicates)
+    
+    assert not tree.exists('a.mp3') and tree.exists('b.mp3')
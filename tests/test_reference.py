@@ -0,0 +1,57 @@
+# test_reference.py
+"""Метод reference: вложенные корни и эталонный файл в нескольких группах"""
+import os
+
+from src.duplicate_results import DuplicateResults
+from src.reference_index import ReferenceIndex
+
+
+def find_in_reference(tree, find, data_dir):
+    reference = ReferenceIndex(tree.path('archive'), data_dir)
+    return find(tree.path('archive/inbox'), method='reference', reference=reference)
+
+
+def test_candidate_inside_reference_is_not_its_own_reference(tree, find, data_dir):
+    tree.write('archive/inbox/a.bin', b'same' * 100)
+    tree.write('archive/inbox/b.bin', b'same' * 100)
+    tree.write('archive/other.bin', b'diff' * 100)
+    
+    finder, duplicates = find_in_reference(tree, find, data_dir)
+    
+    assert duplicates == {}
+    finder.remove_duplicates(duplicates)
+    assert tree.exists('archive/inbox/a.bin') and tree.exists('archive/inbox/b.bin')
+
+
+def test_candidate_inside_reference_matches_files_outside_it(tree, find, data_dir):
+    keep = tree.write('archive/keep.bin', b'same' * 100)
+    tree.write('archive/inbox/a.bin', b'same' * 100)
+    tree.write('archive/inbox/b.bin', b'same' * 100)
+    
+    finder, duplicates = find_in_reference(tree, find, data_dir)
+    
+    assert len(duplicates) == 2
+    for files in duplicates.values():
+        assert [f['path'] for f in files if f.get('reference')] == [keep]
+    
+    finder.remove_duplicates(duplicates)
+    assert os.path.exists(keep)
+    assert os.listdir(tree.path('archive/inbox')) == []
+
+
+def test_reference_file_in_several_groups(tree, find, data_dir):
+    keep = tree.write('archive/keep.bin', b'same' * 100)
+    tree.write('archive/inbox/a.bin', b'same' * 100)
+    tree.write('archive/inbox/b.bin', b'same' * 100)
+    
+    finder, duplicates = find_in_reference(tree, find, data_dir)
+    results = DuplicateResults()
+    for key, files in duplicates.items():
+        results.add_group(key, files)
+    
+    assert sorted(results.groups_of(keep)) == sorted(duplicates)
+    for key, files in duplicates.items():
+        copy_path = next(f['path'] for f in files if not f.get('reference'))
+        assert results.group_of(copy_path) == key
+        assert results.record(keep, key)['path'] == keep
+        assert results.record(copy_path, key) is files[1]
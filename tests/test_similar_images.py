@@ -0,0 +1,82 @@
+# test_similar_images.py
+"""Похожие изображения: поиск соседей и защита от автоматической очистки"""
+import os
+import random
+
+import pytest
+
+from src.duplicates import DuplicateFinder, is_removable
+from src.image_hash import MultiIndexHash, hamming
+
+
+@pytest.mark.parametrize('distance', [0, 3, 8, 13])
+def test_search_matches_brute_force(distance):
+    rng = random.Random(7)
+    values = [rng.getrandbits(64) for _ in range(300)]
+    # Соседи с 1-4 измененными битами и точные повторы
+    for value in values[:150]:
+        for _ in range(rng.randint(0, 4)):
+            value ^= 1 << rng.randrange(64)
+        values.append(value)
+    
+    index = MultiIndexHash(distance, len(values))
+    for i, value in enumerate(values):
+        expected = sorted((hamming(value, other), j) for j, other in enumerate(values[:i])
+                          if hamming(value, other) <= distance)
+        assert sorted(index.search(value)) == expected
+        index.add(value, i)
+
+
+def test_similar_group_is_not_cleaned(tree):
+    original = tree.write('original.jpg', b'x' * 5000)
+    thumbnail = tree.write('thumbnail.jpg', b'y' * 500)
+    # Миниатюра новее оригинала: при обычной очистке сохранилась бы она
+    files = [
+        {'path': original, 'name': 'original.jpg', 'size': 5000, 'ctime': 1.0,
+         'algorithm': 'dhash', 'distance': 0, 'similar': True},
+        {'path': thumbnail, 'name': 'thumbnail.jpg', 'size': 500, 'ctime': 2.0,
+         'algorithm': 'dhash', 'distance': 3, 'similar': True},
+    ]
+    finder = DuplicateFinder()
+    
+    assert not any(is_removable(f) for f in files)
+    assert finder.wasted_space(files) == 0
+    assert finder.remove_duplicates({'0000': files}) == 0
+    assert os.path.exists(original) and os.path.exists(thumbnail)
+
+
+def bmp(width, height, pixel):
+    """24-битный BMP; pixel(x, y) -> яркость 0-255"""
+    row_size = (width * 3 + 3) & ~3
+    rows = []
+    for y in reversed(range(height)):
+        row = b''.join(bytes([pixel(x, y)] * 3) for x in range(width))
+        rows.append(row.ljust(row_size, b'\x00'))
+    pixels = b''.join(rows)
+    header = (b'BM' + (54 + len(pixels)).to_bytes(4, 'little') + bytes(4) + (54).to_bytes(4, 'little') +
+              (40).to_bytes(4, 'little') + width.to_bytes(4, 'little') + height.to_bytes(4, 'little') +
+              (1).to_bytes(2, 'little') + (24).to_bytes(2, 'little') + bytes(4) +
+              len(pixels).to_bytes(4, 'little') + bytes(16))
+    return header + pixels
+
+
+def test_resized_copies_found_in_worker_processes(tree, find):
+    # dhash в дочернем процессе работает без QGuiApplication
+    pytest.importorskip('PyQt5.QtGui')
+    from src.scan_filter import ScanFilter
+    
+    def pattern(size):
+        return lambda x, y: (x * 255 // size) ^ (y * 255 // size)
+    
+    original = tree.write('original.bmp', bmp(400, 400, pattern(400)))
+    small = tree.write('small.bmp', bmp(100, 100, pattern(100)))
+    thumbnail = tree.write('thumbnail.bmp', bmp(50, 50, pattern(50)))
+    tree.write('other.bmp', bmp(100, 100, lambda x, y: 255 - x * 255 // 100))
+    
+    # Порог по размеру, как в настройках программы, не отсеивает уменьшенные копии
+    finder, duplicates = find(tree.root, method='images_similar', workers=2,
+                              scan_filter=ScanFilter(min_size=100 * 1024))
+    
+    assert [sorted(f['path'] for f in files) for files in duplicates.values()] == \
+        [sorted([original, small, thumbnail])]
+    assert finder.stats['candidates_done'] == 4